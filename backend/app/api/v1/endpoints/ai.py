@@ -1,14 +1,29 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List
-from openai import OpenAI
-import os
+from typing import List, Optional
 from app.db import prisma
 from datetime import datetime
+import json
+import logging
+from ....core.config import settings
+from ....core.code_blocks import IncrementalCodeBlockParser, extract_code_blocks
+from ....core.prompts import CHAT_MAX_TOKENS, CHAT_TEMPERATURE, select_system_message
+from ....core.openai_client import get_openai_client, completion_limiter, openai_sdk, CompletionQueueFull
+from ....core.completion_cache import completion_cache, completion_cache_key
+from ....core.context_window import fit_chat_context
+from ....core.conversations import conversation_store, ConversationConflict
+from ....schemas.conversation import (
+    ConversationCreate, ConversationDetail, ConversationMessageCreate, ConversationResponse
+)
+from ....core.security import get_user_by_id
+from ....core.metrics import stage_timer, record_openai_usage
+from ....core.rate_limit import AI_IP_LIMIT, AI_USER_LIMIT, RateLimitExceeded, client_ip, rate_limiter
+from ....core.write_queue import WriteQueueFull, clip_write_queue
+from ....schemas.clipped_code import ClippedCodeCreate
 
 router = APIRouter()
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+logger = logging.getLogger(__name__)
 
 class ChatMessage(BaseModel):
     role: str
@@ -17,159 +32,320 @@ class ChatMessage(BaseModel):
 
 class ChatRequest(BaseModel):
     messages: List[ChatMessage]
+    # Also save the answer's code as an AI-generated clip; the response carries its clipId
+    save: bool = False
 
-def extract_code_blocks(content: str):
-    lines = content.split('\n')
-    title = None
-    language = None
-    notes = None
-    time_complexity = "N/A"
-    space_complexity = "N/A"
-    content_lines = []
-    
-    collecting_notes = False
-    notes_lines = []
-    
-    for line in lines:
-        line = line.strip()
-        if line.startswith('Title:'):
-            title = line.replace('Title:', '').strip()
-        elif line.startswith('Language:'):
-            language = line.replace('Language:', '').strip()
-        elif line.startswith('Time Complexity:'):
-            time_complexity = line.replace('Time Complexity:', '').strip() or "N/A"
-        elif line.startswith('Space Complexity:'):
-            space_complexity = line.replace('Space Complexity:', '').strip() or "N/A"
-        elif line.startswith('Notes:'):
-            collecting_notes = True
-            notes = line.replace('Notes:', '').strip()
-            if notes:  
-                notes_lines.append(notes)
-        elif collecting_notes and line and not line.startswith('```'):
-            notes_lines.append(line)
-        elif line.startswith('```'):
-            collecting_notes = False
-        else:
-            content_lines.append(line)
-    
-    notes = ' '.join(notes_lines).strip() if notes_lines else "No explanation provided."
-    
-    parts = content.split("```")
-    if len(parts) < 3:
-        return ' '.join(content_lines), None, title, language, notes, time_complexity, space_complexity
-    
-    full_code_block = parts[1].strip()
-    
-    if not language and '\n' in full_code_block:
-        potential_lang = full_code_block.split('\n')[0].strip()
-        if potential_lang and ':' not in potential_lang:
-            language = potential_lang
-            full_code_block = '\n'.join(full_code_block.split('\n')[1:])
-    else:
-        lines = full_code_block.split('\n')
-        if lines[0].strip().lower() == language.lower():
-            full_code_block = '\n'.join(lines[1:])
-    
-    content = parts[0] + parts[2]
+async def limit_ai_request(http_request: Request, user_id: str) -> None:
+    """Take the user's and the client IP's AI tokens and check the daily quota; raises RateLimitExceeded."""
+    await rate_limiter.hit("ai", [(f"user:{user_id}", AI_USER_LIMIT), (f"ip:{client_ip(http_request)}", AI_IP_LIMIT)])
+    await rate_limiter.check_quota(user_id)
+
+async def complete_chat(messages: List[dict], user_id: Optional[str] = None) -> dict:
+    """Assistant reply for these messages, from the completion cache or upstream; upstream usage counts against user_id."""
+    async def create_completion():
+        async with completion_limiter.slot():
+            with stage_timer("openai", "chat"):
+                response = await get_openai_client().chat.completions.create(
+                    model=settings.OPENAI_MODEL,
+                    messages=messages,
+                    temperature=CHAT_TEMPERATURE,
+                    max_tokens=CHAT_MAX_TOKENS,
+                    timeout=settings.OPENAI_TIMEOUT
+                )
+        record_openai_usage(settings.OPENAI_MODEL, response.usage)
+        await rate_limiter.record_usage(user_id, response.usage)
+        message = response.choices[0].message
+        return {"role": message.role, "content": message.content}
+
+    cache_key = completion_cache_key(settings.OPENAI_MODEL, CHAT_TEMPERATURE, CHAT_MAX_TOKENS, messages)
+    return await completion_cache.get_or_create(cache_key, create_completion)
+
+def build_chat_response(ai_message: dict, is_code_input: bool, context) -> dict:
+    if is_code_input:
+        title = ai_message["content"].replace("Title:", "").strip()
+        return {
+            "role": ai_message["role"],
+            "content": "",
+            "code": "",
+            "title": title,
+            "language": "",
+            "notes": "",
+            "timeComplexity": "",
+            "spaceComplexity": "",
+            "context": context.to_response()
+        }
+
+    with stage_timer("parse", "extract_code_blocks"):
+        parsed = extract_code_blocks(ai_message["content"])
     
-    return (content.strip(), full_code_block.strip(), title, language, 
-            notes, time_complexity, space_complexity)
-
-SYSTEM_MESSAGES = {
-    "CODE_INPUT": {
-        "role": "system",
-        "content": '''You are a programming assistant. For the given code:
-1. Suggest a concise, descriptive title that reflects its purpose.
-2. Format your response exactly like this:
-   Title: [your suggested title]
-   No other text please.'''
-    },
-    "DEFAULT": {
-        "role": "system",
-        "content": '''You are a programming assistant. For any programming solution you provide:
-1. ALWAYS wrap your code in triple backticks (```).
-2. ALWAYS include these sections before the code:
-   Title: [name of the problem or solution]
-   Language: [programming language]
-   Time Complexity: [Big O notation if applicable]
-   Space Complexity: [Big O notation if applicable]
-   Notes: [Explain how the code works, its logic, and any important concepts or algorithms used]
-3. If the user hasn't specified a language, ask them which programming language they prefer.
-4. Format your response like this example:
-   Title: Example Problem
-   Language: Python
-   Time Complexity: O(n) or N/A if not applicable
-   Space Complexity: O(1) or N/A if not applicable
-   Notes: This code implements a linear search algorithm. It iterates through each element once, comparing it with the target value. The algorithm uses a single loop and constant extra space, making it memory efficient but potentially slower for large datasets compared to other search algorithms.
-   
-   ```python
-   def example():
-       pass
-   ```'''
-    }
-}
+    return {"role": ai_message["role"], **parsed.to_response(), "context": context.to_response()}
+
+def queue_ai_clip(chat_response: dict, user_id: str) -> Optional[str]:
+    """Queue the parsed answer's first code block as a clip; its id, or None when there is nothing to save."""
+    if not chat_response.get("code"):
+        return None
+    clip = ClippedCodeCreate(
+        userId=user_id,
+        title=chat_response["title"] or "Untitled Code Snippet",
+        codeContent=chat_response["code"],
+        language=chat_response["language"] or "text",
+        isAiGenerated=True,
+        notes=chat_response["notes"],
+        timeComplexity=chat_response["timeComplexity"],
+        spaceComplexity=chat_response["spaceComplexity"],
+    )
+    try:
+        return clip_write_queue.enqueue(clip.model_dump())
+    except WriteQueueFull as e:
+        # The answer is still worth returning; the client can save it the usual way
+        logger.warning("Not saving AI clip for user %s: %s", user_id, e)
+        return None
+
+def completion_error(e: Exception, operation: str) -> HTTPException:
+    """Map a failure while completing a chat to the HTTP error returned to the client."""
+    if isinstance(e, (CompletionQueueFull, RateLimitExceeded)):
+        return HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    if isinstance(e, openai_sdk().APITimeoutError):
+        return HTTPException(status_code=504, detail="AI request timed out")
+    logger.exception("Error in %s", operation)
+    return HTTPException(
+        status_code=500,
+        detail=f"Internal server error: {str(e)}"
+    )
 
 @router.post("/chat")
-async def chat_with_ai(request: ChatRequest):
+async def chat_with_ai(request: ChatRequest, http_request: Request):
     try:
-        if not client.api_key:
+        if not settings.OPENAI_API_KEY:
             raise HTTPException(
                 status_code=500,
                 detail="OpenAI API key not configured"
             )
 
         user_id = request.messages[0].user_id
-        user = await prisma.user.find_unique(
-            where={"id": user_id}
-        )
+        user = await get_user_by_id(user_id)
         
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
+        await limit_ai_request(http_request, user_id)
 
-        is_code_input = request.messages[0].content.startswith("CODE_INPUT:")
-
-        system_message = SYSTEM_MESSAGES["CODE_INPUT"] if is_code_input else SYSTEM_MESSAGES["DEFAULT"]
+        is_code_input, system_message = select_system_message(request.messages[0].content)
 
         formatted_messages = [{"role": msg.role, "content": msg.content} for msg in request.messages]
-        
-        response = client.chat.completions.create(
-            model="gpt-4o-mini", # Update the model to your choice
-            messages=[system_message] + formatted_messages,
-            temperature=0.7,
-            max_tokens=2000
-        )
-        
-        ai_message = response.choices[0].message
-        
+        with stage_timer("context", "fit"):
+            context = fit_chat_context(system_message, formatted_messages)
+
+        ai_message = await complete_chat(context.messages, user_id)
+        response = build_chat_response(ai_message, is_code_input, context)
+        if request.save and not is_code_input:
+            response["clipId"] = queue_ai_clip(response, user_id)
+        return response
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise completion_error(e, "chat_with_ai")
+
+# Start a server-side conversation; later turns send only the new message
+@router.post("/conversations", response_model=ConversationResponse)
+async def create_conversation(conversation: ConversationCreate):
+    user = await get_user_by_id(conversation.userId)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return await conversation_store.create(conversation.userId, conversation.title)
+
+# Get a conversation with its messages
+@router.get("/conversations/{conversation_id}", response_model=ConversationDetail)
+async def get_conversation(conversation_id: str):
+    conversation = await prisma.conversation.find_unique(
+        where={"id": conversation_id},
+        include={"messages": {"order_by": {"position": "asc"}}}
+    )
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return conversation
+
+# Append a user message and reply; the history is assembled server-side
+@router.post("/conversations/{conversation_id}/messages")
+async def send_conversation_message(conversation_id: str, message: ConversationMessageCreate,
+                                    http_request: Request):
+    try:
+        if not settings.OPENAI_API_KEY:
+            raise HTTPException(
+                status_code=500,
+                detail="OpenAI API key not configured"
+            )
+
+        async with conversation_store.lock(conversation_id):
+            conversation = await conversation_store.get(conversation_id)
+            if conversation is None:
+                raise HTTPException(status_code=404, detail="Conversation not found")
+            await limit_ai_request(http_request, conversation.user_id)
+
+            user_message = {"role": "user", "content": message.content}
+            history = conversation.messages + [user_message]
+            is_code_input, system_message = select_system_message(history[0]["content"])
+            with stage_timer("context", "fit"):
+                context = fit_chat_context(system_message, history)
+
+            ai_message = await complete_chat(context.messages, conversation.user_id)
+            response = build_chat_response(ai_message, is_code_input, context)
+            await conversation_store.append(conversation, [user_message, ai_message], title=response["title"])
+
+        return {"conversationId": conversation_id, **response}
+
+    except HTTPException:
+        raise
+    except ConversationConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise completion_error(e, "send_conversation_message")
+
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_tokens(messages: List[dict], user_id: Optional[str] = None):
+    """Yield (role, text) deltas from an upstream streaming completion."""
+    async with completion_limiter.slot():
+        with stage_timer("openai", "chat_stream"):
+            stream = await get_openai_client().chat.completions.create(
+                model=settings.OPENAI_MODEL,
+                messages=messages,
+                temperature=CHAT_TEMPERATURE,
+                max_tokens=CHAT_MAX_TOKENS,
+                timeout=settings.OPENAI_TIMEOUT,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            async for chunk in stream:
+                if chunk.usage:
+                    record_openai_usage(settings.OPENAI_MODEL, chunk.usage)
+                    await rate_limiter.record_usage(user_id, chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.role or delta.content:
+                    yield delta.role, delta.content or ""
+
+async def replay_tokens(cached: dict):
+    yield cached["role"], cached["content"]
+
+async def stream_completion(messages: List[dict], is_code_input: bool, context: dict,
+                            user_id: Optional[str] = None, save: bool = False):
+    """Forward completion tokens as SSE and emit parsed fields as they complete."""
+    parser = IncrementalCodeBlockParser()
+    chunks = []
+    role = "assistant"
+    cache_key = completion_cache_key(settings.OPENAI_MODEL, CHAT_TEMPERATURE, CHAT_MAX_TOKENS, messages)
+
+    try:
+        cached = await completion_cache.get(cache_key)
+        tokens = replay_tokens(cached) if cached is not None else stream_tokens(messages, user_id)
+        async for delta_role, text in tokens:
+            role = delta_role or role
+            if not text:
+                continue
+
+            chunks.append(text)
+            yield format_sse("token", {"content": text})
+            if is_code_input:
+                continue
+            for name, value in parser.feed(text):
+                yield format_sse("field", _field_payload(name, value))
+
+        if cached is None:
+            await completion_cache.set(cache_key, {"role": role, "content": "".join(chunks)})
+
         if is_code_input:
-            title = ai_message.content.replace("Title:", "").strip()
-            return {
-                "role": ai_message.role,
+            title = "".join(chunks).replace("Title:", "").strip()
+            yield format_sse("field", {"name": "title", "value": title})
+            yield format_sse("done", {
+                "role": role,
                 "content": "",
                 "code": "",
                 "title": title,
                 "language": "",
                 "notes": "",
                 "timeComplexity": "",
-                "spaceComplexity": ""
-            }
+                "spaceComplexity": "",
+                "context": context
+            })
+            return
 
-        content, code, title, language, notes, time_complexity, space_complexity = extract_code_blocks(ai_message.content)
-        
-        return {
-            "role": ai_message.role,
-            "content": content,
-            "code": code,
-            "title": title,
-            "language": language,
-            "notes": notes,
-            "timeComplexity": time_complexity,
-            "spaceComplexity": space_complexity
-        }
+        for name, value in parser.close():
+            yield format_sse("field", _field_payload(name, value))
+        done = {"role": role, **parser.result(), "context": context}
+        if save:
+            done["clipId"] = queue_ai_clip(done, user_id)
+        yield format_sse("done", done)
 
+    except CompletionQueueFull as e:
+        yield format_sse("error", {"status": 429, "detail": str(e), "retryAfter": e.retry_after})
+    except openai_sdk().APITimeoutError:
+        yield format_sse("error", {"status": 504, "detail": "AI request timed out"})
     except Exception as e:
-        print(f"Error in chat_with_ai: {str(e)}")
+        logger.exception("Error in chat_with_ai_stream")
+        yield format_sse("error", {"status": 500, "detail": f"Internal server error: {str(e)}"})
+
+def _field_payload(name: str, value) -> dict:
+    if name == "code":
+        return {"name": "code", "value": value.code, "language": value.language}
+    return {"name": name, "value": value}
+
+@router.post("/chat/stream")
+async def chat_with_ai_stream(request: ChatRequest, http_request: Request):
+    """
+    Streaming variant of /chat using Server-Sent Events.
+    Emits `token` events as text arrives, a `field` event for each parsed
+    header, the notes and every code block, then a final `done` event with
+    the same payload /chat returns (clipId included when saving).
+    """
+    if not settings.OPENAI_API_KEY:
         raise HTTPException(
             status_code=500,
-            detail=f"Internal server error: {str(e)}"
+            detail="OpenAI API key not configured"
         )
+
+    user_id = request.messages[0].user_id
+    user = await get_user_by_id(user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        await limit_ai_request(http_request, user_id)
+    except RateLimitExceeded as e:
+        raise completion_error(e, "chat_with_ai_stream")
+
+    # Reject up front while we can still send a status code; the slot itself
+    # is taken inside the generator so it is always released.
+    if completion_limiter.saturated():
+        raise HTTPException(
+            status_code=429,
+            detail="Too many concurrent AI requests, please retry later",
+            headers={"Retry-After": str(completion_limiter.retry_after())}
+        )
+
+    is_code_input, system_message = select_system_message(request.messages[0].content)
+    formatted_messages = [{"role": msg.role, "content": msg.content} for msg in request.messages]
+    with stage_timer("context", "fit"):
+        context = fit_chat_context(system_message, formatted_messages)
+
+    return StreamingResponse(
+        stream_completion(context.messages, is_code_input, context.to_response(), user_id, request.save),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Today's upstream token usage for a user against the daily quota
+@router.get("/usage/{user_id}")
+async def get_ai_usage(user_id: str):
+    return await rate_limiter.usage(user_id)
+
+@router.get("/cache/stats")
+async def get_completion_cache_stats():
+    return completion_cache.stats()
@@ -1,75 +1,764 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from ....schemas.clipped_code import ClippedCodeCreate, ClippedCodeUpdate, ClippedCodeResponse
-from app.db import prisma
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import AsyncIterator, List, Optional, Tuple
+from ....schemas.clipped_code import (
+    ClippedCodeCreate, ClippedCodeUpdate, ClippedCodeResponse, ClippedCodeCreateResponse,
+    ClippedCodePage, ClippedCodeSearchHit, ClippedCodeChanges, DuplicateReport,
+    ClippedCodeBatchUpdate, ClippedCodeBatchDelete, ClippedCodeBatchResult, ClippedCodeSimilar
+)
+from app.db import db_errors, prisma
+from ....core.compression import strip_etag_encoding
+from ....core.config import settings
+from ....core.code_store import UPSERT_BLOBS_SQL, WITH_BLOB, blob_rows, prepare_blob
+from ....core.ids import cuid
+from ....core.embeddings import (
+    CLIPS_TO_EMBED_SQL, EMBEDDING_VERSION, UPSERT_EMBEDDINGS_SQL,
+    embed_text, embedding_index, embedding_rows, encode_vector, refresh_embeddings
+)
+from datetime import datetime, timedelta, timezone
+import asyncio
+import base64
+import hashlib
+import json
+import zlib
 
 router = APIRouter()
 
-# Create clipped code
-@router.post("/", response_model=ClippedCodeResponse)
+BULK_BATCH_SIZE = 500
+BULK_MAX_REPORTED_ERRORS = 100
+EXPORT_PAGE_SIZE = 500
+CHANGES_MAX_LIMIT = 1000
+GZIP_CONTENT_TYPES = ("application/gzip", "application/x-gzip")
+# Most bytes one decompress() call may produce, so a gzip bomb is inflated a slice at a time
+GZIP_OUTPUT_CHUNK = 64 * 1024
+
+# Summary rows select FROM CLIPS_WITH_BLOBS
+SUMMARY_COLUMNS = '''
+    c.id, c.title, c.language, c."isAiGenerated", c."createdAt", c."updatedAt", b.size
+'''
+CLIPS_WITH_BLOBS = '"ClippedCode" c JOIN "CodeBlob" b ON b.hash = c."contentHash"'
+
+# Columns of a clip row as returned by the raw write statements
+CLIP_COLUMNS = '''
+    id, "userId", title, "contentHash", language, "isAiGenerated", notes,
+    "timeComplexity", "spaceComplexity", "createdAt", "updatedAt"
+'''
+UPDATABLE_FIELDS = ("title", "language", "isAiGenerated", "notes", "timeComplexity", "spaceComplexity")
+# Changing any of these changes the clip's embedding
+EMBEDDED_FIELDS = ("title", "notes", "codeContent")
+BATCH_MAX_IDS = 500
+SIMILAR_MAX_LIMIT = 50
+# Matches taken from each search branch before ranking; bounds broad queries like "cache"
+SEARCH_MAX_CANDIDATES = 200
+
+# $1 userId, $2 query text, $3 its ILIKE pattern, $4 language, $5 isAiGenerated, $6 limit.
+# Each branch can use one index: full text or trigram, on the clip (title, notes) or on
+# its blob (code) joined back to the user's clips. An OR across both tables in one WHERE
+# would scan every clip of the user instead. The union of the candidates is ranked, and
+# snippets are only built for the returned rows.
+SEARCH_FILTERS = '''
+    c."userId" = $1
+    AND ($4::text IS NULL OR c.language = $4)
+    AND ($5::boolean IS NULL OR c."isAiGenerated" = $5)
+'''
+SEARCH_CLIPS_SQL = f'''
+WITH query AS (
+    SELECT websearch_to_tsquery('english', $2) || websearch_to_tsquery('simple', $2) AS tsq
+),
+candidates AS (
+    (SELECT c.id FROM "ClippedCode" c, query
+     WHERE c."searchVector" @@ query.tsq AND {SEARCH_FILTERS}
+     LIMIT {SEARCH_MAX_CANDIDATES})
+    UNION
+    (SELECT c.id FROM "ClippedCode" c
+     WHERE c.title ILIKE $3 AND {SEARCH_FILTERS}
+     LIMIT {SEARCH_MAX_CANDIDATES})
+    UNION
+    (SELECT c.id FROM {CLIPS_WITH_BLOBS}, query
+     WHERE b."searchVector" @@ query.tsq AND {SEARCH_FILTERS}
+     LIMIT {SEARCH_MAX_CANDIDATES})
+    UNION
+    (SELECT c.id FROM {CLIPS_WITH_BLOBS}
+     WHERE b.content ILIKE $3 AND {SEARCH_FILTERS}
+     LIMIT {SEARCH_MAX_CANDIDATES})
+),
+hits AS (
+    SELECT {SUMMARY_COLUMNS},
+           ts_rank_cd(c."searchVector" || b."searchVector", query.tsq) + similarity(c.title, $2) AS rank
+    FROM candidates
+    JOIN {CLIPS_WITH_BLOBS} ON c.id = candidates.id, query
+    ORDER BY rank DESC, c."createdAt" DESC
+    LIMIT $6
+)
+SELECT hits.*,
+       ts_headline(
+           'simple',
+           coalesce(c.notes, '') || ' ' || left(b.content, 5000),
+           query.tsq,
+           'MaxFragments=2, MinWords=5, MaxWords=20, StartSel=<mark>, StopSel=</mark>'
+       ) AS snippet
+FROM hits
+JOIN {CLIPS_WITH_BLOBS} ON c.id = hits.id, query
+ORDER BY hits.rank DESC, hits."createdAt" DESC
+'''
+
+# $1-$3 body (hash, content, size), $4 new id, $5 userId, $6-$11 clip fields,
+# $12-$13 embedding (base64 float16 vector, version).
+# Data-modifying CTEs share one snapshot and the refcount trigger and foreign
+# key checks run at the end of the statement, so they see the upserted blob.
+CREATE_CLIP_SQL = f'''
+    WITH existing AS (
+        SELECT {CLIP_COLUMNS} FROM "ClippedCode"
+        WHERE "userId" = $5 AND "contentHash" = $1
+        ORDER BY "createdAt"
+        LIMIT 1
+    ),
+    blob AS (
+        INSERT INTO "CodeBlob" ("hash", "content", "size")
+        SELECT $1, $2, $3::int
+        WHERE NOT EXISTS (SELECT 1 FROM existing)
+        ON CONFLICT ("hash") DO UPDATE SET "refCount" = "CodeBlob"."refCount"
+        RETURNING "hash"
+    ),
+    inserted AS (
+        INSERT INTO "ClippedCode" (
+            "id", "userId", "title", "contentHash", "language", "isAiGenerated",
+            "notes", "timeComplexity", "spaceComplexity", "updatedAt"
+        )
+        SELECT $4, $5, $6, blob."hash", $7, $8::boolean, $9, $10, $11, CURRENT_TIMESTAMP
+        FROM blob
+        RETURNING {CLIP_COLUMNS}
+    ),
+    embedded AS (
+        INSERT INTO "ClipEmbedding" ("clipId", "userId", "vector", "version", "updatedAt")
+        SELECT id, "userId", decode($12, 'base64'), $13::int, CURRENT_TIMESTAMP
+        FROM inserted
+    )
+    SELECT *, false AS "alreadySaved" FROM inserted
+    UNION ALL
+    SELECT *, true FROM existing
+'''
+
+# $1 JSON array of ids, $2-$4 optional new body, $5-$10 optional fields (NULL keeps the value)
+UPDATE_CLIPS_SQL = f'''
+    WITH targets AS (
+        SELECT jsonb_array_elements_text($1::jsonb) AS id
+    ),
+    blob AS (
+        INSERT INTO "CodeBlob" ("hash", "content", "size")
+        SELECT $2::text, $3, $4::int
+        WHERE $2::text IS NOT NULL
+          AND EXISTS (SELECT 1 FROM "ClippedCode" WHERE id IN (SELECT id FROM targets))
+        ON CONFLICT ("hash") DO UPDATE SET "refCount" = "CodeBlob"."refCount"
+        RETURNING "hash"
+    )
+    UPDATE "ClippedCode" c
+    SET "contentHash" = COALESCE((SELECT "hash" FROM blob), c."contentHash"),
+        "title" = COALESCE($5, c."title"),
+        "language" = COALESCE($6, c."language"),
+        "isAiGenerated" = COALESCE($7::boolean, c."isAiGenerated"),
+        "notes" = COALESCE($8, c."notes"),
+        "timeComplexity" = COALESCE($9, c."timeComplexity"),
+        "spaceComplexity" = COALESCE($10, c."spaceComplexity"),
+        "updatedAt" = CURRENT_TIMESTAMP
+    WHERE c.id IN (SELECT id FROM targets)
+    RETURNING {CLIP_COLUMNS}
+'''
+
+DELETE_CLIPS_SQL = '''
+    DELETE FROM "ClippedCode"
+    WHERE id IN (SELECT jsonb_array_elements_text($1::jsonb))
+    RETURNING id, "userId"
+'''
+
+def is_foreign_key_violation(error: Exception) -> bool:
+    # Raw queries report the Postgres SQLSTATE in the error meta
+    return (error.meta or {}).get("code") == "23503"
+
+def update_arguments(update_data: ClippedCodeUpdate) -> list:
+    """UPDATE_CLIPS_SQL arguments after the ids: body (hash, content, size) then fields."""
+    blob = [None, None, None]
+    if update_data.codeContent is not None:
+        blob = list(prepare_blob(update_data.codeContent))
+    return blob + [getattr(update_data, field) for field in UPDATABLE_FIELDS]
+
+def batch_ids(ids: List[str]) -> List[str]:
+    ids = list(dict.fromkeys(ids))
+    if not 1 <= len(ids) <= BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Pass between 1 and {BATCH_MAX_IDS} ids")
+    return ids
+
+def changes_embedding(update_data: ClippedCodeUpdate) -> bool:
+    return any(getattr(update_data, field) is not None for field in EMBEDDED_FIELDS)
+
+def batch_result(ids: List[str], rows: List[dict]) -> dict:
+    found = {row["id"] for row in rows}
+    return {
+        "ids": [clip_id for clip_id in ids if clip_id in found],
+        "notFound": [clip_id for clip_id in ids if clip_id not in found]
+    }
+
+def encode_cursor(created_at, clipped_code_id: str) -> str:
+    """Opaque keyset cursor for the (createdAt, id) position of a row."""
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    raw = f"{created_at}|{clipped_code_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def naive_utc(value: datetime) -> datetime:
+    # Timestamps are stored as naive UTC
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+def encode_sync_cursor(changed_at, clipped_code_id: str, synced_at: datetime) -> str:
+    """Changes feed cursor: the feed position, plus the time the client's copy is complete up to."""
+    return encode_cursor(changed_at, f"{clipped_code_id}|{synced_at.isoformat()}")
+
+def decode_sync_cursor(cursor: str) -> Tuple[str, str, datetime]:
+    changed_at, rest = decode_cursor(cursor)
+    clipped_code_id, _, synced_at = rest.partition("|")
+    try:
+        return changed_at, clipped_code_id, naive_utc(datetime.fromisoformat(synced_at or changed_at))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, clipped_code_id = base64.urlsafe_b64decode(padded).decode().split("|", 1)
+        datetime.fromisoformat(created_at)
+        return created_at, clipped_code_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def make_etag(*parts) -> str:
+    """Strong ETag over the values that determine a response."""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # A weak validator compares equal for GET (RFC 9110 section 13.1.2); CompressionMiddleware
+    # sends compressed bodies as "<etag>-gzip" / "<etag>-br", which validate the same resource
+    return etag in (strip_etag_encoding(tag.strip().removeprefix("W/")) for tag in header.split(","))
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+# Create clipped code; code the user already saved returns the existing clip
+@router.post("/", response_model=ClippedCodeCreateResponse)
 async def create_clipped_code(clipped_code: ClippedCodeCreate):
+    # One statement: duplicate check, body upsert and insert; the userId foreign key checks the user
+    blob_hash, normalized, size = prepare_blob(clipped_code.codeContent)
+    vector = embed_text(clipped_code.title, clipped_code.notes, normalized)
     try:
-        user = await prisma.user.find_unique(where={"id": clipped_code.userId})
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        db_clipped_code = await prisma.clippedcode.create(
-            data={
-                "userId": clipped_code.userId,
-                "title": clipped_code.title,
-                "codeContent": clipped_code.codeContent,
-                "language": clipped_code.language,
-                "isAiGenerated": clipped_code.isAiGenerated,
-                "notes": clipped_code.notes,
-                "timeComplexity": clipped_code.timeComplexity,
-                "spaceComplexity": clipped_code.spaceComplexity
-            }
+        rows = await prisma.query_raw(
+            CREATE_CLIP_SQL,
+            blob_hash, normalized, size, cuid(), clipped_code.userId, clipped_code.title,
+            clipped_code.language, clipped_code.isAiGenerated, clipped_code.notes,
+            clipped_code.timeComplexity, clipped_code.spaceComplexity,
+            encode_vector(vector), EMBEDDING_VERSION
         )
-        return db_clipped_code
+    except db_errors().RawQueryError as e:
+        if is_foreign_key_violation(e):
+            raise HTTPException(status_code=404, detail="User not found")
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    if not rows[0]["alreadySaved"]:
+        embedding_index.add([(clipped_code.userId, rows[0]["id"], vector)])
+    return {**rows[0], "codeContent": normalized}
+
+# Search a user's clipped codes by words (full text) or identifier fragments (trigram)
+@router.get("/search", response_model=List[ClippedCodeSearchHit])
+async def search_clipped_codes(
+    user_id: str,
+    q: str = Query(..., min_length=1, max_length=200),
+    language: Optional[str] = None,
+    is_ai_generated: Optional[bool] = Query(None, alias="isAiGenerated"),
+    limit: int = Query(20, ge=1, le=100)
+):
+    rows = await prisma.query_raw(
+        SEARCH_CLIPS_SQL, user_id, q, f"%{escape_like(q)}%", language, is_ai_generated, limit
+    )
+    return rows
+
+class LineSplitter:
+    """
+    Splits a byte stream into numbered lines, buffering at most `max_line`
+    bytes: the rest of a longer line is dropped and it comes out as None.
+    """
+
+    def __init__(self, max_line: int):
+        self.max_line = max_line
+        self.line_number = 0
+        self._pending = bytearray()
+        self._oversized = False
+
+    def feed(self, data: bytes) -> List[Tuple[int, Optional[bytes]]]:
+        lines = []
+        start = 0
+        while True:
+            newline = data.find(b"\n", start)
+            if newline == -1:
+                self._buffer(data[start:])
+                return lines
+            self._buffer(data[start:newline])
+            lines.extend(self._end_line())
+            start = newline + 1
+
+    def finish(self) -> List[Tuple[int, Optional[bytes]]]:
+        return self._end_line()
+
+    def _buffer(self, data: bytes) -> None:
+        if self._oversized:
+            return
+        if len(self._pending) + len(data) > self.max_line:
+            self._oversized = True
+            self._pending.clear()
+        else:
+            self._pending += data
+
+    def _end_line(self) -> List[Tuple[int, Optional[bytes]]]:
+        self.line_number += 1
+        line, oversized = bytes(self._pending), self._oversized
+        self._pending.clear()
+        self._oversized = False
+        if oversized:
+            return [(self.line_number, None)]
+        return [(self.line_number, line)] if line.strip() else []
+
+async def iter_ndjson_lines(request: Request, max_line: int) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """
+    Yield (line number, line) from a streamed, optionally gzip-compressed
+    NDJSON body; lines over `max_line` bytes come out as None.
+    """
+    is_gzip = (
+        request.headers.get("content-encoding", "").lower() == "gzip"
+        or request.headers.get("content-type", "").split(";")[0].strip() in GZIP_CONTENT_TYPES
+    )
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if is_gzip else None
+    splitter = LineSplitter(max_line)
+
+    async for chunk in request.stream():
+        if not decompressor:
+            for line in splitter.feed(chunk):
+                yield line
+            continue
+        while chunk:
+            data = decompressor.decompress(chunk, GZIP_OUTPUT_CHUNK)
+            chunk = decompressor.unconsumed_tail
+            for line in splitter.feed(data):
+                yield line
+
+    if decompressor:
+        for line in splitter.feed(decompressor.flush()):
+            yield line
+    for line in splitter.finish():
+        yield line
+
+# Bulk import clipped codes from NDJSON, one ClippedCodeCreate per line
+@router.post("/bulk")
+async def bulk_create_clipped_codes(request: Request):
+    inserted = 0
+    failed = 0
+    errors = []
+    known_users = set()
+    batch = []
+
+    def record_error(line_number: int, message: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < BULK_MAX_REPORTED_ERRORS:
+            errors.append({"line": line_number, "error": message})
+
+    async def flush():
+        nonlocal inserted
+        unknown = {clipped_code.userId for _, clipped_code in batch} - known_users
+        if unknown:
+            users = await prisma.user.find_many(where={"id": {"in": list(unknown)}})
+            known_users.update(user.id for user in users)
+
+        line_numbers = []
+        clips = []
+        for line_number, clipped_code in batch:
+            if clipped_code.userId in known_users:
+                line_numbers.append(line_number)
+                clips.append(clipped_code.model_dump())
+            else:
+                record_error(line_number, "User not found")
+
+        if clips:
+            for clip in clips:
+                clip["id"] = cuid()
+            rows, blobs = blob_rows(clips)
+            # Tokenizing a whole batch would stall the event loop
+            embeddings, vectors = await asyncio.to_thread(embedding_rows, clips)
+            try:
+                async with prisma.batch_() as transaction:
+                    transaction.execute_raw(UPSERT_BLOBS_SQL, blobs)
+                    transaction.clippedcode.create_many(data=rows)
+                    transaction.execute_raw(UPSERT_EMBEDDINGS_SQL, embeddings)
+                inserted += len(rows)
+                embedding_index.add(vectors)
+            except Exception as e:
+                for line_number in line_numbers:
+                    record_error(line_number, str(e))
+        batch.clear()
+
+    max_line = settings.BULK_IMPORT_MAX_LINE_BYTES
+    async for line_number, line in iter_ndjson_lines(request, max_line):
+        if line is None:
+            record_error(line_number, f"Line is longer than {max_line} bytes")
+            continue
+        try:
+            batch.append((line_number, ClippedCodeCreate.model_validate_json(line)))
+        except ValidationError as e:
+            record_error(line_number, str(e))
+            continue
+        if len(batch) >= BULK_BATCH_SIZE:
+            await flush()
+
+    if batch:
+        await flush()
 
-# Get clipped code by id
+    return {"inserted": inserted, "failed": failed, "errors": errors}
+
+# Stream all clipped codes of a user as NDJSON, newest first
+@router.get("/user/{user_id}/export")
+async def export_user_clipped_codes(user_id: str):
+    async def rows():
+        where = {"userId": user_id}
+        while True:
+            page = await prisma.clippedcode.find_many(
+                where=where,
+                order=[{"createdAt": "desc"}, {"id": "desc"}],
+                take=EXPORT_PAGE_SIZE,
+                include=WITH_BLOB
+            )
+            for clipped_code in page:
+                yield ClippedCodeResponse.model_validate(clipped_code).model_dump_json() + "\n"
+            if len(page) < EXPORT_PAGE_SIZE:
+                break
+            last = page[-1]
+            where = {
+                "userId": user_id,
+                "OR": [
+                    {"createdAt": {"lt": last.createdAt}},
+                    {"createdAt": last.createdAt, "id": {"lt": last.id}}
+                ]
+            }
+
+    return StreamingResponse(
+        rows(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="clipped-codes-{user_id}.ndjson"'}
+    )
+
+# Get clipped code by id; answers 304 when If-None-Match carries the current ETag
 @router.get("/{clipped_code_id}", response_model=ClippedCodeResponse)
-async def get_clipped_code(clipped_code_id: str):
+async def get_clipped_code(clipped_code_id: str, request: Request, response: Response):
+    if request.headers.get("if-none-match"):
+        # Revalidation: compare against the bare row before loading the body
+        current = await prisma.clippedcode.find_unique(where={"id": clipped_code_id})
+        if not current:
+            raise HTTPException(status_code=404, detail="Clipped code not found")
+        etag = make_etag(current.id, current.updatedAt.isoformat())
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
     clipped_code = await prisma.clippedcode.find_unique(
-        where={"id": clipped_code_id}
+        where={"id": clipped_code_id},
+        include=WITH_BLOB
     )
     if not clipped_code:
         raise HTTPException(status_code=404, detail="Clipped code not found")
+    response.headers["ETag"] = make_etag(clipped_code.id, clipped_code.updatedAt.isoformat())
     return clipped_code
 
-# Get all clipped codes for a user
+# Get all clipped codes for a user; answers 304 when If-None-Match carries the current ETag
 @router.get("/user/{user_id}", response_model=List[ClippedCodeResponse])
-async def get_user_clipped_codes(user_id: str):
+async def get_user_clipped_codes(user_id: str, request: Request, response: Response):
+    # Any create, update or delete moves the count, the newest updatedAt or the newest tombstone
+    versions = await prisma.query_raw(
+        '''
+        SELECT (SELECT count(*) FROM "ClippedCode" WHERE "userId" = $1) AS count,
+               (SELECT max("updatedAt") FROM "ClippedCode" WHERE "userId" = $1) AS "lastUpdated",
+               (SELECT max("deletedAt") FROM "ClippedCodeTombstone" WHERE "userId" = $1) AS "lastDeleted"
+        ''',
+        user_id
+    )
+    version = versions[0]
+    etag = make_etag(user_id, version["count"], version["lastUpdated"], version["lastDeleted"])
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
     clipped_codes = await prisma.clippedcode.find_many(
         where={"userId": user_id},
-        order={"createdAt": "desc"}
+        order={"createdAt": "desc"},
+        include=WITH_BLOB
     )
     return clipped_codes
 
+# Incremental sync: clips changed and deleted since a watermark, oldest change first.
+# Pass `since` (an updatedAt timestamp) on the first call, then the returned `cursor`.
+# Tombstones are pruned after SYNC_TOMBSTONE_RETENTION_DAYS, so a client whose copy was
+# last complete before that gets 410: fetch the full list again, then sync from its time.
+# The last SYNC_COMMIT_LAG_SECONDS are re-sent on every call, so apply changes idempotently.
+@router.get("/user/{user_id}/changes", response_model=ClippedCodeChanges)
+async def get_user_clipped_code_changes(
+    user_id: str,
+    since: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=CHANGES_MAX_LIMIT)
+):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    if cursor:
+        changed_at, last_id, synced_at = decode_sync_cursor(cursor)
+    elif since:
+        synced_at, last_id = naive_utc(since), ""
+        changed_at = synced_at.isoformat()
+    else:
+        # First sync: the client holds nothing, so only deletions from now on matter
+        synced_at, last_id = now, ""
+        changed_at = datetime(1970, 1, 1).isoformat()
+
+    retention_days = settings.SYNC_TOMBSTONE_RETENTION_DAYS
+    if retention_days > 0 and synced_at < now - timedelta(days=retention_days):
+        raise HTTPException(
+            status_code=410,
+            detail=f"Deletions are only kept for {retention_days} days; fetch all clips again to resync"
+        )
+
+    # One ordered feed over live rows and tombstones; fetch one extra to know if more remain
+    feed = await prisma.query_raw(
+        '''
+        SELECT id, "changedAt", deleted FROM (
+            SELECT id, "updatedAt" AS "changedAt", false AS deleted
+            FROM "ClippedCode"
+            WHERE "userId" = $1 AND ("updatedAt", id) > ($2::timestamp, $3)
+            UNION ALL
+            SELECT id, "deletedAt", true
+            FROM "ClippedCodeTombstone"
+            WHERE "userId" = $1 AND ("deletedAt", id) > ($2::timestamp, $3)
+        ) changes
+        ORDER BY "changedAt", id
+        LIMIT $4
+        ''',
+        user_id, changed_at, last_id, limit + 1
+    )
+    has_more = len(feed) > limit
+    feed = feed[:limit]
+
+    changed_ids = [row["id"] for row in feed if not row["deleted"]]
+    changed = []
+    if changed_ids:
+        clips = await prisma.clippedcode.find_many(where={"id": {"in": changed_ids}}, include=WITH_BLOB)
+        by_id = {clip.id: clip for clip in clips}
+        # A clip deleted between the two queries is reported on the next call
+        changed = [by_id[clip_id] for clip_id in changed_ids if clip_id in by_id]
+
+    if feed:
+        changed_at, last_id = feed[-1]["changedAt"], feed[-1]["id"]
+    if not has_more:
+        # Caught up. updatedAt/deletedAt are stamped at write time, so a transaction still
+        # open now can commit a change stamped before the last row: keep the position at
+        # most SYNC_COMMIT_LAG_SECONDS back and scan that window again on the next call
+        horizon = now - timedelta(seconds=settings.SYNC_COMMIT_LAG_SECONDS)
+        synced_at = horizon
+        if naive_utc(datetime.fromisoformat(str(changed_at))) > horizon:
+            changed_at, last_id = horizon.isoformat(), ""
+    next_cursor = encode_sync_cursor(changed_at, last_id, synced_at)
+    return {
+        "changed": changed,
+        "deleted": [{"id": row["id"], "deletedAt": row["changedAt"]} for row in feed if row["deleted"]],
+        "cursor": next_cursor,
+        "hasMore": has_more
+    }
+
+# Report code a user has saved more than once, most repeated first
+@router.get("/user/{user_id}/duplicates", response_model=DuplicateReport)
+async def get_user_duplicate_clipped_codes(user_id: str, limit: int = Query(50, ge=1, le=200)):
+    rows = await prisma.query_raw(
+        f'''
+        SELECT c."contentHash", b.size, count(*)::int AS count,
+               array_agg(c.id ORDER BY c."createdAt") AS "clipIds",
+               array_agg(c.title ORDER BY c."createdAt") AS titles,
+               sum(count(*) - 1) OVER ()::int AS "duplicateClips",
+               sum((count(*) - 1) * b.size) OVER ()::bigint AS "savedBytes"
+        FROM {CLIPS_WITH_BLOBS}
+        WHERE c."userId" = $1
+        GROUP BY c."contentHash", b.size
+        HAVING count(*) > 1
+        ORDER BY count(*) DESC, b.size DESC
+        LIMIT $2
+        ''',
+        user_id, limit
+    )
+    return {
+        "groups": rows,
+        "duplicateClips": rows[0]["duplicateClips"] if rows else 0,
+        "savedBytes": rows[0]["savedBytes"] if rows else 0
+    }
+
+async def similar_summaries(hits: List[Tuple[str, float]]) -> List[dict]:
+    """Summary rows with scores for index hits, best first; skips clips deleted meanwhile."""
+    if not hits:
+        return []
+    rows = await prisma.query_raw(
+        f'''
+        SELECT {SUMMARY_COLUMNS}
+        FROM {CLIPS_WITH_BLOBS}
+        WHERE c.id IN (SELECT jsonb_array_elements_text($1::jsonb))
+        ''',
+        json.dumps([clip_id for clip_id, _ in hits])
+    )
+    by_id = {row["id"]: row for row in rows}
+    return [{**by_id[clip_id], "score": score} for clip_id, score in hits if clip_id in by_id]
+
+# Clips of the same user most similar to this one (hashed n-gram embeddings)
+@router.get("/{clipped_code_id}/similar", response_model=List[ClippedCodeSimilar])
+async def get_similar_clipped_codes(
+    clipped_code_id: str,
+    limit: int = Query(10, ge=1, le=SIMILAR_MAX_LIMIT),
+    min_score: float = Query(0.1, alias="minScore", ge=-1, le=1)
+):
+    clipped_code = await prisma.clippedcode.find_unique(where={"id": clipped_code_id})
+    if not clipped_code:
+        raise HTTPException(status_code=404, detail="Clipped code not found")
+
+    index = await embedding_index.get(clipped_code.userId)
+    vector = index.vector(clipped_code_id)
+    if vector is None:
+        # Saved through another worker after this index was loaded
+        clipped_code = await prisma.clippedcode.find_unique(where={"id": clipped_code_id}, include=WITH_BLOB)
+        if not clipped_code:
+            raise HTTPException(status_code=404, detail="Clipped code not found")
+        vector = embed_text(clipped_code.title, clipped_code.notes, clipped_code.blob.content)
+    return await similar_summaries(index.search(vector, limit, exclude=clipped_code_id, min_score=min_score))
+
+# A user's clips most similar to free text or code, e.g. before asking /ai/chat again
+@router.get("/user/{user_id}/similar", response_model=List[ClippedCodeSimilar])
+async def find_similar_user_clipped_codes(
+    user_id: str,
+    q: str = Query(..., min_length=1, max_length=20000),
+    limit: int = Query(10, ge=1, le=SIMILAR_MAX_LIMIT),
+    min_score: float = Query(0.1, alias="minScore", ge=-1, le=1)
+):
+    index = await embedding_index.get(user_id)
+    vector = embed_text("", None, q)
+    return await similar_summaries(index.search(vector, limit, min_score=min_score))
+
+# Get one page of lightweight clipped code summaries for a user, newest first
+@router.get("/user/{user_id}/page", response_model=ClippedCodePage)
+async def get_user_clipped_codes_page(
+    user_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None
+):
+    # Fetch one extra row to know whether another page exists
+    if cursor:
+        created_at, clipped_code_id = decode_cursor(cursor)
+        rows = await prisma.query_raw(
+            f'''
+            SELECT {SUMMARY_COLUMNS}
+            FROM {CLIPS_WITH_BLOBS}
+            WHERE c."userId" = $1 AND (c."createdAt", c.id) < ($2::timestamp, $3)
+            ORDER BY c."createdAt" DESC, c.id DESC
+            LIMIT $4
+            ''',
+            user_id, created_at, clipped_code_id, limit + 1
+        )
+    else:
+        rows = await prisma.query_raw(
+            f'''
+            SELECT {SUMMARY_COLUMNS}
+            FROM {CLIPS_WITH_BLOBS}
+            WHERE c."userId" = $1
+            ORDER BY c."createdAt" DESC, c.id DESC
+            LIMIT $2
+            ''',
+            user_id, limit + 1
+        )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["createdAt"], rows[-1]["id"])
+    return {"items": rows, "nextCursor": next_cursor}
+
+# Update many clipped codes with the same changes in one statement
+@router.patch("/batch", response_model=ClippedCodeBatchResult)
+async def batch_update_clipped_codes(batch: ClippedCodeBatchUpdate):
+    ids = batch_ids(batch.ids)
+    arguments = update_arguments(batch.changes)
+    try:
+        rows = await prisma.query_raw(UPDATE_CLIPS_SQL, json.dumps(ids), *arguments)
+        if rows and changes_embedding(batch.changes):
+            if batch.changes.codeContent is not None:
+                clips = [{**row, "codeContent": arguments[1]} for row in rows]
+            else:
+                clips = await prisma.query_raw(CLIPS_TO_EMBED_SQL, json.dumps([row["id"] for row in rows]))
+            await refresh_embeddings(clips)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return batch_result(ids, rows)
+
+# Delete many clipped codes in one statement
+@router.delete("/batch", response_model=ClippedCodeBatchResult)
+async def batch_delete_clipped_codes(batch: ClippedCodeBatchDelete):
+    ids = batch_ids(batch.ids)
+    try:
+        rows = await prisma.query_raw(DELETE_CLIPS_SQL, json.dumps(ids))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Stored vectors go with the rows (ON DELETE CASCADE)
+    for row in rows:
+        embedding_index.remove(row["userId"], row["id"])
+    return batch_result(ids, rows)
+
 # Update clipped code
 @router.patch("/{clipped_code_id}", response_model=ClippedCodeResponse)
 async def update_clipped_code(clipped_code_id: str, update_data: ClippedCodeUpdate):
     try:
-        current_code = await prisma.clippedcode.find_unique(
-            where={"id": clipped_code_id}
-        )
-        if not current_code:
+        if update_data.codeContent is None:
+            update_fields = {
+                field: getattr(update_data, field) for field in UPDATABLE_FIELDS
+                if getattr(update_data, field) is not None
+            }
+            # Returns None instead of raising when the row does not exist
+            clipped_code = await prisma.clippedcode.update(
+                where={"id": clipped_code_id},
+                data=update_fields,
+                include=WITH_BLOB
+            )
+            if not clipped_code:
+                raise HTTPException(status_code=404, detail="Clipped code not found")
+            if changes_embedding(update_data):
+                await refresh_embeddings([{
+                    "id": clipped_code.id, "userId": clipped_code.userId, "title": clipped_code.title,
+                    "notes": clipped_code.notes, "codeContent": clipped_code.blob.content
+                }])
+            return clipped_code
+
+        # New body: store it and repoint the clip in one statement; triggers move the refcounts
+        arguments = update_arguments(update_data)
+        rows = await prisma.query_raw(UPDATE_CLIPS_SQL, json.dumps([clipped_code_id]), *arguments)
+        if not rows:
             raise HTTPException(status_code=404, detail="Clipped code not found")
-            
-        update_fields = {}
-        for field in ["title", "codeContent", "language", "isAiGenerated", 
-                      "notes", "timeComplexity", "spaceComplexity"]:
-            if getattr(update_data, field) is not None:
-                update_fields[field] = getattr(update_data, field)
-
-        clipped_code = await prisma.clippedcode.update(
-            where={"id": clipped_code_id},
-            data=update_fields
-        )
+        clipped_code = {**rows[0], "codeContent": arguments[1]}
+        await refresh_embeddings([clipped_code])
         return clipped_code
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -77,15 +766,13 @@ async def update_clipped_code(clipped_code_id: str, update_data: ClippedCodeUpda
 @router.delete("/{clipped_code_id}")
 async def delete_clipped_code(clipped_code_id: str):
     try:
-        current_code = await prisma.clippedcode.find_unique(
-            where={"id": clipped_code_id}
-        )
-        if not current_code:
-            raise HTTPException(status_code=404, detail="Clipped code not found")
-            
-        await prisma.clippedcode.delete(
+        # Returns None instead of raising when the row does not exist
+        deleted = await prisma.clippedcode.delete(
             where={"id": clipped_code_id}
         )
-        return {"message": "Clipped code deleted successfully"}
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Clipped code not found")
+    embedding_index.remove(deleted.userId, deleted.id)
+    return {"message": "Clipped code deleted successfully"}
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from typing import Optional
+from ....core.config import settings
+from ....core.security import get_user_by_id, require_admin
+from ....jobs.enrich_clips import JobAlreadyRunning, jobs, start_enrichment_job
+
+# Jobs spend OpenAI budget across users' clips: operators only (X-Admin-Token)
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+class EnrichClipsRequest(BaseModel):
+    userId: Optional[str] = None
+    limit: Optional[int] = None
+
+# Start filling in missing notes and complexities for one user's clips (or everyone's)
+@router.post("/enrich-clips", status_code=202)
+async def enrich_clips(request: EnrichClipsRequest):
+    if not settings.OPENAI_API_KEY:
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+
+    if request.userId:
+        user = await get_user_by_id(request.userId)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+    try:
+        job = await start_enrichment_job(request.userId, request.limit)
+    except JobAlreadyRunning as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return job.progress()
+
+# List the jobs started on this worker
+@router.get("/")
+async def list_jobs():
+    return [job.progress() for job in jobs.values()]
+
+# Get a job's progress
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.progress()
@@ -1,15 +1,18 @@
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from ....schemas.user import UserCreate, UserResponse, PasswordUpdate
-from ....core.security import get_password_hash, verify_password, create_access_token, decode_access_token
+from ....core.security import (
+    get_password_hash_async, verify_and_update_password, create_access_token,
+    get_user_by_id, invalidate_user, get_current_user as authenticated_user
+)
 from app.db import prisma
 from datetime import datetime, timedelta
 import re
 from ....schemas.auth import Token, LoginData 
+from ....core.rate_limit import LOGIN_ACCOUNT_LIMIT, LOGIN_IP_LIMIT, RateLimitExceeded, client_ip, hashed_key, rate_limiter
 
 router = APIRouter()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 def validate_password(password: str) -> bool:
     """
@@ -51,7 +54,7 @@ async def create_user(user: UserCreate):
                 detail="Password must be at least 8 characters long and contain uppercase, lowercase, numbers, and special characters"
             )
 
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await get_password_hash_async(user.password)
 
         db_user = await prisma.user.create(
             data={
@@ -75,34 +78,29 @@ async def create_user(user: UserCreate):
 
 # Get current user
 @router.get("/me", response_model=UserResponse)
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    try:
-        user_id = decode_access_token(token)
-        
-        user = await prisma.user.find_unique(
-            where={"id": user_id}
-        )
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-            
-        return user
-    except Exception as e:
-        raise HTTPException(
-            status_code=401,
-            detail="Could not validate credentials"
-        )
+async def get_current_user(current_user = Depends(authenticated_user)):
+    return current_user
 
 # Get user by id
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(user_id: str):
-    user = await prisma.user.find_unique(where={"id": user_id})
+    user = await get_user_by_id(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 # Login
 @router.post("/login", response_model=Token)
-async def login(login_data: LoginData):
+async def login(login_data: LoginData, request: Request):
+    # Checked before any lookup: every attempt that gets through costs a 64 MiB Argon2 verify
+    try:
+        await rate_limiter.hit("login", [
+            (f"account:{hashed_key(login_data.email)}", LOGIN_ACCOUNT_LIMIT),
+            (f"ip:{client_ip(request)}", LOGIN_IP_LIMIT)
+        ])
+    except RateLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
     try:
         user = await prisma.user.find_unique(
             where={"email": login_data.email}
@@ -114,12 +112,21 @@ async def login(login_data: LoginData):
                 detail="Email not found"
             )
 
-        if not verify_password(login_data.password, user.password):
+        is_valid, new_hash = await verify_and_update_password(login_data.password, user.password)
+        if not is_valid:
             raise HTTPException(
                 status_code=401,
                 detail="Incorrect password"
             )
 
+        # Transparently upgrade hashes created with older Argon2 parameters
+        if new_hash:
+            await prisma.user.update(
+                where={"id": user.id},
+                data={"password": new_hash}
+            )
+            invalidate_user(user.id)
+
         access_token_expires = timedelta(minutes=30) # logging user out after 30 minutes
         access_token = create_access_token(
             data={"sub": user.id},  
@@ -138,11 +145,13 @@ async def login(login_data: LoginData):
 @router.patch("/{user_id}/password")
 async def update_password(user_id: str, password_data: PasswordUpdate):
     try:
+        # Straight from the DB: a cached copy on another worker may predate a password change
         user = await prisma.user.find_unique(where={"id": user_id})
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        if not verify_password(password_data.currentPassword, user.password):
+        is_valid, _ = await verify_and_update_password(password_data.currentPassword, user.password)
+        if not is_valid:
             raise HTTPException(status_code=400, detail="Current password is incorrect")
         
         if not validate_password(password_data.newPassword):
@@ -151,12 +160,13 @@ async def update_password(user_id: str, password_data: PasswordUpdate):
                 detail="Password must be at least 8 characters long and contain uppercase, lowercase, numbers, and special characters"
             )
         
-        hashed_password = get_password_hash(password_data.newPassword)
+        hashed_password = await get_password_hash_async(password_data.newPassword)
         
         updated_user = await prisma.user.update(
             where={"id": user_id},
             data={"password": hashed_password}
         )
+        invalidate_user(user_id)
         
         return {"message": "Password updated successfully"}
         
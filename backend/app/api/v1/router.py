@@ -1,8 +1,9 @@
 from fastapi import APIRouter
-from .endpoints import users, clipped_codes, ai
+from .endpoints import users, clipped_codes, ai, jobs
 
 router = APIRouter()
 
 router.include_router(users.router, prefix="/users", tags=["users"])
 router.include_router(clipped_codes.router, prefix="/clipped-codes", tags=["clipped-codes"])
-router.include_router(ai.router, prefix="/ai", tags=["ai"])
\ No newline at end of file
+router.include_router(ai.router, prefix="/ai", tags=["ai"])
+router.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
\ No newline at end of file
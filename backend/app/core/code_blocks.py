@@ -0,0 +1,217 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+HEADER_FIELDS = (
+    ("Title:", "title"),
+    ("Language:", "language"),
+    ("Time Complexity:", "timeComplexity"),
+    ("Space Complexity:", "spaceComplexity"),
+)
+COMPLEXITY_FIELDS = ("timeComplexity", "spaceComplexity")
+NOTES_PREFIX = "Notes:"
+FENCE = "```"
+DEFAULT_NOTES = "No explanation provided."
+# First characters of every header and the fence; other lines skip the prefix checks
+MARKER_INITIALS = frozenset("TLSN`")
+
+Event = Tuple[str, Any]
+
+
+@dataclass
+class CodeBlock:
+    language: Optional[str]
+    code: str
+    info: Optional[str] = None
+
+    def to_response(self) -> Dict[str, Any]:
+        return {"language": self.language, "code": self.code, "info": self.info}
+
+
+@dataclass
+class ParsedCompletion:
+    """Structured view of an AI answer in the SYSTEM_MESSAGES["DEFAULT"] format."""
+    content: str
+    blocks: List[CodeBlock]
+    title: Optional[str]
+    language: Optional[str]
+    notes: str
+    time_complexity: str
+    space_complexity: str
+
+    @property
+    def code(self) -> Optional[str]:
+        return self.blocks[0].code if self.blocks else None
+
+    def to_response(self) -> Dict[str, Any]:
+        """Fields in the shape returned by `/ai/chat`; `blocks` lists every fenced block."""
+        return {
+            "content": self.content,
+            "code": self.code,
+            "title": self.title,
+            "language": self.language,
+            "notes": self.notes,
+            "timeComplexity": self.time_complexity,
+            "spaceComplexity": self.space_complexity,
+            "blocks": [block.to_response() for block in self.blocks],
+        }
+
+
+class IncrementalCodeBlockParser:
+    """
+    Line-oriented state machine over an AI response that arrives in chunks.
+
+    `feed` returns the events completed by the new chunk: `title`, `language`,
+    `timeComplexity` and `spaceComplexity` as soon as their line ends, `notes`
+    when the first code fence closes the notes section, and `code` for every
+    fenced block once its closing fence arrives. Only the trailing partial
+    line is buffered, so each character is scanned a constant number of times.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, str] = {}
+        self.blocks: List[CodeBlock] = []
+        self._partial: List[str] = []
+        self._in_code = False
+        self._block_info: Optional[str] = None
+        self._block_lines: List[str] = []
+        self._collecting_notes = False
+        self._notes_emitted = False
+        self._notes_lines: List[str] = []
+        self._outside_lines: List[str] = []
+        self._plain_lines: List[str] = []
+
+    @property
+    def notes(self) -> str:
+        return " ".join(self._notes_lines).strip() or DEFAULT_NOTES
+
+    def feed(self, chunk: str) -> List[Event]:
+        events: List[Event] = []
+        newline = chunk.rfind("\n")
+        if newline == -1:
+            self._partial.append(chunk)
+            return events
+
+        self._partial.append(chunk[:newline])
+        lines = "".join(self._partial).split("\n")
+        self._partial = [chunk[newline + 1:]]
+        for line in lines:
+            self._process_line(line, events)
+        return events
+
+    def close(self) -> List[Event]:
+        """Flush the trailing line and any unterminated sections."""
+        events: List[Event] = []
+        tail = "".join(self._partial)
+        self._partial = []
+        if tail:
+            self._process_line(tail, events)
+        if self._in_code:
+            self._close_block(events)
+        if self._collecting_notes or not self._notes_emitted:
+            self._emit_notes(events)
+        return events
+
+    def parsed(self) -> ParsedCompletion:
+        if self.blocks:
+            content = "\n".join(self._outside_lines).strip()
+        else:
+            content = " ".join(self._plain_lines).strip()
+
+        language = self.fields.get("language")
+        if not language and self.blocks:
+            language = self.blocks[0].language
+
+        return ParsedCompletion(
+            content=content,
+            blocks=list(self.blocks),
+            title=self.fields.get("title"),
+            language=language,
+            notes=self.notes,
+            time_complexity=self.fields.get("timeComplexity", "N/A"),
+            space_complexity=self.fields.get("spaceComplexity", "N/A"),
+        )
+
+    def result(self) -> Dict[str, Any]:
+        """The parsed response in the shape returned by `/ai/chat`."""
+        return self.parsed().to_response()
+
+    def _process_line(self, raw: str, events: List[Event]) -> None:
+        raw = raw.rstrip("\r")
+        line = raw.strip()
+
+        if self._in_code:
+            if line.startswith(FENCE):
+                self._close_block(events)
+            else:
+                self._block_lines.append(raw)
+            return
+
+        if line.startswith(FENCE):
+            if self._collecting_notes:
+                self._emit_notes(events)
+            self._open_block(line[len(FENCE):].strip(), events)
+            return
+
+        self._outside_lines.append(raw)
+
+        if not line or line[0] not in MARKER_INITIALS:
+            if self._collecting_notes and line:
+                self._notes_lines.append(line)
+            else:
+                self._plain_lines.append(line)
+            return
+
+        for prefix, key in HEADER_FIELDS:
+            if line.startswith(prefix):
+                value = line[len(prefix):].strip()
+                if key in COMPLEXITY_FIELDS:
+                    value = value or "N/A"
+                self.fields[key] = value
+                events.append((key, value))
+                return
+
+        if line.startswith(NOTES_PREFIX):
+            self._collecting_notes = True
+            value = line[len(NOTES_PREFIX):].strip()
+            if value:
+                self._notes_lines.append(value)
+        elif self._collecting_notes and line:
+            self._notes_lines.append(line)
+        else:
+            self._plain_lines.append(line)
+
+    def _open_block(self, info: str, events: List[Event]) -> None:
+        self._in_code = True
+        self._block_info = info or None
+        self._block_lines = []
+        if info and ":" not in info and not self.fields.get("language"):
+            self.fields["language"] = info
+            events.append(("language", info))
+
+    def _close_block(self, events: List[Event]) -> None:
+        block = CodeBlock(
+            language=self._block_info or self.fields.get("language"),
+            code="\n".join(self._block_lines).strip(),
+            info=self._block_info,
+        )
+        self.blocks.append(block)
+        self._in_code = False
+        self._block_info = None
+        self._block_lines = []
+        events.append(("code", block))
+
+    def _emit_notes(self, events: List[Event]) -> None:
+        self._collecting_notes = False
+        self._notes_emitted = True
+        events.append(("notes", self.notes))
+
+
+def extract_code_blocks(content: str) -> ParsedCompletion:
+    """
+    Parse a complete AI answer in one pass over its lines: header fields,
+    notes, every fenced code block with its info string, and the prose.
+    """
+    parser = IncrementalCodeBlockParser()
+    parser.feed(content)
+    parser.close()
+    return parser.parsed()
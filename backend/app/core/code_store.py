@@ -0,0 +1,50 @@
+import hashlib
+import json
+from typing import Iterable, List, Tuple
+
+# Insert bodies unless they are stored already. The no-op update on conflict
+# locks the existing row, so a concurrent delete of its last reference cannot
+# drop it before our clip row points at it. The single-clip writes in
+# clipped_codes.py inline the same upsert into their statements.
+UPSERT_BLOBS_SQL = '''
+    INSERT INTO "CodeBlob" ("hash", "content", "size")
+    SELECT "hash", "content", "size"
+    FROM jsonb_to_recordset($1::jsonb) AS blob("hash" text, "content" text, "size" int)
+    ON CONFLICT ("hash") DO UPDATE SET "refCount" = "CodeBlob"."refCount"
+'''
+
+# Load the body along with a clip
+WITH_BLOB = {"blob": True}
+
+
+def normalize_code(content: str) -> str:
+    """
+    Canonical form of a clip body: LF line endings, no trailing spaces or
+    tabs, no leading or trailing blank lines. Must stay in step with
+    normalize_code() in the code_blobs migration, which hashed existing rows.
+    """
+    lines = content.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip(" \t") for line in lines).strip("\n")
+
+
+def prepare_blob(content: str) -> Tuple[str, str, int]:
+    """(hash, normalized body, size in bytes) for a clip body."""
+    normalized = normalize_code(content)
+    encoded = normalized.encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest(), normalized, len(encoded)
+
+
+def blob_rows(clips: Iterable[dict]) -> Tuple[List[dict], str]:
+    """
+    Swap codeContent for contentHash in clip rows meant for create_many.
+    Returns the rows and the UPSERT_BLOBS_SQL argument for their bodies.
+    """
+    rows = []
+    blobs = {}
+    for clip in clips:
+        row = dict(clip)
+        blob_hash, normalized, size = prepare_blob(row.pop("codeContent"))
+        blobs[blob_hash] = {"hash": blob_hash, "content": normalized, "size": size}
+        row["contentHash"] = blob_hash
+        rows.append(row)
+    return rows, json.dumps(list(blobs.values()))
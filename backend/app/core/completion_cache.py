@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from .cache import LRUCache
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "clipcodeai:completion:"
+
+
+def normalize_content(content: str) -> str:
+    """Normalize line endings and trailing whitespace so trivially different prompts share a key."""
+    lines = content.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def completion_cache_key(model: str, temperature: float, max_tokens: int, messages: List[dict]) -> str:
+    """Stable hash of everything that determines a completion, system message included."""
+    payload = {
+        "model": model,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "messages": [
+            {"role": message["role"].strip().lower(), "content": normalize_content(message["content"])}
+            for message in messages
+        ],
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class MemoryCompletionBackend:
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self._lru = LRUCache(max_entries=max_entries, ttl=ttl, max_bytes=max_bytes)
+
+    async def get(self, key: str) -> Optional[dict]:
+        return self._lru.get(key)
+
+    async def set(self, key: str, value: dict) -> None:
+        size = len(key) + sum(len(str(v)) for v in value.values())
+        self._lru.set(key, value, size=size)
+
+    def stats(self) -> dict:
+        stats = self._lru.stats()
+        # hits/misses are counted by CompletionCache, which also sees coalesced calls
+        stats.pop("hits")
+        stats.pop("misses")
+        return {"backend": "memory", **stats}
+
+
+class RedisCompletionBackend:
+    """Shares completions between workers through any Redis-compatible server."""
+
+    def __init__(self, url: str, ttl: float):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("COMPLETION_CACHE_BACKEND=redis requires the 'redis' package")
+        self._redis = redis.from_url(url)
+        self.ttl = int(ttl)
+        self.errors = 0
+
+    async def get(self, key: str) -> Optional[dict]:
+        try:
+            raw = await self._redis.get(REDIS_KEY_PREFIX + key)
+        except Exception:
+            # A cache outage should cost a miss, not the request
+            self.errors += 1
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: dict) -> None:
+        try:
+            await self._redis.set(REDIS_KEY_PREFIX + key, json.dumps(value), ex=self.ttl or None)
+        except Exception:
+            self.errors += 1
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "errors": self.errors}
+
+
+class CompletionCache:
+    """
+    Completion cache with single-flight deduplication: concurrent requests
+    for the same key wait on one upstream call instead of issuing their own.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def get(self, key: str) -> Optional[dict]:
+        if self.backend is None:
+            return None
+        value = await self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: dict) -> None:
+        if self.backend is not None:
+            await self.backend.set(key, value)
+
+    async def get_or_create(self, key: str, create: Callable[[], Awaitable[dict]]) -> dict:
+        if self.backend is None:
+            return await create()
+
+        while True:
+            cached = await self.get(key)
+            if cached is not None:
+                return cached
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            self.coalesced += 1
+            try:
+                # Shielded so one waiter disconnecting doesn't cancel the shared call
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # The leader's request was cancelled, not ours: the next one through makes the call
+                if not inflight.cancelled():
+                    raise
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            try:
+                value = await create()
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                # Mark as retrieved so a leader without followers doesn't log a warning
+                future.exception()
+                raise
+            # Followers get the answer before the cache write, which awaits Redis and may fail
+            future.set_result(value)
+            try:
+                await self.set(key, value)
+            except Exception as e:
+                logger.warning("Could not cache a completion: %s", e)
+        finally:
+            # Until the write lands, new requests for the key join the resolved future
+            self._inflight.pop(key, None)
+        return value
+
+    def stats(self) -> dict:
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
+        if self.backend is None:
+            return {"backend": "none", **stats}
+        return {**self.backend.stats(), **stats}
+
+
+def build_completion_cache() -> CompletionCache:
+    backend_name = settings.COMPLETION_CACHE_BACKEND.lower()
+    if backend_name == "none":
+        return CompletionCache()
+    if backend_name == "redis":
+        return CompletionCache(RedisCompletionBackend(settings.REDIS_URL, settings.COMPLETION_CACHE_TTL))
+    if backend_name == "memory":
+        return CompletionCache(MemoryCompletionBackend(
+            max_entries=settings.COMPLETION_CACHE_MAX_ENTRIES,
+            max_bytes=settings.COMPLETION_CACHE_MAX_BYTES,
+            ttl=settings.COMPLETION_CACHE_TTL,
+        ))
+    raise ValueError(f"Unknown COMPLETION_CACHE_BACKEND: {settings.COMPLETION_CACHE_BACKEND}")
+
+
+completion_cache = build_completion_cache()
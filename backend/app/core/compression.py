@@ -0,0 +1,204 @@
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from .metrics import REGISTRY, Counter
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Never worth compressing again, or (SSE) must reach the client unbuffered
+SKIP_CONTENT_TYPES = (
+    "text/event-stream", "application/gzip", "application/x-gzip", "application/zip",
+    "image/", "audio/", "video/",
+)
+
+compression_bytes_total = REGISTRY.register(Counter(
+    "clipcodeai_http_compression_bytes_total",
+    "Response body bytes before (in) and after (out) compression.", ["encoding", "stage"]
+))
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """
+    The ETag of an encoded body: strong tags get a coding suffix ("abc" ->
+    "abc-gzip"), since the bytes differ from the identity response's.
+    """
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def strip_etag_encoding(etag: str) -> str:
+    """The identity ETag behind a tag encoded_etag() produced; other tags are returned as they are."""
+    for encoding in ("br", "gzip"):
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick "br" or "gzip" from an Accept-Encoding header, honouring q-values and "*"."""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    wildcard = weights.get("*", 0.0)
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best = max(candidates, key=lambda name: weights.get(name, wildcard))
+    return best if weights.get(best, wildcard) > 0 else None
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        """Compress a chunk; `flush` emits everything so far without ending the stream."""
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + self._brotli.flush() if flush else out
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses with brotli (when installed) or gzip.
+
+    Bodies smaller than `minimum_size` are sent as they are. Streamed
+    responses are compressed chunk by chunk and flushed after each one, so
+    NDJSON exports still arrive progressively; SSE and already compressed
+    content types pass through untouched. Strong ETags of compressed bodies
+    get a coding suffix (see encoded_etag), as do 304s answering one.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 4, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(_header(scope.get("headers", ()), b"accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = message.get("headers", [])
+                content_type = (_header(headers, b"content-type") or "").lower()
+                passthrough = (
+                    message["status"] < 200 or message["status"] in (204, 304)
+                    or _header(headers, b"content-encoding") is not None
+                    or content_type.startswith(SKIP_CONTENT_TYPES)
+                )
+                if passthrough:
+                    if message["status"] == 304:
+                        message = _not_modified_etag(message, scope, encoding)
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if start_message is not None:
+                # First body chunk decides: small complete bodies go out as they are
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(_with_headers(start_message, vary=True))
+                    start_message = None
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                compressed = compressor.compress(body, flush=more_body)
+                if not more_body:
+                    compressed += compressor.finish()
+                await send(_with_headers(
+                    start_message, vary=True, encoding=encoding,
+                    content_length=None if more_body else len(compressed)
+                ))
+                start_message = None
+            else:
+                compressed = compressor.compress(body, flush=more_body)
+                if not more_body:
+                    compressed += compressor.finish()
+
+            compression_bytes_total.inc(len(body), encoding=encoding, stage="in")
+            compression_bytes_total.inc(len(compressed), encoding=encoding, stage="out")
+            await send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def _with_headers(message: dict, vary: bool = False, encoding: Optional[str] = None,
+                  content_length: Optional[int] = None) -> dict:
+    headers: List[Tuple[bytes, bytes]] = [
+        (key, value) for key, value in message.get("headers", [])
+        if not (encoding and key.lower() == b"content-length")
+    ]
+    if vary:
+        headers.append((b"vary", b"Accept-Encoding"))
+    if encoding:
+        etag = _header(headers, b"etag")
+        if etag is not None:
+            headers = [(key, value) for key, value in headers if key.lower() != b"etag"]
+            headers.append((b"etag", encoded_etag(etag, encoding).encode("latin-1")))
+        headers.append((b"content-encoding", encoding.encode()))
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode()))
+    return {**message, "headers": headers}
+
+
+def _not_modified_etag(message: dict, scope, encoding: str) -> dict:
+    # The app validated against the identity tag; a client revalidating its encoded copy must get that tag back
+    headers = message.get("headers", [])
+    etag = _header(headers, b"etag")
+    if etag is None or encoded_etag(etag, encoding) not in (_header(scope.get("headers", ()), b"if-none-match") or ""):
+        return message
+    headers = [(key, value) for key, value in headers if key.lower() != b"etag"]
+    headers.append((b"etag", encoded_etag(etag, encoding).encode("latin-1")))
+    return {**message, "headers": headers}
+
+
+def _header(headers, name: bytes) -> Optional[str]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
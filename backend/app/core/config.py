@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import List, Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "ClipCodeAI"
@@ -7,7 +8,150 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     DATABASE_URL: str
     JWT_SECRET_KEY: str
-    OPENAI_API_KEY: str  
+    OPENAI_API_KEY: str
+
+    # Browser origins allowed by CORS, as a JSON list in the environment:
+    # CORS_ORIGINS='["https://clipcode.example.com"]'
+    CORS_ORIGINS: List[str] = ["http://localhost:5173"]
+    CORS_ALLOW_CREDENTIALS: bool = True
+
+    # Production server (python -m app.serve). WEB_CONCURRENCY=0 starts one worker
+    # per CPU core; every worker has its own DB pool, caches and OpenAI client
+    HOST: str = "0.0.0.0"
+    PORT: int = 8000
+    WEB_CONCURRENCY: int = 0
+    # Seconds in-flight requests (AI streams included) get to finish after SIGTERM
+    GRACEFUL_SHUTDOWN_TIMEOUT: int = 30
+    # Proxies whose X-Forwarded-For is trusted for client IPs (rate limits)
+    FORWARDED_ALLOW_IPS: str = "127.0.0.1"
+
+    # Query engine pool per worker, added to DATABASE_URL unless the URL sets them.
+    # Keep DB_POOL_SIZE x workers under Postgres max_connections; unset keeps
+    # Prisma's default of 2 x CPUs + 1
+    DB_POOL_SIZE: Optional[int] = None
+    DB_POOL_TIMEOUT: int = 10
+    DB_CONNECT_TIMEOUT: int = 10
+
+    # Startup warmup (DB connections, Argon2, JWT, OpenAI client) and the /readyz probe.
+    # In the background by default: the server answers at once and /readyz turns
+    # ready when the warmup is done; False holds startup until then
+    STARTUP_WARMUP: bool = True
+    WARMUP_IN_BACKGROUND: bool = True
+    WARMUP_DB_CONNECTIONS: int = 4
+    WARMUP_OPENAI_REQUEST: bool = True
+    READINESS_DB_TIMEOUT: float = 2.0
+
+    # OpenAI upstream (point OPENAI_BASE_URL at benchmarks/fake_openai.py for local testing)
+    OPENAI_BASE_URL: Optional[str] = None
+    OPENAI_MODEL: str = "gpt-4o-mini"
+    OPENAI_TIMEOUT: float = 60.0
+    OPENAI_MAX_CONNECTIONS: int = 100
+    OPENAI_MAX_KEEPALIVE: int = 20
+
+    # Back-pressure for /ai endpoints: in-flight completions and how many may wait
+    AI_MAX_CONCURRENCY: int = 32
+    AI_MAX_QUEUE: int = 64
+    AI_QUEUE_TIMEOUT: float = 10.0
+
+    # Prompt token budget for /ai/chat (system message included). Older turns
+    # past it are folded into a summary of at most CHAT_CONTEXT_SUMMARY_TOKENS
+    CHAT_CONTEXT_TOKEN_BUDGET: int = 6000
+    CHAT_CONTEXT_SUMMARY_TOKENS: int = 300
+    TOKEN_COUNT_CACHE_MAX_ENTRIES: int = 50000
+    # tiktoken is only used when its BPE file is already in TIKTOKEN_CACHE_DIR (the
+    # approximate count otherwise); set this to let it download the file on first use
+    TOKENIZER_DOWNLOAD: bool = False
+
+    # Server-side conversation histories cached in front of the Conversation/Message tables
+    CONVERSATION_CACHE_MAX_ENTRIES: int = 5000
+    CONVERSATION_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    CONVERSATION_CACHE_TTL: int = 1800
+
+    # Per-user in-memory vector indexes for /clipped-codes/{id}/similar; the TTL
+    # bounds how long writes made on other workers stay invisible
+    EMBEDDING_INDEX_MAX_BYTES: int = 512 * 1024 * 1024
+    EMBEDDING_INDEX_TTL: int = 300
+
+    # Background enrichment of clips missing notes/complexities (app/jobs/enrich_clips.py);
+    # its completions share the AI_MAX_CONCURRENCY slots with the API
+    ENRICH_CONCURRENCY: int = 4
+    ENRICH_REQUESTS_PER_MINUTE: float = 120
+    ENRICH_PAGE_SIZE: int = 200
+    ENRICH_WRITE_BATCH: int = 50
+    ENRICH_CHECKPOINT_DIR: str = ".checkpoints"
+    # A job's JobLease row expires this long after its last renewal (every write batch)
+    ENRICH_LEASE_SECONDS: int = 600
+
+    # Incremental sync (/clipped-codes/user/{id}/changes): tombstones of deleted clips are
+    # pruned after SYNC_TOMBSTONE_RETENTION_DAYS (0 keeps them), and older cursors get a
+    # 410 telling the client to download everything again
+    SYNC_TOMBSTONE_RETENTION_DAYS: int = 30
+    SYNC_TOMBSTONE_PRUNE_INTERVAL: int = 3600
+    # Longest a write transaction may stay open; the feed cursor never passes now minus this
+    SYNC_COMMIT_LAG_SECONDS: int = 60
+
+    # Bulk NDJSON import (POST /clipped-codes/bulk): longer lines (after gunzip)
+    # are skipped and reported as failed without being buffered
+    BULK_IMPORT_MAX_LINE_BYTES: int = 1024 * 1024
+
+    # Write-behind queue for clips saved from /ai/chat with "save": true
+    # (app/core/write_queue.py); a queued clip is readable after at most about
+    # WRITE_QUEUE_FLUSH_INTERVAL seconds
+    WRITE_QUEUE_BATCH_SIZE: int = 100
+    WRITE_QUEUE_FLUSH_INTERVAL: float = 0.05
+    WRITE_QUEUE_MAX_PENDING: int = 10000
+    WRITE_QUEUE_MAX_ATTEMPTS: int = 5
+
+    # Completion cache: "memory", "redis" (shared between workers) or "none"
+    COMPLETION_CACHE_BACKEND: str = "memory"
+    COMPLETION_CACHE_TTL: int = 3600
+    COMPLETION_CACHE_MAX_ENTRIES: int = 10000
+    COMPLETION_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    REDIS_URL: str = "redis://localhost:6379/0"
+
+    # Token buckets (sustained rate per minute + burst) for /ai completions per user
+    # and IP, and for /users/login per account and IP. "memory" keeps them per
+    # worker; "redis" shares them, and the daily quotas, through REDIS_URL. Rates must
+    # be > 0 and bursts >= 1 (set RATE_LIMIT_ENABLED=false to turn limiting off)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    AI_USER_RATE_PER_MINUTE: float = 20
+    AI_USER_BURST: int = 10
+    AI_IP_RATE_PER_MINUTE: float = 60
+    AI_IP_BURST: int = 30
+    LOGIN_ACCOUNT_RATE_PER_MINUTE: float = 5
+    LOGIN_ACCOUNT_BURST: int = 5
+    LOGIN_IP_RATE_PER_MINUTE: float = 20
+    LOGIN_IP_BURST: int = 10
+    # Upstream tokens (prompt + completion) one user may spend per UTC day; 0 disables
+    DAILY_TOKEN_QUOTA: int = 200000
+
+    # Decoded JWTs and user records cached in-process by the auth dependency
+    AUTH_CACHE_TTL: int = 300
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+
+    # Response compression (brotli when the package is installed, else gzip)
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 4
+    COMPRESSION_BROTLI_QUALITY: int = 4
+
+    # Request profiling (app/core/profiling.py), off unless one of these is set:
+    # PROFILE_SAMPLE_PERCENT of requests, plus any request sending X-Admin-Token:
+    # <ADMIN_TOKEN>, are sampled every PROFILE_INTERVAL_MS. The PROFILE_KEEP
+    # slowest are served from /admin/profiles, which takes the same header
+    ADMIN_TOKEN: Optional[str] = None
+    PROFILE_SAMPLE_PERCENT: float = 0.0
+    PROFILE_INTERVAL_MS: float = 5.0
+    PROFILE_KEEP: int = 50
+
+    # One JSON line per request (with request id) on the clipcodeai.access logger
+    LOG_JSON: bool = False
+
+    # Argon2 runs on a dedicated pool; each hash needs ~64 MiB, so the pool is
+    # capped by both HASH_MAX_WORKERS and HASH_MEMORY_BUDGET_MB
+    HASH_MAX_WORKERS: int = 4
+    HASH_MEMORY_BUDGET_MB: int = 256
 
     class Config:
         env_file = ".env"
@@ -18,4 +162,4 @@ class Settings(BaseSettings):
 def get_settings():
     return Settings()
 
-settings = get_settings()
\ No newline at end of file
+settings = get_settings()
@@ -0,0 +1,261 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from .cache import LRUCache
+from .completion_cache import normalize_content
+from .config import settings
+
+# Chat framing overhead per message and for priming the reply, as in
+# OpenAI's token counting guide for the gpt-4o family
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# Fenced blocks shorter than this are cheap enough to repeat
+DEDUPE_MIN_CHARS = 200
+DUPLICATE_PLACEHOLDER = "[same code as in a later message]"
+
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+SUMMARY_CHARS_PER_MESSAGE = 160
+
+FENCED_BLOCK = re.compile(r"```([^\n]*)\n(.*?)```", re.DOTALL)
+# Rough BPE stand-in: words split into ~4 character pieces, one token per symbol
+APPROX_TOKEN = re.compile(r"\w{1,4}|[^\w\s]")
+
+TIKTOKEN_BPE_URL = "https://openaipublic.blob.core.windows.net/encodings/{}.tiktoken"
+
+
+def _bpe_file_cached(encoding_name: str) -> bool:
+    """Whether tiktoken would load the encoding from its cache instead of downloading it."""
+    cache_dir = os.environ.get("TIKTOKEN_CACHE_DIR", os.environ.get("DATA_GYM_CACHE_DIR"))
+    if cache_dir is None:
+        cache_dir = os.path.join(tempfile.gettempdir(), "data-gym-cache")
+    if not cache_dir:
+        # An empty TIKTOKEN_CACHE_DIR turns tiktoken's cache off
+        return False
+    cache_key = hashlib.sha1(TIKTOKEN_BPE_URL.format(encoding_name).encode()).hexdigest()
+    return os.path.exists(os.path.join(cache_dir, cache_key))
+
+
+def _load_encoder(model: str, allow_download: bool) -> Optional[Callable[[str], list]]:
+    """tiktoken if it is installed and its BPE file is cached (or may be downloaded), else None."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        encoding_name = tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        encoding_name = "o200k_base"
+    if not allow_download and not _bpe_file_cached(encoding_name):
+        return None
+    try:
+        return tiktoken.get_encoding(encoding_name).encode_ordinary
+    except Exception:
+        # Download failed or the cached file is corrupt; fall back to the estimate
+        return None
+
+
+class TokenCounter:
+    """
+    Counts message tokens locally, caching counts by content hash so the
+    unchanged prefix of a conversation is only tokenized once. The encoder
+    is loaded on first use (or by the startup warmup), never on import.
+    """
+
+    def __init__(self, model: str, max_entries: int, allow_download: bool = False):
+        self.model = model
+        self.allow_download = allow_download
+        self._encode: Optional[Callable[[str], list]] = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._cache = LRUCache(max_entries=max_entries)
+
+    @property
+    def tokenizer(self) -> str:
+        if not self._loaded:
+            return "unloaded"
+        return "tiktoken" if self._encode else "approximate"
+
+    def load(self) -> None:
+        # Counting also runs in worker threads, so the first callers may race here
+        with self._load_lock:
+            if not self._loaded:
+                self._encode = _load_encoder(self.model, self.allow_download)
+                self._loaded = True
+
+    def count_text(self, text: str) -> int:
+        if not self._loaded:
+            self.load()
+        if self._encode:
+            return len(self._encode(text))
+        return len(APPROX_TOKEN.findall(text))
+
+    def count_message(self, message: dict) -> int:
+        content = message["content"]
+        key = hashlib.blake2b(f"{message['role']}\0{content}".encode(), digest_size=16).digest()
+        count = self._cache.get(key)
+        if count is None:
+            count = TOKENS_PER_MESSAGE + self.count_text(message["role"]) + self.count_text(content)
+            self._cache.set(key, count)
+        return count
+
+    def stats(self) -> dict:
+        return {"tokenizer": self.tokenizer, **self._cache.stats()}
+
+
+@dataclass
+class FittedContext:
+    messages: List[dict]
+    budget: int
+    prompt_tokens: int
+    original_tokens: int
+    dropped_messages: int = 0
+    deduplicated_blocks: int = 0
+    summarized: bool = False
+    tokenizer: str = "approximate"
+
+    @property
+    def trimmed_tokens(self) -> int:
+        return max(self.original_tokens - self.prompt_tokens, 0)
+
+    def to_response(self) -> dict:
+        return {
+            "budget": self.budget,
+            "promptTokens": self.prompt_tokens,
+            "originalTokens": self.original_tokens,
+            "trimmedTokens": self.trimmed_tokens,
+            "droppedMessages": self.dropped_messages,
+            "deduplicatedBlocks": self.deduplicated_blocks,
+            "summarized": self.summarized,
+            "tokenizer": self.tokenizer,
+        }
+
+
+def deduplicate_code_blocks(messages: List[dict]):
+    """
+    Replace code blocks that are pasted again later in the conversation with
+    a short placeholder, keeping the most recent copy. Returns the new
+    message list and the number of blocks replaced.
+    """
+    seen = set()
+    replaced = 0
+    result = list(messages)
+
+    def replace(match) -> str:
+        nonlocal replaced
+        body = match.group(2)
+        if len(body) < DEDUPE_MIN_CHARS:
+            return match.group(0)
+        digest = hashlib.blake2b(normalize_content(body).encode(), digest_size=16).digest()
+        if digest in seen:
+            replaced += 1
+            return f"```{match.group(1)}\n{DUPLICATE_PLACEHOLDER}\n```"
+        seen.add(digest)
+        return match.group(0)
+
+    # Newest first, and blocks within a message last to first, so the latest copy survives
+    for index in range(len(result) - 1, -1, -1):
+        content = result[index]["content"]
+        if "```" not in content:
+            continue
+        for match in reversed(list(FENCED_BLOCK.finditer(content))):
+            content = content[:match.start()] + replace(match) + content[match.end():]
+        if content != result[index]["content"]:
+            result[index] = {**result[index], "content": content}
+
+    return result, replaced
+
+
+def summarize_message(message: dict) -> str:
+    text = FENCED_BLOCK.sub("[code]", message["content"])
+    text = " ".join(text.split())
+    if len(text) > SUMMARY_CHARS_PER_MESSAGE:
+        text = text[:SUMMARY_CHARS_PER_MESSAGE - 3].rstrip() + "..."
+    return f"- {message['role']}: {text}"
+
+
+def fit_to_budget(system_message: dict, history: List[dict], counter: TokenCounter,
+                  budget: int, summary_budget: int) -> FittedContext:
+    """
+    Fit the system message plus history into `budget` prompt tokens.
+
+    Repeated code blocks are collapsed first. If that is not enough, the
+    newest turns that fit are kept (the last message always is) and the
+    dropped older turns are folded into one short extractive summary
+    message of at most `summary_budget` tokens, newest first.
+    """
+    original_tokens = TOKENS_PER_REPLY + counter.count_message(system_message) + sum(
+        counter.count_message(message) for message in history
+    )
+    history, deduplicated = deduplicate_code_blocks(history)
+    counts = [counter.count_message(message) for message in history]
+    system_tokens = counter.count_message(system_message)
+    total = TOKENS_PER_REPLY + system_tokens + sum(counts)
+
+    fitted = FittedContext(
+        messages=[system_message] + history,
+        budget=budget,
+        prompt_tokens=total,
+        original_tokens=original_tokens,
+        deduplicated_blocks=deduplicated,
+        tokenizer=counter.tokenizer,
+    )
+    if total <= budget or len(history) <= 1:
+        return fitted
+
+    available = budget - TOKENS_PER_REPLY - system_tokens - summary_budget
+    kept_tokens = counts[-1]
+    first_kept = len(history) - 1
+    while first_kept > 0 and kept_tokens + counts[first_kept - 1] <= available:
+        first_kept -= 1
+        kept_tokens += counts[first_kept]
+
+    dropped = history[:first_kept]
+    kept = history[first_kept:]
+
+    summary_room = min(summary_budget, budget - TOKENS_PER_REPLY - system_tokens - kept_tokens)
+    summary_lines: List[str] = []
+    summary_tokens = TOKENS_PER_MESSAGE + counter.count_text("system") + counter.count_text(SUMMARY_HEADER)
+    for message in reversed(dropped):
+        line = summarize_message(message)
+        # +1 for the joining newline
+        line_tokens = counter.count_text(line) + 1
+        if summary_tokens + line_tokens > summary_room:
+            break
+        summary_lines.insert(0, line)
+        summary_tokens += line_tokens
+
+    summary_message = None
+    if summary_lines:
+        summary_message = {"role": "system", "content": "\n".join([SUMMARY_HEADER] + summary_lines)}
+    else:
+        summary_tokens = 0
+
+    messages = [system_message]
+    if summary_message:
+        messages.append(summary_message)
+    fitted.messages = messages + kept
+    fitted.prompt_tokens = TOKENS_PER_REPLY + system_tokens + summary_tokens + kept_tokens
+    fitted.dropped_messages = len(dropped)
+    fitted.summarized = summary_message is not None
+    return fitted
+
+
+token_counter = TokenCounter(
+    settings.OPENAI_MODEL, settings.TOKEN_COUNT_CACHE_MAX_ENTRIES, allow_download=settings.TOKENIZER_DOWNLOAD
+)
+
+
+def fit_chat_context(system_message: dict, history: List[dict]) -> FittedContext:
+    return fit_to_budget(
+        system_message,
+        history,
+        token_counter,
+        budget=settings.CHAT_CONTEXT_TOKEN_BUDGET,
+        summary_budget=settings.CHAT_CONTEXT_SUMMARY_TOKENS,
+    )
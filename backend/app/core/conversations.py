@@ -0,0 +1,118 @@
+import asyncio
+import weakref
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from app.db import db_errors, prisma
+from .cache import LRUCache
+from .config import settings
+
+
+class ConversationConflict(Exception):
+    """Another worker appended to the conversation at the same position first."""
+
+
+@dataclass
+class CachedConversation:
+    id: str
+    user_id: str
+    title: Optional[str]
+    messages: List[dict]
+
+    @property
+    def size(self) -> int:
+        return sum(len(message["content"]) for message in self.messages) + 1
+
+
+class ConversationStore:
+    """
+    Conversation histories held in an LRU in front of the Conversation and
+    Message tables, so a turn only reads the DB after a cache miss.
+
+    Turns on one conversation are serialized by a per-conversation lock.
+    Across workers the unique (conversationId, position) index catches
+    concurrent appends, which surface as ConversationConflict.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self._cache = LRUCache(max_entries=max_entries, ttl=ttl, max_bytes=max_bytes)
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def lock(self, conversation_id: str) -> asyncio.Lock:
+        lock = self._locks.get(conversation_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[conversation_id] = lock
+        return lock
+
+    async def create(self, user_id: str, title: Optional[str] = None):
+        conversation = await prisma.conversation.create(data={"userId": user_id, "title": title})
+        self._remember(CachedConversation(conversation.id, user_id, title, []))
+        return conversation
+
+    async def get(self, conversation_id: str) -> Optional[CachedConversation]:
+        cached = self._cache.get(conversation_id)
+        if cached is not None:
+            return cached
+
+        conversation = await prisma.conversation.find_unique(
+            where={"id": conversation_id},
+            include={"messages": {"order_by": {"position": "asc"}}}
+        )
+        if conversation is None:
+            return None
+        cached = CachedConversation(
+            id=conversation.id,
+            user_id=conversation.userId,
+            title=conversation.title,
+            messages=[{"role": m.role, "content": m.content} for m in conversation.messages or []],
+        )
+        self._remember(cached)
+        return cached
+
+    async def append(self, conversation: CachedConversation, messages: List[dict],
+                     title: Optional[str] = None) -> None:
+        """Persist new turns after the cached history in one transaction, then extend the cache."""
+        start = len(conversation.messages)
+        data = {"updatedAt": datetime.now(timezone.utc)}
+        if title and not conversation.title:
+            data["title"] = title
+
+        try:
+            async with prisma.batch_() as batch:
+                batch.message.create_many(data=[
+                    {
+                        "conversationId": conversation.id,
+                        "position": start + offset,
+                        "role": message["role"],
+                        "content": message["content"],
+                    }
+                    for offset, message in enumerate(messages)
+                ])
+                batch.conversation.update(where={"id": conversation.id}, data=data)
+        except db_errors().UniqueViolationError:
+            # Our copy is stale; the next turn reloads it from the DB
+            self._cache.pop(conversation.id)
+            raise ConversationConflict(f"Conversation {conversation.id} was updated concurrently")
+
+        conversation.messages.extend(messages)
+        if "title" in data:
+            conversation.title = title
+        self._remember(conversation)
+
+    def forget(self, conversation_id: str) -> None:
+        self._cache.pop(conversation_id)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+    def _remember(self, conversation: CachedConversation) -> None:
+        self._cache.set(conversation.id, conversation, size=conversation.size)
+
+
+conversation_store = ConversationStore(
+    max_entries=settings.CONVERSATION_CACHE_MAX_ENTRIES,
+    max_bytes=settings.CONVERSATION_CACHE_MAX_BYTES,
+    ttl=settings.CONVERSATION_CACHE_TTL,
+)
@@ -0,0 +1,254 @@
+"""
+Local clip embeddings and the per-user index behind "similar snippets".
+
+A clip's title, notes and code are split into lowercase word pieces
+(identifiers are split on camelCase and snake_case), and every unigram and
+adjacent bigram is hashed into one of EMBEDDING_DIM signed buckets with a
+sublinear term weight. The L2-normalized result compares by cosine
+similarity with a dot product, and needs no model download and no network.
+
+Vectors are stored per clip in ClipEmbedding and written together with the
+clip. Each worker loads a user's vectors into a float32 matrix on first use
+and updates it on its own writes. Writes made on other workers show up once
+EMBEDDING_INDEX_TTL expires the cached index.
+"""
+import asyncio
+import base64
+import json
+import math
+import re
+import weakref
+import zlib
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.db import prisma
+from .cache import LRUCache
+from .config import settings
+
+EMBEDDING_DIM = 256
+# Bump when tokenization or weighting changes; stale vectors are recomputed on load
+EMBEDDING_VERSION = 1
+MAX_EMBEDDED_CODE_CHARS = 20000
+
+FIELD_WEIGHTS = (("title", 2.0), ("notes", 1.0), ("code", 1.0))
+BIGRAM_WEIGHT = 0.5
+
+WORD_PIECE_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+UPSERT_EMBEDDINGS_SQL = '''
+    INSERT INTO "ClipEmbedding" ("clipId", "userId", "vector", "version", "updatedAt")
+    SELECT "clipId", "userId", decode("vector", 'base64'), "version", CURRENT_TIMESTAMP
+    FROM jsonb_to_recordset($1::jsonb) AS e("clipId" text, "userId" text, "vector" text, "version" int)
+    ON CONFLICT ("clipId") DO UPDATE
+    SET "vector" = EXCLUDED."vector", "version" = EXCLUDED."version", "updatedAt" = EXCLUDED."updatedAt"
+'''
+
+# Everything embed_text needs for a list of clip ids
+CLIPS_TO_EMBED_SQL = '''
+    SELECT c.id, c."userId", c.title, c.notes, b.content AS "codeContent"
+    FROM "ClippedCode" c JOIN "CodeBlob" b ON b.hash = c."contentHash"
+    WHERE c.id IN (SELECT jsonb_array_elements_text($1::jsonb))
+'''
+
+
+def word_pieces(text: str) -> List[str]:
+    """getUserById / get_user_by_id -> ["get", "user", "by", "id"]; single letters are dropped."""
+    return [piece.lower() for piece in WORD_PIECE_RE.findall(text) if len(piece) > 1]
+
+
+def embed_text(title: str, notes: Optional[str], code: str) -> np.ndarray:
+    """Unit-length float32 vector of a clip (all zeros when it has no words)."""
+    fields = {"title": title or "", "notes": notes or "", "code": (code or "")[:MAX_EMBEDDED_CODE_CHARS]}
+    features = Counter()
+    for name, weight in FIELD_WEIGHTS:
+        pieces = word_pieces(fields[name])
+        for feature, count in Counter(pieces).items():
+            features[feature] += weight * (1 + math.log(count))
+        for feature, count in Counter(f"{a} {b}" for a, b in zip(pieces, pieces[1:])).items():
+            features[feature] += weight * BIGRAM_WEIGHT * (1 + math.log(count))
+
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    if not features:
+        return vector
+    hashes = np.fromiter((zlib.crc32(feature.encode()) for feature in features), dtype=np.uint32, count=len(features))
+    weights = np.fromiter(features.values(), dtype=np.float32, count=len(features))
+    # Low bits pick the bucket, the top bit the sign, so collisions cancel instead of piling up
+    signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+    vector += np.bincount(hashes % EMBEDDING_DIM, weights=weights * signs, minlength=EMBEDDING_DIM)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def encode_vector(vector: np.ndarray) -> str:
+    return base64.b64encode(vector.astype(np.float16).tobytes()).decode()
+
+
+def embedding_rows(clips: Iterable[dict]) -> Tuple[str, List[Tuple[str, str, np.ndarray]]]:
+    """
+    UPSERT_EMBEDDINGS_SQL argument for clips given as dicts with id, userId,
+    title, notes and codeContent, plus (user id, clip id, vector) for the index.
+    """
+    rows = []
+    vectors = []
+    for clip in clips:
+        vector = embed_text(clip["title"], clip.get("notes"), clip["codeContent"])
+        rows.append({"clipId": clip["id"], "userId": clip["userId"], "vector": encode_vector(vector),
+                     "version": EMBEDDING_VERSION})
+        vectors.append((clip["userId"], clip["id"], vector))
+    return json.dumps(rows), vectors
+
+
+class UserEmbeddingIndex:
+    """One user's vectors as rows of a float32 matrix that grows by doubling."""
+
+    def __init__(self, ids: List[str], vectors: np.ndarray):
+        self.ids = list(ids)
+        self.positions = {clip_id: position for position, clip_id in enumerate(self.ids)}
+        self.matrix = np.zeros((max(16, len(self.ids)), EMBEDDING_DIM), dtype=np.float32)
+        self.matrix[:len(self.ids)] = vectors
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes + 100 * len(self.ids)
+
+    def vector(self, clip_id: str) -> Optional[np.ndarray]:
+        position = self.positions.get(clip_id)
+        return None if position is None else self.matrix[position].copy()
+
+    def upsert(self, clip_id: str, vector: np.ndarray) -> None:
+        position = self.positions.get(clip_id)
+        if position is None:
+            position = len(self.ids)
+            if position == len(self.matrix):
+                grown = np.zeros((len(self.matrix) * 2, EMBEDDING_DIM), dtype=np.float32)
+                grown[:position] = self.matrix
+                self.matrix = grown
+            self.ids.append(clip_id)
+            self.positions[clip_id] = position
+        self.matrix[position] = vector
+
+    def remove(self, clip_id: str) -> None:
+        # Move the last row into the hole so the live rows stay contiguous
+        position = self.positions.pop(clip_id, None)
+        if position is None:
+            return
+        last = len(self.ids) - 1
+        if position != last:
+            moved = self.ids[last]
+            self.ids[position] = moved
+            self.positions[moved] = position
+            self.matrix[position] = self.matrix[last]
+        self.ids.pop()
+        self.matrix[last] = 0
+
+    def search(self, vector: np.ndarray, k: int, exclude: Optional[str] = None,
+               min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """Top-k (clip id, cosine similarity) pairs, best first."""
+        count = len(self.ids)
+        if not count or k <= 0:
+            return []
+        scores = self.matrix[:count] @ vector
+        if exclude in self.positions:
+            scores[self.positions[exclude]] = -np.inf
+        k = min(k, count)
+        top = np.argpartition(-scores, k - 1)[:k] if k < count else np.arange(count)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.ids[i], float(scores[i])) for i in top if scores[i] > min_score]
+
+
+class EmbeddingIndex:
+    """Per-user indexes in an LRU capped by matrix bytes, loaded once per user at a time."""
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self._indexes = LRUCache(max_entries=100000, ttl=ttl, max_bytes=max_bytes)
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    async def get(self, user_id: str) -> UserEmbeddingIndex:
+        index = self._indexes.get(user_id)
+        if index is not None:
+            return index
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[user_id] = lock
+        async with lock:
+            index = self._indexes.get(user_id)
+            if index is None:
+                index = await load_user_index(user_id)
+                self._remember(user_id, index)
+        return index
+
+    def add(self, vectors: Iterable[Tuple[str, str, np.ndarray]]) -> None:
+        """Apply (user id, clip id, vector) writes to the indexes that are loaded."""
+        for user_id, clip_id, vector in vectors:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                index.upsert(clip_id, vector)
+                # The matrix may have doubled; keep the LRU's byte cap honest
+                self._indexes.resize(user_id, index.nbytes)
+
+    def remove(self, user_id: str, clip_id: str) -> None:
+        index = self._indexes.get(user_id)
+        if index is not None:
+            index.remove(clip_id)
+            self._indexes.resize(user_id, index.nbytes)
+
+    def stats(self) -> dict:
+        return self._indexes.stats()
+
+    def _remember(self, user_id: str, index: UserEmbeddingIndex) -> None:
+        self._indexes.set(user_id, index, size=index.nbytes)
+
+
+async def refresh_embeddings(clips: List[dict]) -> None:
+    """Recompute and store the vectors of clips (dicts as for embedding_rows) after a write."""
+    if not clips:
+        return
+    payload, vectors = embedding_rows(clips)
+    await prisma.execute_raw(UPSERT_EMBEDDINGS_SQL, payload)
+    embedding_index.add(vectors)
+
+
+async def load_user_index(user_id: str) -> UserEmbeddingIndex:
+    """Read a user's vectors, computing and storing any that are missing or outdated."""
+    rows = await prisma.query_raw(
+        '''
+        SELECT c.id, encode(e.vector, 'base64') AS vector
+        FROM "ClippedCode" c
+        LEFT JOIN "ClipEmbedding" e ON e."clipId" = c.id AND e.version = $2
+        WHERE c."userId" = $1
+        ''',
+        user_id, EMBEDDING_VERSION
+    )
+    missing = [row["id"] for row in rows if row["vector"] is None]
+    computed = {}
+    if missing:
+        clips = await prisma.query_raw(CLIPS_TO_EMBED_SQL, json.dumps(missing))
+        # Tokenizing thousands of bodies would stall the event loop
+        payload, vectors = await asyncio.to_thread(embedding_rows, clips)
+        await prisma.execute_raw(UPSERT_EMBEDDINGS_SQL, payload)
+        computed = {clip_id: vector for _, clip_id, vector in vectors}
+
+    stored = [row for row in rows if row["vector"] is not None]
+    ids = [row["id"] for row in stored]
+    matrix = np.frombuffer(
+        b"".join(base64.b64decode(row["vector"]) for row in stored), dtype=np.float16
+    ).reshape(len(stored), EMBEDDING_DIM).astype(np.float32)
+    # A clip deleted between the two queries has no computed vector and is skipped
+    fresh = [(clip_id, computed[clip_id]) for clip_id in missing if clip_id in computed]
+    if fresh:
+        ids += [clip_id for clip_id, _ in fresh]
+        matrix = np.vstack([matrix, np.stack([vector for _, vector in fresh])])
+    return UserEmbeddingIndex(ids, matrix)
+
+
+embedding_index = EmbeddingIndex(
+    max_bytes=settings.EMBEDDING_INDEX_MAX_BYTES,
+    ttl=settings.EMBEDDING_INDEX_TTL,
+)
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import signal
+import threading
+import time
+from typing import Tuple
+
+from app.db import prisma, warm_pool
+from .config import settings
+from .context_window import token_counter
+from .openai_client import completion_limiter, warm_up_openai_client
+from .security import warm_up_hashing, warm_up_tokens
+
+logger = logging.getLogger(__name__)
+
+# Set once startup (and warmup) finished, cleared when shutdown begins
+_accepting = False
+_draining = False
+
+
+def set_accepting(accepting: bool) -> None:
+    global _accepting
+    _accepting = accepting
+
+
+def begin_drain() -> None:
+    """Fail /readyz and refuse new completions; in-flight requests keep running."""
+    global _draining
+    _draining = True
+    set_accepting(False)
+    completion_limiter.close()
+
+
+def install_drain_handlers() -> None:
+    """
+    Run begin_drain() as soon as SIGTERM/SIGINT arrives, then hand the signal
+    to the handler already installed (uvicorn's, which starts its graceful
+    shutdown). Call from the lifespan startup, once uvicorn has set its own.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            # No server handler to chain to (e.g. SIG_DFL); keep the default behaviour
+            continue
+
+        def handler(signum, frame, previous=previous):
+            begin_drain()
+            previous(signum, frame)
+
+        signal.signal(sig, handler)
+
+
+async def _timed_step(name: str, coro) -> Tuple[str, float]:
+    started = time.perf_counter()
+    try:
+        await coro
+    except Exception as e:
+        # A failed warmup only means a slower first request, never a failed boot
+        logger.warning("Warmup step %s failed: %s", name, e)
+    return name, round((time.perf_counter() - started) * 1000, 1)
+
+
+async def warm_up() -> dict:
+    """Warm DB connections, the Argon2 pool, JWT, the tokenizer and the OpenAI client concurrently; returns ms per step."""
+    steps = await asyncio.gather(
+        _timed_step("database", warm_pool(settings.WARMUP_DB_CONNECTIONS)),
+        _timed_step("argon2", warm_up_hashing()),
+        _timed_step("jwt", warm_up_tokens()),
+        _timed_step("tokenizer", asyncio.to_thread(token_counter.load)),
+        _timed_step("openai", warm_up_openai_client(open_connection=settings.WARMUP_OPENAI_REQUEST)),
+    )
+    timings = dict(steps)
+    logger.info("Warmup finished: %s", timings)
+    return timings
+
+
+async def warm_up_then_accept() -> None:
+    """Background startup warmup: the server already answers, /readyz turns ready when this is done."""
+    await warm_up()
+    # A SIGTERM during the warmup must not flip readiness back on
+    if not _draining:
+        set_accepting(True)
+
+
+async def check_database(timeout: float) -> dict:
+    """Round trip a trivial query; reports latency either way."""
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(prisma.query_raw("SELECT 1"), timeout=timeout)
+        ok, error = True, None
+    except asyncio.TimeoutError:
+        ok, error = False, f"no answer within {timeout}s"
+    except Exception as e:
+        ok, error = False, str(e) or type(e).__name__
+    check = {"ok": ok, "latencyMs": round((time.perf_counter() - started) * 1000, 2)}
+    if error:
+        check["error"] = error
+    return check
+
+
+async def readiness() -> Tuple[bool, dict]:
+    """(ready, report) for /readyz: accepting traffic and the database answers in time."""
+    if not _accepting:
+        return False, {"status": "unavailable", "reason": "starting or shutting down"}
+
+    database = await check_database(settings.READINESS_DB_TIMEOUT)
+    report = {
+        "status": "ready" if database["ok"] else "unavailable",
+        "checks": {
+            "database": database,
+            # Informational: a busy upstream should shed load with 429s, not leave the pool
+            "completions": {
+                "active": completion_limiter.active,
+                "waiting": completion_limiter.waiting,
+                "saturated": completion_limiter.saturated(),
+            },
+        },
+    }
+    return database["ok"], report
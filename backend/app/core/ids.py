@@ -0,0 +1,42 @@
+import itertools
+import os
+import secrets
+import socket
+import time
+
+BASE36 = "0123456789abcdefghijklmnopqrstuvwxyz"
+BLOCK = 36 ** 4
+
+_counter = itertools.count(secrets.randbelow(BLOCK))
+
+
+def _base36(number: int, width: int) -> str:
+    digits = ""
+    while number:
+        number, digit = divmod(number, 36)
+        digits = BASE36[digit] + digits
+    return digits.rjust(width, "0")[-width:]
+
+
+def _fingerprint() -> str:
+    hostname = socket.gethostname()
+    host_id = sum(ord(char) for char in hostname) + len(hostname) + 36
+    return _base36(os.getpid(), 2) + _base36(host_id, 2)
+
+
+_FINGERPRINT = _fingerprint()
+
+
+def cuid() -> str:
+    """
+    Id in the same cuid format Prisma's @default(cuid()) generates, for rows
+    inserted with raw SQL: timestamp, counter, host fingerprint, random blocks.
+    """
+    return (
+        "c"
+        + _base36(int(time.time() * 1000), 8)
+        + _base36(next(_counter) % BLOCK, 4)
+        + _FINGERPRINT
+        + _base36(secrets.randbelow(BLOCK), 4)
+        + _base36(secrets.randbelow(BLOCK), 4)
+    )
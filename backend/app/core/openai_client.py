@@ -0,0 +1,136 @@
+import asyncio
+import math
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Optional
+
+from .config import settings
+
+
+class CompletionQueueFull(Exception):
+    """Raised when the limiter cannot admit another completion in time."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Too many concurrent AI requests, please retry later")
+        self.retry_after = retry_after
+
+
+class CompletionLimiter:
+    """
+    Bound the number of in-flight upstream completions.
+    Up to `max_concurrency` requests run at once, at most `max_queue` more
+    wait for a slot, and a waiter gives up after `queue_timeout` seconds.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.closed = False
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so the semaphore binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.queue_timeout))
+
+    def saturated(self) -> bool:
+        """True when every slot is busy and the wait queue is full, or the limiter is draining."""
+        return self.closed or (self._get_semaphore().locked() and self.waiting >= self.max_queue)
+
+    async def acquire(self) -> None:
+        semaphore = self._get_semaphore()
+        if self.saturated():
+            raise CompletionQueueFull(self.retry_after())
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise CompletionQueueFull(self.retry_after())
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self) -> None:
+        self.active -= 1
+        self._get_semaphore().release()
+
+    def close(self) -> None:
+        """Refuse new completions (as CompletionQueueFull, so clients retry elsewhere)."""
+        self.closed = True
+
+    async def drain(self, timeout: float) -> bool:
+        """Wait for in-flight completions to finish; False if some were still running at the timeout."""
+        deadline = asyncio.get_running_loop().time() + timeout
+        while self.active and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.05)
+        return not self.active
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+completion_limiter = CompletionLimiter(
+    max_concurrency=settings.AI_MAX_CONCURRENCY,
+    max_queue=settings.AI_MAX_QUEUE,
+    queue_timeout=settings.AI_QUEUE_TIMEOUT,
+)
+
+
+def openai_sdk():
+    """
+    The openai package, imported on first use like the client; its exception
+    classes are matched as `except openai_sdk().APITimeoutError:`.
+    """
+    import openai
+    return openai
+
+@lru_cache()
+def get_openai_client():
+    """Return the shared async OpenAI client backed by a keep-alive connection pool."""
+    import httpx
+    from openai import AsyncOpenAI
+
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE,
+        ),
+        timeout=httpx.Timeout(settings.OPENAI_TIMEOUT, connect=5.0),
+    )
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        http_client=http_client,
+    )
+
+
+async def warm_up_openai_client(open_connection: bool = True) -> None:
+    """
+    Build the shared client and, with `open_connection`, make one cheap call
+    (list models) so the first completion reuses a connected TLS socket.
+    """
+    # The SDK is a large import; load it on a thread so the loop keeps serving
+    await asyncio.to_thread(openai_sdk)
+    client = get_openai_client()
+    if open_connection:
+        await client.models.list(timeout=5.0)
+
+
+async def close_openai_client() -> None:
+    """Close the pooled connections if the client was ever created."""
+    if get_openai_client.cache_info().currsize:
+        await get_openai_client().close()
+        get_openai_client.cache_clear()
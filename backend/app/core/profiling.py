@@ -0,0 +1,260 @@
+"""
+Opt-in sampling profiler for single requests.
+
+ProfilingMiddleware profiles PROFILE_SAMPLE_PERCENT of requests plus any
+request that carries a valid X-Admin-Token header. A profiled request
+registers its asyncio task with the StackSampler. That thread wakes every
+PROFILE_INTERVAL_MS while any profile is active and records one wall-clock
+sample per profiled task:
+
+- when the task is the one running on the event loop, its Python stack
+  (pydantic validation, JSON rendering, parsing, ...);
+- otherwise, the chain of coroutines it is suspended in, ending in an
+  `[await <type>]` leaf (Argon2 on the hash pool, Prisma's query engine,
+  OpenAI, ...).
+
+Samples are aggregated into collapsed stacks (`a;b;c <count>`), the input
+of flamegraph.pl and speedscope. ProfileStore keeps the PROFILE_KEEP slowest
+profiles for /admin/profiles. Nothing is installed unless ADMIN_TOKEN or
+PROFILE_SAMPLE_PERCENT is set, and requests that are not sampled pay one
+header lookup and one random() call.
+"""
+import asyncio
+import heapq
+import itertools
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional
+
+from .config import settings
+from .metrics import route_template
+from .security import admin_token_matches
+
+ADMIN_HEADER = b"x-admin-token"
+MAX_STACK_DEPTH = 128
+# Never profile the endpoints that read the profiles
+EXCLUDED_PREFIXES = ("/admin/", "/metrics")
+
+
+def frame_name(code) -> str:
+    module = code.co_filename.rsplit("/", 1)[-1].removesuffix(".py")
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class RequestProfile:
+    """Collapsed-stack samples of one request."""
+
+    def __init__(self, method: str, path: str, request_id: Optional[str], interval: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.request_id = request_id
+        self.interval = interval
+        self.route = None
+        self.status = None
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.stacks: Counter = Counter()
+        self.on_cpu = 0
+        self.waiting = 0
+
+    @property
+    def samples(self) -> int:
+        return self.on_cpu + self.waiting
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def hot_frames(self, limit: int = 5) -> List[dict]:
+        """Leaf frames by share of samples: where the request spent its time."""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = self.samples or 1
+        return [{"frame": frame, "share": round(count / total, 3)} for frame, count in leaves.most_common(limit)]
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "requestId": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "startedAt": self.started_at,
+            "durationMs": round(self.duration * 1000, 2),
+            "samples": self.samples,
+            "onCpuSamples": self.on_cpu,
+            "waitingSamples": self.waiting,
+            "intervalMs": self.interval * 1000,
+            "hotFrames": self.hot_frames(),
+        }
+
+
+class StackSampler:
+    """
+    Background thread sampling the stacks of registered asyncio tasks. It
+    sleeps on an event while no profile is active, so it costs nothing then.
+    """
+
+    def __init__(self, interval: float, root_code=None):
+        self.interval = interval
+        # Frames above this code object (server and outer middleware) are left out
+        self.root_code = root_code
+        self._active: Dict[asyncio.Task, RequestProfile] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop_thread_id: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self, task: asyncio.Task, profile: RequestProfile) -> None:
+        with self._lock:
+            self._loop = task.get_loop()
+            self._loop_thread_id = threading.get_ident()
+            self._active[task] = profile
+            self._wake.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self, task: asyncio.Task) -> None:
+        # Under the lock, so no sample lands in the profile once this returns
+        with self._lock:
+            self._active.pop(task, None)
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._wake.clear()
+                    continue
+                self._sample()
+
+    def _sample(self) -> None:
+        running = asyncio.current_task(self._loop)
+        loop_frame = sys._current_frames().get(self._loop_thread_id)
+        for task, profile in self._active.items():
+            if task is running and loop_frame is not None:
+                profile.stacks[self._frame_stack(loop_frame)] += 1
+                profile.on_cpu += 1
+            else:
+                profile.stacks[self._await_stack(task)] += 1
+                profile.waiting += 1
+
+    def _frame_stack(self, frame) -> str:
+        names = []
+        while frame is not None and len(names) < MAX_STACK_DEPTH:
+            names.append(frame_name(frame.f_code))
+            if frame.f_code is self.root_code:
+                break
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _await_stack(self, task: asyncio.Task) -> str:
+        names = []
+        awaitable = task.get_coro()
+        while len(names) < MAX_STACK_DEPTH:
+            frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+            if frame is None:
+                # Awaiting a Future shows up as its C iterator
+                kind = type(awaitable).__name__.removesuffix("Iter")
+                names.append(f"[await {kind}]")
+                break
+            if frame.f_code is self.root_code:
+                names.clear()
+            names.append(frame_name(frame.f_code))
+            awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+            if awaitable is None:
+                names.append("[await]")
+                break
+        return ";".join(names)
+
+
+class ProfileStore:
+    """The `keep` slowest profiles seen so far (a min-heap on duration)."""
+
+    def __init__(self, keep: int):
+        self.keep = keep
+        self._heap: list = []
+        self._order = itertools.count()
+        self.recorded = 0
+
+    def add(self, profile: RequestProfile) -> None:
+        self.recorded += 1
+        entry = (profile.duration, next(self._order), profile)
+        if len(self._heap) < self.keep:
+            heapq.heappush(self._heap, entry)
+        elif profile.duration > self._heap[0][0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        for _, _, profile in self._heap:
+            if profile.id == profile_id:
+                return profile
+        return None
+
+    def slowest(self) -> List[RequestProfile]:
+        return [profile for _, _, profile in sorted(self._heap, reverse=True)]
+
+    def clear(self) -> None:
+        self._heap.clear()
+
+    def stats(self) -> dict:
+        return {"kept": len(self._heap), "recorded": self.recorded}
+
+
+profile_store = ProfileStore(keep=settings.PROFILE_KEEP)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles sampled requests; see the module docstring."""
+
+    def __init__(self, app, sample_percent: float = 0.0, interval_ms: float = 5.0,
+                 store: ProfileStore = profile_store):
+        self.app = app
+        self.sample_rate = sample_percent / 100
+        self.store = store
+        self.sampler = StackSampler(interval_ms / 1000, root_code=ProfilingMiddleware.__call__.__code__)
+
+    def should_profile(self, scope) -> bool:
+        if scope["path"].startswith(EXCLUDED_PREFIXES):
+            return False
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        for key, value in scope.get("headers", ()):
+            if key == ADMIN_HEADER:
+                return admin_token_matches(value.decode("latin-1"))
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(
+            scope["method"], scope["path"], scope.get("state", {}).get("request_id"), self.sampler.interval
+        )
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        task = asyncio.current_task()
+        started = time.perf_counter()
+        self.sampler.start(task, profile)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            self.sampler.stop(task)
+            profile.duration = time.perf_counter() - started
+            profile.route = route_template(scope)
+            self.store.add(profile)
@@ -0,0 +1,262 @@
+import hashlib
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from .cache import LRUCache
+from .config import settings
+from .metrics import REGISTRY, Counter
+
+REDIS_KEY_PREFIX = "clipcodeai:ratelimit:"
+USAGE_TTL_SECONDS = 2 * 24 * 3600
+
+rate_limit_rejections_total = REGISTRY.register(Counter(
+    "clipcodeai_rate_limit_rejections_total", "Requests refused by a rate limit or quota.", ["scope"]
+))
+
+# Refill every bucket, then take `cost` from all of them or from none, atomically.
+# KEYS the buckets; ARGV now, cost, then rate/s and capacity per key.
+# Returns {allowed, seconds to wait as a string} (Lua numbers become integers).
+TOKEN_BUCKET_LUA = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local rates, capacities, levels = {}, {}, {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[1 + 2 * i])
+    local capacity = tonumber(ARGV[2 + 2 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    if tokens < cost then
+        wait = math.max(wait, (cost - tokens) / rate)
+    end
+    rates[i], capacities[i], levels[i] = rate, capacity, tokens
+end
+if wait > 0 then
+    return {0, tostring(wait)}
+end
+for i, key in ipairs(KEYS) do
+    local tokens = levels[i] - cost
+    redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil((capacities[i] - tokens) / rates[i] * 1000) + 1000)
+end
+return {1, '0'}
+"""
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a bucket is empty or a daily quota is spent."""
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded for {scope}, please retry later")
+        self.scope = scope
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+@dataclass(frozen=True)
+class Limit:
+    per_minute: float
+    burst: int
+
+    def __post_init__(self):
+        # Both backends divide by the rate, and a bucket smaller than one token never allows a request
+        if not self.per_minute > 0 or self.burst < 1:
+            raise ValueError(
+                f"Rate limits need a positive *_RATE_PER_MINUTE and a *_BURST of at least 1, "
+                f"got {self.per_minute}/min with burst {self.burst}"
+            )
+
+    @property
+    def rate(self) -> float:
+        return self.per_minute / 60.0
+
+
+AI_USER_LIMIT = Limit(settings.AI_USER_RATE_PER_MINUTE, settings.AI_USER_BURST)
+AI_IP_LIMIT = Limit(settings.AI_IP_RATE_PER_MINUTE, settings.AI_IP_BURST)
+LOGIN_ACCOUNT_LIMIT = Limit(settings.LOGIN_ACCOUNT_RATE_PER_MINUTE, settings.LOGIN_ACCOUNT_BURST)
+LOGIN_IP_LIMIT = Limit(settings.LOGIN_IP_RATE_PER_MINUTE, settings.LOGIN_IP_BURST)
+
+
+def hashed_key(value: str) -> str:
+    """Short stable digest for identifiers (e.g. emails) that shouldn't be stored as keys."""
+    return hashlib.blake2b(value.strip().lower().encode(), digest_size=12).hexdigest()
+
+
+def usage_day(now: Optional[datetime] = None) -> str:
+    return (now or datetime.now(timezone.utc)).strftime("%Y-%m-%d")
+
+
+def seconds_until_reset(now: Optional[datetime] = None) -> float:
+    now = now or datetime.now(timezone.utc)
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (tomorrow - now).total_seconds()
+
+
+class MemoryRateLimitBackend:
+    """
+    Buckets in a per-worker LRU. An entry expires once its bucket would be
+    full again, so evicting or expiring it never changes a decision.
+    """
+
+    def __init__(self, max_keys: int):
+        self._buckets = LRUCache(max_entries=max_keys)
+        self._usage = LRUCache(max_entries=max_keys, ttl=USAGE_TTL_SECONDS)
+
+    def take_now(self, buckets: List[Tuple[str, Limit]], cost: float = 1.0) -> float:
+        """
+        Take `cost` tokens from every (key, limit) bucket, or from none when one
+        is short; returns 0 when allowed, else the seconds until all have them.
+        """
+        now = time.monotonic()
+        levels = []
+        wait = 0.0
+        for key, limit in buckets:
+            bucket = self._buckets.get(key)
+            tokens = limit.burst if bucket is None else min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+            if tokens < cost:
+                wait = max(wait, (cost - tokens) / limit.rate)
+            levels.append(tokens)
+        if wait:
+            return wait
+        for (key, limit), tokens in zip(buckets, levels):
+            tokens -= cost
+            self._buckets.set(key, (tokens, now), ttl=(limit.burst - tokens) / limit.rate or None)
+        return 0.0
+
+    async def take(self, buckets: List[Tuple[str, Limit]], cost: float = 1.0) -> float:
+        return self.take_now(buckets, cost)
+
+    async def add_usage(self, key: str, prompt_tokens: int, completion_tokens: int) -> None:
+        prompt, completion = self._usage.get(key, (0, 0))
+        self._usage.set(key, (prompt + prompt_tokens, completion + completion_tokens))
+
+    async def get_usage(self, key: str) -> Tuple[int, int]:
+        return self._usage.get(key, (0, 0))
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "buckets": len(self._buckets), "usageKeys": len(self._usage)}
+
+
+class RedisRateLimitBackend:
+    """Buckets and usage shared between workers through any Redis-compatible server."""
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package")
+        self._redis = redis.from_url(url)
+        self._take = self._redis.register_script(TOKEN_BUCKET_LUA)
+        self.errors = 0
+
+    async def take(self, buckets: List[Tuple[str, Limit]], cost: float = 1.0) -> float:
+        args = [time.time(), cost]
+        for _, limit in buckets:
+            args += [limit.rate, limit.burst]
+        try:
+            allowed, wait = await self._take(keys=[REDIS_KEY_PREFIX + key for key, _ in buckets], args=args)
+        except Exception:
+            # Fail open: a limiter outage must not take the API down with it
+            self.errors += 1
+            return 0.0
+        return 0.0 if int(allowed) else float(wait)
+
+    async def add_usage(self, key: str, prompt_tokens: int, completion_tokens: int) -> None:
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.hincrby(REDIS_KEY_PREFIX + key, "prompt", prompt_tokens)
+                pipe.hincrby(REDIS_KEY_PREFIX + key, "completion", completion_tokens)
+                pipe.expire(REDIS_KEY_PREFIX + key, USAGE_TTL_SECONDS)
+                await pipe.execute()
+        except Exception:
+            self.errors += 1
+
+    async def get_usage(self, key: str) -> Tuple[int, int]:
+        try:
+            prompt, completion = await self._redis.hmget(REDIS_KEY_PREFIX + key, "prompt", "completion")
+        except Exception:
+            self.errors += 1
+            return 0, 0
+        return int(prompt or 0), int(completion or 0)
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "errors": self.errors}
+
+
+class RateLimiter:
+    """Token buckets per user and per client IP, plus per-user daily token quotas."""
+
+    def __init__(self, backend, enabled: bool = True, daily_token_quota: int = 0):
+        self.backend = backend
+        self.enabled = enabled
+        self.daily_token_quota = daily_token_quota
+
+    async def hit(self, scope: str, buckets: List[Tuple[str, Limit]]) -> None:
+        """
+        Take a token from every (key, limit) bucket, or from none of them;
+        raises RateLimitExceeded with the longest wait.
+        """
+        if not self.enabled:
+            return
+        # All or nothing: a request refused by one bucket must not drain the others
+        wait = await self.backend.take([(f"{scope}:{key}", limit) for key, limit in buckets])
+        if wait:
+            rate_limit_rejections_total.inc(1, scope=scope)
+            raise RateLimitExceeded(scope, wait)
+
+    async def check_quota(self, user_id: str) -> None:
+        if not self.enabled or not self.daily_token_quota:
+            return
+        prompt, completion = await self.backend.get_usage(f"usage:{usage_day()}:{user_id}")
+        if prompt + completion >= self.daily_token_quota:
+            rate_limit_rejections_total.inc(1, scope="quota")
+            raise RateLimitExceeded("daily token quota", seconds_until_reset())
+
+    async def record_usage(self, user_id: Optional[str], usage) -> None:
+        """Add an upstream response's usage to the user's count for today."""
+        if not user_id or usage is None:
+            return
+        await self.backend.add_usage(
+            f"usage:{usage_day()}:{user_id}", usage.prompt_tokens or 0, usage.completion_tokens or 0
+        )
+
+    async def usage(self, user_id: str) -> dict:
+        now = datetime.now(timezone.utc)
+        prompt, completion = await self.backend.get_usage(f"usage:{usage_day(now)}:{user_id}")
+        total = prompt + completion
+        quota = self.daily_token_quota or None
+        return {
+            "userId": user_id,
+            "day": usage_day(now),
+            "promptTokens": prompt,
+            "completionTokens": completion,
+            "totalTokens": total,
+            "quota": quota,
+            "remaining": max(0, quota - total) if quota else None,
+            "resetsAt": now + timedelta(seconds=seconds_until_reset(now)),
+        }
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, **self.backend.stats()}
+
+
+def client_ip(request) -> str:
+    # Behind a proxy this is the real client once FORWARDED_ALLOW_IPS trusts it (see app/serve.py)
+    return request.client.host if request.client else "unknown"
+
+
+def build_rate_limiter() -> RateLimiter:
+    backend_name = settings.RATE_LIMIT_BACKEND.lower()
+    if backend_name == "redis":
+        backend = RedisRateLimitBackend(settings.REDIS_URL)
+    elif backend_name == "memory":
+        backend = MemoryRateLimitBackend(max_keys=settings.RATE_LIMIT_MAX_KEYS)
+    else:
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {settings.RATE_LIMIT_BACKEND}")
+    return RateLimiter(backend, enabled=settings.RATE_LIMIT_ENABLED, daily_token_quota=settings.DAILY_TOKEN_QUOTA)
+
+
+rate_limiter = build_rate_limiter()
@@ -1,28 +1,52 @@
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-import os
-from dotenv import load_dotenv
-from fastapi import Depends, HTTPException, status
+import time
+from functools import lru_cache
+from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import importlib
+import secrets
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from app.db import prisma
+from .config import settings
+from .cache import LRUCache
+from .metrics import stage_timer
+from ..schemas.user import UserResponse
 
-load_dotenv()
+ARGON2_MEMORY_COST_KIB = 65536
 
-pwd_context = CryptContext(
-    schemes=["argon2"],
-    deprecated="auto",
-    argon2__time_cost=4,      
-    argon2__memory_cost=65536,
-    argon2__parallelism=2,    
-)
+# passlib/argon2 and python-jose are imported on first use (or by the startup
+# warmup), not when the app is imported
+@lru_cache()
+def get_pwd_context():
+    """The shared CryptContext; loading passlib and its Argon2 backend happens here."""
+    from passlib.context import CryptContext
+    return CryptContext(
+        schemes=["argon2"],
+        deprecated="auto",
+        argon2__time_cost=4,
+        argon2__memory_cost=ARGON2_MEMORY_COST_KIB,
+        argon2__parallelism=2,
+    )
+
+def hash_pool_size() -> int:
+    """Number of concurrent Argon2 operations allowed by the worker and memory caps."""
+    per_hash_mb = max(1, ARGON2_MEMORY_COST_KIB // 1024)
+    by_memory = settings.HASH_MEMORY_BUDGET_MB // per_hash_mb
+    return max(1, min(settings.HASH_MAX_WORKERS, by_memory))
+
+# argon2-cffi releases the GIL, so a small thread pool keeps hashing off the
+# event loop while its size bounds peak memory
+@lru_cache()
+def get_hash_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=hash_pool_size(), thread_name_prefix="argon2")
 
-# JWT configuration
-SECRET_KEY = os.getenv("JWT_SECRET_KEY")
+# JWT configuration; Settings (one read of the environment and .env) requires the key
+SECRET_KEY = settings.JWT_SECRET_KEY
 if not SECRET_KEY:
     raise ValueError("JWT_SECRET_KEY must be set in environment variables")
-    
+
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
@@ -31,14 +55,55 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """Generate a secure hash from a password."""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+def _timed(operation: str, func, *args):
+    # Runs on the pool thread, so only Argon2 compute time is recorded
+    with stage_timer("argon2", operation):
+        return func(*args)
+
+async def _run_on_hash_pool(operation: str, func, *args):
+    loop = asyncio.get_running_loop()
+    with stage_timer("argon2", f"{operation}_total"):
+        return await loop.run_in_executor(get_hash_executor(), _timed, operation, func, *args)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the Argon2 pool without blocking the event loop."""
+    return await _run_on_hash_pool("hash", get_pwd_context().hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password on the Argon2 pool.
+    Returns (is_valid, new_hash); new_hash is set when the stored hash was
+    made with outdated CryptContext parameters and should be replaced.
+    """
+    return await _run_on_hash_pool(
+        "verify", get_pwd_context().verify_and_update, plain_password, hashed_password
+    )
+
+async def warm_up_hashing() -> None:
+    """Load the Argon2 backend and start a pool thread before the first signup or login."""
+    loop = asyncio.get_running_loop()
+    # Importing passlib and building the context happen on the pool too
+    await loop.run_in_executor(get_hash_executor(), lambda: get_pwd_context().hash("warm-up"))
+
+async def warm_up_tokens() -> None:
+    """Import python-jose off the event loop before the first login or token check."""
+    await asyncio.to_thread(importlib.import_module, "jose.jwt")
+
+def shutdown_hash_pool() -> None:
+    """Stop the pool if it was ever started."""
+    if get_hash_executor.cache_info().currsize:
+        get_hash_executor().shutdown(wait=True)
+        get_hash_executor.cache_clear()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
+    from jose import jwt
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -49,11 +114,45 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# Decoded tokens and user records, so authenticated hot paths skip the DB.
+# Only the public fields are cached: invalidate_user() clears this worker's
+# copy alone, so anything that checks a password must read the row itself.
+_token_cache = LRUCache(max_entries=settings.AUTH_CACHE_MAX_ENTRIES)
+_user_cache = LRUCache(max_entries=settings.AUTH_CACHE_MAX_ENTRIES, ttl=settings.AUTH_CACHE_TTL)
+
+async def get_user_by_id(user_id: str) -> Optional[UserResponse]:
+    """Return the user's public fields (no password hash), served from the user cache when possible."""
+    user = _user_cache.get(user_id)
+    if user is None:
+        record = await prisma.user.find_unique(where={"id": user_id})
+        if record is not None:
+            user = UserResponse.model_validate(record)
+            _user_cache.set(user_id, user)
+    return user
+
+def invalidate_user(user_id: str) -> None:
+    """Drop a cached user record; call after the password changes or the user is deleted."""
+    _user_cache.pop(user_id)
+
+def auth_cache_stats() -> dict:
+    return {"tokens": _token_cache.stats(), "users": _user_cache.stats()}
+
+def admin_token_matches(token: Optional[str]) -> bool:
+    return bool(settings.ADMIN_TOKEN and token and secrets.compare_digest(token, settings.ADMIN_TOKEN))
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependency for operator endpoints: X-Admin-Token must match ADMIN_TOKEN; 404 while none is set."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not admin_token_matches(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     """
     Validate JWT token and return current user.
     This function is used as a dependency in protected endpoints.
     """
+    from jose import JWTError
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -61,19 +160,11 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     )
     
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-        
+        user_id = decode_access_token(token)
     except JWTError:
         raise credentials_exception
         
-    user = await prisma.user.find_unique(
-        where={
-            "id": user_id
-        }
-    )
+    user = await get_user_by_id(user_id)
     
     if user is None:
         raise credentials_exception
@@ -85,11 +176,24 @@ def decode_access_token(token: str) -> str:
     Decode a JWT token and return the user ID.
     Raises an exception if the token is invalid.
     """
+    user_id = _token_cache.get(token)
+    if user_id is not None:
+        return user_id
+
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         if user_id is None:
             raise JWTError("Could not validate credentials")
-        return user_id
     except JWTError:
         raise JWTError("Could not validate credentials")
+
+    # Never cache a token past its own expiry
+    ttl = settings.AUTH_CACHE_TTL
+    if payload.get("exp"):
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        _token_cache.set(token, user_id, ttl=ttl)
+    return user_id
@@ -0,0 +1,174 @@
+"""
+Write-behind queue for clips saved from AI answers.
+
+enqueue() gives the clip a cuid and returns it at once. A background task
+writes queued clips in batches of up to WRITE_QUEUE_BATCH_SIZE, with the same
+statements as the bulk import: blob upsert, create_many and embedding upsert
+in one transaction. The task starts on the first enqueue and wakes when a
+batch fills up or WRITE_QUEUE_FLUSH_INTERVAL has passed.
+
+Transient database errors (connection loss, pool timeouts, serialization
+failures) retry the batch with backoff. create_many skips existing ids, so a
+retry after a commit whose answer was lost does not duplicate clips. Any
+other error retries the clips of the batch one by one, so one bad row (e.g.
+a user deleted in the meantime) does not take the others with it.
+
+Queued clips live only in this worker's memory. close() runs on shutdown,
+after in-flight chats finish, and writes whatever is still queued.
+"""
+import asyncio
+import logging
+from typing import List, Optional
+
+from app.db import db_errors, prisma
+from .code_store import UPSERT_BLOBS_SQL, blob_rows
+from .config import settings
+from .embeddings import UPSERT_EMBEDDINGS_SQL, embedding_index, embedding_rows
+from .ids import cuid
+
+logger = logging.getLogger(__name__)
+
+# Prisma engine codes: can't reach / timed out / connection closed, pool
+# timeout, write conflict or deadlock; and the Postgres SQLSTATEs raw
+# queries report for serialization failures and deadlocks
+TRANSIENT_PRISMA_CODES = {"P1001", "P1002", "P1008", "P1017", "P2024", "P2034"}
+TRANSIENT_SQLSTATES = {"40001", "40P01"}
+
+
+class WriteQueueFull(Exception):
+    """Raised when too many clips are already waiting to be written."""
+
+
+def is_transient(error: Exception) -> bool:
+    from prisma.engine.errors import EngineConnectionError
+    if isinstance(error, (EngineConnectionError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, db_errors().DataError):
+        return error.code in TRANSIENT_PRISMA_CODES or (error.meta or {}).get("code") in TRANSIENT_SQLSTATES
+    return False
+
+
+class ClipWriteQueue:
+    """Batches clip inserts off the request path; see the module docstring."""
+
+    def __init__(self, batch_size: int, flush_interval: float, max_pending: int, max_attempts: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.written = 0
+        self.retries = 0
+        self.failed = 0
+        self.batches = 0
+        self._pending: List[dict] = []
+        self._in_flight = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def __len__(self) -> int:
+        return len(self._pending) + self._in_flight
+
+    def enqueue(self, clip: dict) -> str:
+        """
+        Queue a clip given as a ClippedCodeCreate dict (codeContent included)
+        and return the id it will be stored under.
+        """
+        if self._closed:
+            raise WriteQueueFull("Shutting down, not accepting new clips")
+        if len(self) >= self.max_pending:
+            raise WriteQueueFull("Too many clips waiting to be saved, please retry later")
+        clip = {**clip, "id": clip.get("id") or cuid()}
+        self._pending.append(clip)
+        self._ensure_worker()
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return clip["id"]
+
+    async def close(self, timeout: float) -> None:
+        """Stop accepting clips and write the queued ones, waiting at most `timeout` seconds."""
+        self._closed = True
+        if self._task is None:
+            return
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            logger.error("Write queue closed with %d clips unsaved", len(self))
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self),
+            "written": self.written,
+            "failed": self.failed,
+            "retries": self.retries,
+            "batches": self.batches,
+        }
+
+    def _ensure_worker(self) -> None:
+        # Created lazily so the event and the task bind to the running loop
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        # Exits once the queue is empty; the next enqueue starts a new task
+        while self._pending:
+            if len(self._pending) < self.batch_size and not self._closed:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            batch = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+            self._in_flight = len(batch)
+            try:
+                await self._write_batch(batch)
+            finally:
+                self._in_flight = 0
+
+    async def _write_batch(self, clips: List[dict]) -> None:
+        try:
+            await self._write_with_retries(clips)
+        except Exception as e:
+            if len(clips) == 1:
+                self.failed += 1
+                logger.error("Could not save clip %s for user %s: %s", clips[0]["id"], clips[0]["userId"], e)
+                return
+            for clip in clips:
+                await self._write_batch([clip])
+
+    async def _write_with_retries(self, clips: List[dict]) -> None:
+        for attempt in range(self.max_attempts):
+            try:
+                await self._write(clips)
+                return
+            except Exception as e:
+                if not is_transient(e) or attempt == self.max_attempts - 1:
+                    raise
+                self.retries += 1
+                logger.warning("Retrying %d queued clips after: %s", len(clips), e)
+                await asyncio.sleep(min(0.1 * 2 ** attempt, 5.0))
+
+    async def _write(self, clips: List[dict]) -> None:
+        rows, blobs = blob_rows(clips)
+        # Tokenizing a whole batch would stall the event loop
+        embeddings, vectors = await asyncio.to_thread(embedding_rows, clips)
+        async with prisma.batch_() as transaction:
+            transaction.execute_raw(UPSERT_BLOBS_SQL, blobs)
+            transaction.clippedcode.create_many(data=rows, skip_duplicates=True)
+            transaction.execute_raw(UPSERT_EMBEDDINGS_SQL, embeddings)
+        self.written += len(rows)
+        self.batches += 1
+        embedding_index.add(vectors)
+
+
+clip_write_queue = ClipWriteQueue(
+    batch_size=settings.WRITE_QUEUE_BATCH_SIZE,
+    flush_interval=settings.WRITE_QUEUE_FLUSH_INTERVAL,
+    max_pending=settings.WRITE_QUEUE_MAX_PENDING,
+    max_attempts=settings.WRITE_QUEUE_MAX_ATTEMPTS,
+)
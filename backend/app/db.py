@@ -1,3 +1,60 @@
-from prisma import Prisma
+import asyncio
+from datetime import timedelta
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
-prisma = Prisma()
\ No newline at end of file
+from .core.config import settings
+from .core.metrics import stage_timer
+
+def pooled_database_url(url: str) -> str:
+    """
+    DATABASE_URL with the query engine's pool parameters from settings.
+    Parameters already in the URL win, so a deploy can still pin them there.
+    """
+    parts = urlsplit(url)
+    params = dict(parse_qsl(parts.query))
+    if settings.DB_POOL_SIZE is not None:
+        params.setdefault("connection_limit", str(settings.DB_POOL_SIZE))
+    params.setdefault("pool_timeout", str(settings.DB_POOL_TIMEOUT))
+    params.setdefault("connect_timeout", str(settings.DB_CONNECT_TIMEOUT))
+    return urlunsplit(parts._replace(query=urlencode(params)))
+
+async def warm_pool(connections: int) -> None:
+    """Open pool connections up front: concurrent queries make the engine connect in parallel."""
+    await asyncio.gather(*(prisma.query_raw("SELECT 1") for _ in range(connections)))
+
+@lru_cache()
+def get_prisma():
+    """
+    Build the shared client on first use. The generated client is one of the
+    heaviest imports, so nothing loads it until the lifespan connects (or a
+    script makes its first query).
+    """
+    from prisma import Prisma
+
+    class InstrumentedPrisma(Prisma):
+        """Prisma client that times every query engine round trip."""
+
+        async def _execute(self, *args, **kwargs):
+            model = kwargs.get("model")
+            operation = f"{getattr(model, '__name__', 'raw')}.{kwargs.get('method', '')}"
+            with stage_timer("db", operation):
+                return await super()._execute(*args, **kwargs)
+
+    return InstrumentedPrisma(
+        datasource={"url": pooled_database_url(settings.DATABASE_URL)},
+        connect_timeout=timedelta(seconds=settings.DB_CONNECT_TIMEOUT),
+    )
+
+def db_errors():
+    """prisma.errors, imported as late as the client; use as `except db_errors().UniqueViolationError:`."""
+    from prisma import errors
+    return errors
+
+class LazyPrisma:
+    """Module-level stand-in that forwards everything to get_prisma(), so `from app.db import prisma` stays cheap."""
+
+    def __getattr__(self, name):
+        return getattr(get_prisma(), name)
+
+prisma = LazyPrisma()
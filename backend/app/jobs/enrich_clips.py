@@ -0,0 +1,421 @@
+"""
+Fill in missing notes, complexities and blank titles of saved clips.
+
+Scans clips in id order (all of them, or one user's), asks the model for
+each one with the SYSTEM_MESSAGES["DEFAULT"] prompt, parses the answer with
+extract_code_blocks and writes only the fields that were missing, in
+batched transactions. Progress is checkpointed after every batch, so an
+interrupted run resumes where it stopped: clips that failed are kept in the
+checkpoint and retried first. A scan that reaches the end removes its
+checkpoint; clips that still failed keep matching the filter, so the next
+run picks them up again.
+
+A JobLease row per scope (one user, or everyone) keeps two workers, or a
+worker and the CLI, from running the same scan at once. The job renews it
+with every write batch and deletes it when it stops; a crashed job's lease
+expires after ENRICH_LEASE_SECONDS.
+
+Runs in-process through POST /api/v1/jobs/enrich-clips, or standalone:
+
+    python -m app.jobs.enrich_clips --user-id <id> --checkpoint enrich.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set
+
+from app.core.code_blocks import extract_code_blocks
+from app.core.code_store import WITH_BLOB
+from app.core.config import settings
+from app.core.embeddings import UPSERT_EMBEDDINGS_SQL, embedding_index, embedding_rows
+from app.core.metrics import record_openai_usage, stage_timer
+from app.core.openai_client import (
+    CompletionQueueFull, close_openai_client, completion_limiter, get_openai_client, openai_sdk
+)
+from app.core.prompts import CHAT_MAX_TOKENS, SYSTEM_MESSAGES
+from app.db import prisma
+
+logger = logging.getLogger(__name__)
+
+ENRICH_TEMPERATURE = 0.2
+MAX_PROMPT_CODE_CHARS = 12000
+MAX_ATTEMPTS = 4
+ENRICHED_FIELDS = ("notes", "timeComplexity", "spaceComplexity")
+
+# Takes the lease when it is free, expired or already ours; no row back means another owner holds it
+ACQUIRE_LEASE_SQL = """
+INSERT INTO "JobLease" ("name", "owner", "expiresAt")
+VALUES ($1, $2, CURRENT_TIMESTAMP + $3::int * interval '1 second')
+ON CONFLICT ("name") DO UPDATE SET "owner" = EXCLUDED."owner", "expiresAt" = EXCLUDED."expiresAt"
+WHERE "JobLease"."owner" = EXCLUDED."owner" OR "JobLease"."expiresAt" < CURRENT_TIMESTAMP
+RETURNING "owner"
+"""
+RELEASE_LEASE_SQL = 'DELETE FROM "JobLease" WHERE "name" = $1 AND "owner" = $2'
+
+
+class JobAlreadyRunning(Exception):
+    """Another worker (or the CLI) holds the lease for the same scan."""
+
+
+def retryable_errors() -> tuple:
+    sdk = openai_sdk()
+    return (CompletionQueueFull, sdk.APITimeoutError, sdk.APIConnectionError, sdk.RateLimitError)
+
+
+class RequestPacer:
+    """Spaces calls out to at most `per_minute` starts per minute."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def missing_fields_filter(user_id: Optional[str]) -> dict:
+    where = {"OR": [{field: None} for field in ENRICHED_FIELDS] + [{"title": ""}]}
+    if user_id:
+        where["userId"] = user_id
+    return where
+
+
+def enrichment_prompt(clip) -> List[dict]:
+    code = clip.blob.content[:MAX_PROMPT_CODE_CHARS]
+    return [
+        SYSTEM_MESSAGES["DEFAULT"],
+        {
+            "role": "user",
+            "content": f"Explain this {clip.language} code and give its complexity:\n"
+                       f"```{clip.language}\n{code}\n```",
+        },
+    ]
+
+
+def enrichment_update(clip, content: str) -> dict:
+    """Only the fields the clip is missing, taken from the parsed answer."""
+    parsed = extract_code_blocks(content)
+    data = {}
+    if clip.notes is None and parsed.notes:
+        data["notes"] = parsed.notes
+    if clip.timeComplexity is None:
+        data["timeComplexity"] = parsed.time_complexity
+    if clip.spaceComplexity is None:
+        data["spaceComplexity"] = parsed.space_complexity
+    if not clip.title.strip() and parsed.title:
+        data["title"] = parsed.title
+    return data
+
+
+class EnrichmentJob:
+    def __init__(self, user_id: Optional[str] = None, checkpoint_path: Optional[str] = None,
+                 concurrency: int = settings.ENRICH_CONCURRENCY,
+                 requests_per_minute: float = settings.ENRICH_REQUESTS_PER_MINUTE,
+                 page_size: int = settings.ENRICH_PAGE_SIZE, limit: Optional[int] = None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.checkpoint_path = checkpoint_path
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.limit = limit
+        self.pacer = RequestPacer(requests_per_minute)
+
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.total: Optional[int] = None
+        self.last_id: Optional[str] = None
+        # Totals across resumed runs; `limit` counts only the clips of this run
+        self.scanned = 0
+        self.updated = 0
+        self.failed_ids: Set[str] = set()
+        self.run_scanned = 0
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+    @property
+    def lease_name(self) -> str:
+        return f"enrich:{self.user_id or 'all'}"
+
+    @property
+    def failed(self) -> int:
+        return len(self.failed_ids)
+
+    async def prepare(self) -> None:
+        """Take the scan's lease, then load the checkpoint. Raises JobAlreadyRunning or ValueError."""
+        if not await self._hold_lease():
+            raise JobAlreadyRunning(f"An enrichment job for {self.user_id or 'all users'} is already running")
+        try:
+            self._load_checkpoint()
+        except Exception:
+            await self._release_lease()
+            raise
+
+    def progress(self) -> dict:
+        elapsed = None
+        if self.started_at:
+            elapsed = ((self.finished_at or datetime.now(timezone.utc)) - self.started_at).total_seconds()
+        return {
+            "id": self.id,
+            "status": self.status,
+            "userId": self.user_id,
+            "total": self.total,
+            "scanned": self.scanned,
+            "updated": self.updated,
+            "failed": self.failed,
+            "lastId": self.last_id,
+            "clipsPerSecond": round(self.scanned / elapsed, 2) if elapsed else None,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+            "error": self.error,
+        }
+
+    async def run(self) -> dict:
+        self.status = "running"
+        self.started_at = datetime.now(timezone.utc)
+        try:
+            where = missing_fields_filter(self.user_id)
+            remaining = dict(where)
+            if self.last_id:
+                remaining["id"] = {"gt": self.last_id}
+            self.total = self.scanned + await prisma.clippedcode.count(where=remaining)
+
+            await self._retry_failed(where)
+
+            exhausted = False
+            while self._budget():
+                page_where = dict(where)
+                if self.last_id:
+                    page_where["id"] = {"gt": self.last_id}
+                page = await prisma.clippedcode.find_many(
+                    where=page_where, order={"id": "asc"}, take=self._budget(), include=WITH_BLOB
+                )
+                if not page:
+                    exhausted = True
+                    break
+
+                for start in range(0, len(page), settings.ENRICH_WRITE_BATCH):
+                    await self._process_batch(page[start:start + settings.ENRICH_WRITE_BATCH])
+                logger.info("enrichment %s: %s", self.id, self.progress())
+
+            self.status = "finished"
+            if exhausted:
+                self._remove_checkpoint()
+        except asyncio.CancelledError:
+            self.status = "cancelled"
+            raise
+        except Exception as e:
+            logger.exception("Enrichment job %s failed", self.id)
+            self.status = "failed"
+            self.error = str(e)
+        finally:
+            self.finished_at = datetime.now(timezone.utc)
+            await self._release_lease()
+        return self.progress()
+
+    def _budget(self) -> int:
+        """How many clips this run may still fetch, at most one page."""
+        if self.limit is None:
+            return self.page_size
+        return max(0, min(self.page_size, self.limit - self.run_scanned))
+
+    async def _retry_failed(self, where: dict) -> None:
+        # Failed clips sit behind last_id; ones no longer missing anything (or deleted) just drop out
+        retry = sorted(self.failed_ids)
+        while retry and self._budget():
+            ids, retry = retry[:self._budget()], retry[self._budget():]
+            self.failed_ids.difference_update(ids)
+            clips = await prisma.clippedcode.find_many(
+                where={**where, "id": {"in": ids}}, order={"id": "asc"}, include=WITH_BLOB
+            )
+            for start in range(0, len(clips), settings.ENRICH_WRITE_BATCH):
+                await self._process_batch(clips[start:start + settings.ENRICH_WRITE_BATCH], advance=False)
+
+    async def _process_batch(self, clips: list, advance: bool = True) -> None:
+        if not await self._hold_lease():
+            raise RuntimeError(f"Lost the {self.lease_name} lease to another job")
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def enrich(clip):
+            async with semaphore:
+                return await self._enrich_clip(clip)
+
+        updates = await asyncio.gather(*(enrich(clip) for clip in clips))
+        updates = [(clip, data) for clip, data in zip(clips, updates) if data]
+        if updates:
+            # New notes or titles change the clips' embeddings; store them in the same transaction
+            embeddings, vectors = embedding_rows(
+                {
+                    "id": clip.id,
+                    "userId": clip.userId,
+                    "title": data.get("title", clip.title),
+                    "notes": data.get("notes", clip.notes),
+                    "codeContent": clip.blob.content,
+                }
+                for clip, data in updates if "title" in data or "notes" in data
+            )
+            async with prisma.batch_() as batch:
+                for clip, data in updates:
+                    batch.clippedcode.update(where={"id": clip.id}, data=data)
+                if vectors:
+                    batch.execute_raw(UPSERT_EMBEDDINGS_SQL, embeddings)
+            embedding_index.add(vectors)
+
+        self.run_scanned += len(clips)
+        self.updated += len(updates)
+        if advance:
+            self.scanned += len(clips)
+            self.last_id = clips[-1].id
+        self._save_checkpoint()
+
+    async def _enrich_clip(self, clip) -> Optional[dict]:
+        for attempt in range(MAX_ATTEMPTS):
+            await self.pacer.wait()
+            try:
+                async with completion_limiter.slot():
+                    with stage_timer("openai", "enrich"):
+                        response = await get_openai_client().chat.completions.create(
+                            model=settings.OPENAI_MODEL,
+                            messages=enrichment_prompt(clip),
+                            temperature=ENRICH_TEMPERATURE,
+                            max_tokens=CHAT_MAX_TOKENS,
+                            timeout=settings.OPENAI_TIMEOUT
+                        )
+                record_openai_usage(settings.OPENAI_MODEL, response.usage)
+                self.failed_ids.discard(clip.id)
+                return enrichment_update(clip, response.choices[0].message.content or "")
+            except retryable_errors() as e:
+                if attempt == MAX_ATTEMPTS - 1:
+                    logger.warning("Giving up on clip %s: %s", clip.id, e)
+                    break
+                await asyncio.sleep(2 ** attempt)
+            except Exception:
+                logger.exception("Could not enrich clip %s", clip.id)
+                break
+        self.failed_ids.add(clip.id)
+        return None
+
+    async def _hold_lease(self) -> bool:
+        """Take or renew the scan's lease; False when another job holds it."""
+        rows = await prisma.query_raw(ACQUIRE_LEASE_SQL, self.lease_name, self.id, settings.ENRICH_LEASE_SECONDS)
+        return bool(rows)
+
+    async def _release_lease(self) -> None:
+        try:
+            await prisma.execute_raw(RELEASE_LEASE_SQL, self.lease_name, self.id)
+        except Exception as e:
+            # It expires on its own after ENRICH_LEASE_SECONDS
+            logger.warning("Could not release the %s lease: %s", self.lease_name, e)
+
+    def _load_checkpoint(self) -> None:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("userId") != self.user_id:
+            raise ValueError(f"Checkpoint {self.checkpoint_path} belongs to a different scan")
+        self.last_id = checkpoint.get("lastId")
+        self.scanned = checkpoint.get("scanned", 0)
+        self.updated = checkpoint.get("updated", 0)
+        self.failed_ids = set(checkpoint.get("failedIds", []))
+
+    def _save_checkpoint(self) -> None:
+        if not self.checkpoint_path:
+            return
+        checkpoint = {
+            "userId": self.user_id,
+            "lastId": self.last_id,
+            "scanned": self.scanned,
+            "updated": self.updated,
+            "failedIds": sorted(self.failed_ids),
+        }
+        # Write-then-rename so a crash never leaves a truncated checkpoint
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _remove_checkpoint(self) -> None:
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+
+# In-process jobs started through the API
+jobs: Dict[str, EnrichmentJob] = {}
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+def default_checkpoint_path(user_id: Optional[str]) -> str:
+    return os.path.join(settings.ENRICH_CHECKPOINT_DIR, f"enrich-{user_id or 'all'}.json")
+
+
+async def start_enrichment_job(user_id: Optional[str] = None, limit: Optional[int] = None) -> EnrichmentJob:
+    """
+    Run a job on the event loop in the background; it yields on every DB and
+    upstream call. Raises JobAlreadyRunning when any worker runs the same scan.
+    """
+    os.makedirs(settings.ENRICH_CHECKPOINT_DIR, exist_ok=True)
+    job = EnrichmentJob(user_id=user_id, checkpoint_path=default_checkpoint_path(user_id), limit=limit)
+    await job.prepare()
+    jobs[job.id] = job
+    task = asyncio.create_task(job.run())
+    _tasks[job.id] = task
+    task.add_done_callback(lambda _: _tasks.pop(job.id, None))
+    return job
+
+
+async def cancel_enrichment_jobs() -> None:
+    """Stop background jobs on shutdown; their checkpoints let them resume later."""
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", help="only this user's clips (default: every user)")
+    parser.add_argument("--checkpoint", help="resume from and save progress to this JSON file")
+    parser.add_argument("--concurrency", type=int, default=settings.ENRICH_CONCURRENCY)
+    parser.add_argument("--rpm", type=float, default=settings.ENRICH_REQUESTS_PER_MINUTE,
+                        help="max completion requests per minute (0 for no pacing)")
+    parser.add_argument("--page-size", type=int, default=settings.ENRICH_PAGE_SIZE)
+    parser.add_argument("--limit", type=int, help="stop once this run has scanned this many clips")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    job = EnrichmentJob(
+        user_id=args.user_id,
+        checkpoint_path=args.checkpoint,
+        concurrency=args.concurrency,
+        requests_per_minute=args.rpm,
+        page_size=args.page_size,
+        limit=args.limit,
+    )
+    await prisma.connect()
+    try:
+        try:
+            await job.prepare()
+        except (JobAlreadyRunning, ValueError) as e:
+            raise SystemExit(str(e))
+        progress = await job.run()
+    finally:
+        await prisma.disconnect()
+        await close_openai_client()
+    print(json.dumps(progress, default=str, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+"""
+Delete ClippedCodeTombstone rows older than SYNC_TOMBSTONE_RETENTION_DAYS.
+
+The changes feed answers 410 to any `since` or cursor older than that
+window, so a client never misses a deletion whose tombstone is gone. Every
+API worker prunes every SYNC_TOMBSTONE_PRUNE_INTERVAL seconds (the DELETE is
+idempotent), or run it standalone:
+
+    python -m app.jobs.prune_tombstones --retention-days 30
+"""
+import argparse
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.db import prisma
+
+logger = logging.getLogger(__name__)
+
+PRUNE_TOMBSTONES_SQL = '''
+DELETE FROM "ClippedCodeTombstone"
+WHERE "deletedAt" < CURRENT_TIMESTAMP - $1::int * interval '1 day'
+'''
+
+
+async def prune_tombstones(retention_days: int = settings.SYNC_TOMBSTONE_RETENTION_DAYS) -> int:
+    """Delete tombstones past the retention window; returns how many."""
+    if retention_days <= 0:
+        return 0
+    return await prisma.execute_raw(PRUNE_TOMBSTONES_SQL, retention_days)
+
+
+async def prune_tombstones_periodically(interval: float = settings.SYNC_TOMBSTONE_PRUNE_INTERVAL) -> None:
+    """Background task started by the lifespan; runs until cancelled."""
+    while True:
+        try:
+            pruned = await prune_tombstones()
+            if pruned:
+                logger.info("Pruned %d clip tombstones", pruned)
+        except Exception as e:
+            logger.warning("Could not prune clip tombstones: %s", e)
+        await asyncio.sleep(interval)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--retention-days", type=int, default=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+    args = parser.parse_args()
+
+    await prisma.connect()
+    try:
+        pruned = await prune_tombstones(args.retention_days)
+    finally:
+        await prisma.disconnect()
+    print(f"Pruned {pruned} tombstones older than {args.retention_days} days")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
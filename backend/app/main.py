@@ -1,31 +1,160 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from .core.config import settings
 from .api.v1.router import router
 from app.db import prisma
+from .core.openai_client import close_openai_client, completion_limiter
+from .core.security import shutdown_hash_pool, auth_cache_stats, require_admin
+from .core.completion_cache import completion_cache
+from .core.context_window import token_counter
+from .core.conversations import conversation_store
+from .jobs.enrich_clips import cancel_enrichment_jobs
+from .jobs.prune_tombstones import prune_tombstones_periodically
+from .core.metrics import REGISTRY, CallbackGauge, RequestMetricsMiddleware
+from .core.compression import CompressionMiddleware
+from .core.health import begin_drain, install_drain_handlers, readiness, set_accepting, warm_up, warm_up_then_accept
+from .core.rate_limit import rate_limiter
+from .core.embeddings import embedding_index
+from .core.write_queue import clip_write_queue
+from .core.profiling import ProfilingMiddleware, profile_store
+
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await prisma.connect()
+    warmup_task = None
+    if settings.STARTUP_WARMUP and settings.WARMUP_IN_BACKGROUND:
+        # Serve right away; requests arriving first build what they need lazily
+        warmup_task = asyncio.create_task(warm_up_then_accept())
+    elif settings.STARTUP_WARMUP:
+        await warm_up()
+        set_accepting(True)
+    else:
+        set_accepting(True)
+    install_drain_handlers()
+    prune_task = None
+    if settings.SYNC_TOMBSTONE_RETENTION_DAYS > 0:
+        prune_task = asyncio.create_task(prune_tombstones_periodically())
+    yield
+    # Normally already done by the signal handler; covers shutdowns without a signal
+    begin_drain()
+    if warmup_task:
+        warmup_task.cancel()
+    if prune_task:
+        prune_task.cancel()
+    await cancel_enrichment_jobs()
+    if not await completion_limiter.drain(settings.GRACEFUL_SHUTDOWN_TIMEOUT):
+        logger.warning("Shutting down with %d AI completions still running", completion_limiter.active)
+    # After the drain, so clips saved by the last chats are written too
+    await clip_write_queue.close(settings.GRACEFUL_SHUTDOWN_TIMEOUT)
+    await prisma.disconnect()
+    await close_openai_client()
+    shutdown_hash_pool()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    version=settings.VERSION
+    version=settings.VERSION,
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://localhost:5173"],  # frontend URL
-    allow_credentials=True,
+    allow_origins=settings.CORS_ORIGINS,
+    allow_credentials=settings.CORS_ALLOW_CREDENTIALS,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_SIZE,
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+)
+
+# Inside the metrics middleware so profiles carry the request id
+if settings.ADMIN_TOKEN or settings.PROFILE_SAMPLE_PERCENT:
+    app.add_middleware(
+        ProfilingMiddleware,
+        sample_percent=settings.PROFILE_SAMPLE_PERCENT,
+        interval_ms=settings.PROFILE_INTERVAL_MS,
+    )
+
+app.add_middleware(RequestMetricsMiddleware, json_logs=settings.LOG_JSON)
+
 app.include_router(router, prefix=settings.API_V1_STR)  
 
-@app.on_event("startup")
-async def startup():
-    await prisma.connect()
-    
-@app.on_event("shutdown")
-async def shutdown():
-    await prisma.disconnect() 
+REGISTRY.register(CallbackGauge(
+    "clipcodeai_ai_completions", "Upstream completions in flight or waiting for a slot.", ["state"],
+    lambda: {("active",): completion_limiter.active, ("waiting",): completion_limiter.waiting}
+))
+REGISTRY.register(CallbackGauge(
+    "clipcodeai_completion_cache", "Completion cache counters.", ["stat"],
+    lambda: {(k,): v for k, v in completion_cache.stats().items() if isinstance(v, (int, float))}
+))
+REGISTRY.register(CallbackGauge(
+    "clipcodeai_auth_cache", "Token and user cache counters.", ["cache", "stat"],
+    lambda: {(cache, k): v for cache, stats in auth_cache_stats().items() for k, v in stats.items()}
+))
+
+REGISTRY.register(CallbackGauge(
+    "clipcodeai_token_count_cache", "Cached per-message token counts for chat context fitting.", ["stat"],
+    lambda: {(k,): v for k, v in token_counter.stats().items() if isinstance(v, (int, float))}
+))
+REGISTRY.register(CallbackGauge(
+    "clipcodeai_conversation_cache", "Cached conversation histories.", ["stat"],
+    lambda: {(k,): v for k, v in conversation_store.stats().items()}
+))
+REGISTRY.register(CallbackGauge(
+    "clipcodeai_embedding_index", "Per-user similarity indexes held in memory.", ["stat"],
+    lambda: {(k,): v for k, v in embedding_index.stats().items()}
+))
+REGISTRY.register(CallbackGauge(
+    "clipcodeai_rate_limiter", "Rate limiter buckets and backend errors.", ["stat"],
+    lambda: {(k,): v for k, v in rate_limiter.stats().items() if type(v) in (int, float)}
+))
+REGISTRY.register(CallbackGauge(
+    "clipcodeai_clip_write_queue", "Clips saved from AI answers: queued, written, retried and failed.", ["stat"],
+    lambda: {(k,): v for k, v in clip_write_queue.stats().items()}
+))
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+# Liveness: the process and its event loop respond; no dependencies checked
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    return {"status": "ok"}
+
+# Readiness: warmed up, not shutting down, and the database answers a SELECT 1 in time
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    ready, report = await readiness()
+    return ORJSONResponse(report, status_code=200 if ready else 503)
+
+# Slowest profiled requests, slowest first, with the leaf frames that dominate each
+@app.get("/admin/profiles", include_in_schema=False, dependencies=[Depends(require_admin)])
+async def list_profiles():
+    return {**profile_store.stats(), "profiles": [profile.summary() for profile in profile_store.slowest()]}
+
+# One profile as collapsed stacks, for flamegraph.pl or speedscope
+@app.get("/admin/profiles/{profile_id}", include_in_schema=False, dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str):
+    profile = profile_store.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile.collapsed())
+
+@app.delete("/admin/profiles", include_in_schema=False, dependencies=[Depends(require_admin)], status_code=204)
+async def clear_profiles():
+    profile_store.clear()
 
 # test the API by going to http://localhost:8000/api/v1/
 @app.get("/")
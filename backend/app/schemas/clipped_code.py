@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class ClippedCodeBase(BaseModel):
     title: str
@@ -30,4 +30,82 @@ class ClippedCodeResponse(ClippedCodeBase):
     updatedAt: datetime
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+    @model_validator(mode="before")
+    @classmethod
+    def content_from_blob(cls, data):
+        # Clips loaded with include={"blob": True} keep their body in CodeBlob.
+        # FastAPI hands over returned models already dumped to dicts.
+        if isinstance(data, dict):
+            blob = data.get("blob")
+            if blob is None:
+                return data
+            content = blob["content"] if isinstance(blob, dict) else blob.content
+            return {**data, "codeContent": content}
+
+        blob = getattr(data, "blob", None)
+        if blob is None:
+            return data
+        fields = {name: getattr(data, name) for name in cls.model_fields if hasattr(data, name)}
+        fields["codeContent"] = blob.content
+        return fields
+
+class ClippedCodeCreateResponse(ClippedCodeResponse):
+    # True when the user had already saved this code; the existing clip is returned
+    alreadySaved: bool = False
+
+class ClippedCodeSummary(BaseModel):
+    id: str
+    title: str
+    language: str
+    isAiGenerated: bool
+    createdAt: datetime
+    updatedAt: datetime
+    size: int
+
+class ClippedCodePage(BaseModel):
+    items: List[ClippedCodeSummary]
+    nextCursor: Optional[str] = None
+
+class ClippedCodeSearchHit(ClippedCodeSummary):
+    rank: float
+    snippet: Optional[str] = None
+
+class DuplicateGroup(BaseModel):
+    contentHash: str
+    size: int
+    count: int
+    clipIds: List[str]
+    titles: List[str]
+
+class DuplicateReport(BaseModel):
+    groups: List[DuplicateGroup]
+    duplicateClips: int
+    savedBytes: int
+
+class ClippedCodeDeletion(BaseModel):
+    id: str
+    deletedAt: datetime
+
+class ClippedCodeChanges(BaseModel):
+    changed: List[ClippedCodeResponse]
+    deleted: List[ClippedCodeDeletion]
+    cursor: str
+    hasMore: bool
+
+class ClippedCodeBatchUpdate(BaseModel):
+    ids: List[str]
+    changes: ClippedCodeUpdate
+
+class ClippedCodeBatchDelete(BaseModel):
+    ids: List[str]
+
+class ClippedCodeBatchResult(BaseModel):
+    # Ids that were updated or deleted, and requested ids that do not exist
+    ids: List[str]
+    notFound: List[str]
+
+class ClippedCodeSimilar(ClippedCodeSummary):
+    # Cosine similarity of the clips' embeddings, 1.0 for identical token profiles
+    score: float
@@ -0,0 +1,33 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+
+class ConversationCreate(BaseModel):
+    userId: str
+    title: Optional[str] = None
+
+class ConversationMessageCreate(BaseModel):
+    content: str
+
+class MessageResponse(BaseModel):
+    id: str
+    position: int
+    role: str
+    content: str
+    createdAt: datetime
+
+    class Config:
+        from_attributes = True
+
+class ConversationResponse(BaseModel):
+    id: str
+    userId: str
+    title: Optional[str] = None
+    createdAt: datetime
+    updatedAt: datetime
+
+    class Config:
+        from_attributes = True
+
+class ConversationDetail(ConversationResponse):
+    messages: List[MessageResponse] = []
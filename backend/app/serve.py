@@ -0,0 +1,61 @@
+"""
+Production launcher: uvicorn with one worker process per core, uvloop and
+httptools, proxy headers and a graceful shutdown window.
+
+    python -m app.serve                      # WEB_CONCURRENCY workers (0 = one per core)
+    python -m app.serve --workers 4 --port 8080
+
+Every worker runs the lifespan in app/main.py on its own: it opens its own
+Prisma engine (DB_POOL_SIZE connections, so keep DB_POOL_SIZE x workers under
+Postgres max_connections), OpenAI connection pool and in-process caches.
+Set COMPLETION_CACHE_BACKEND=redis and RATE_LIMIT_BACKEND=redis so cached
+completions, rate limits and daily quotas are shared between workers.
+
+On SIGTERM a worker fails /readyz, refuses new AI completions with 429s and
+gives in-flight requests (streams included) GRACEFUL_SHUTDOWN_TIMEOUT seconds
+to finish before it closes its connections.
+"""
+import argparse
+import importlib.util
+import os
+
+import uvicorn
+
+from app.core.config import settings
+
+
+def default_workers() -> int:
+    return settings.WEB_CONCURRENCY or os.cpu_count() or 1
+
+
+def installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=settings.HOST)
+    parser.add_argument("--port", type=int, default=settings.PORT)
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--access-log", action="store_true",
+                        help="uvicorn's access log (the metrics middleware already logs requests)")
+    args = parser.parse_args()
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        # uvloop and httptools are pinned; fall back so the launcher also runs without them (e.g. Windows)
+        loop="uvloop" if installed("uvloop") else "auto",
+        http="httptools" if installed("httptools") else "auto",
+        lifespan="on",
+        proxy_headers=True,
+        forwarded_allow_ips=settings.FORWARDED_ALLOW_IPS,
+        timeout_graceful_shutdown=settings.GRACEFUL_SHUTDOWN_TIMEOUT,
+        access_log=args.access_log,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Login throughput benchmark.
+
+Hammers POST /users/login with concurrent workers while a probe loop hits an
+unrelated endpoint, then reports logins/sec and the probe's latency
+percentiles. Because Argon2 now runs on its own pool, the probe latency
+should stay flat however hard logins are pushed.
+
+    python -m benchmarks.bench_auth --base-url http://localhost:8000 --concurrency 16
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+from benchmarks.common import percentile
+
+PASSWORD = "Bench-Passw0rd!"
+
+
+async def ensure_user(client: httpx.AsyncClient, email: str) -> None:
+    response = await client.post("/users/", json={"email": email, "name": "Bench User", "password": PASSWORD})
+    if response.status_code not in (200, 400):
+        response.raise_for_status()
+
+
+async def login_worker(client, email, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.post("/users/login", json={"email": email, "password": PASSWORD})
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors.append(response.status_code)
+
+
+async def probe_worker(client, path, deadline, latencies, interval):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await client.get(path)
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+
+
+async def run(args):
+    email = args.email or f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    limits = httpx.Limits(max_connections=args.concurrency + 4)
+    async with httpx.AsyncClient(base_url=args.base_url + "/api/v1", limits=limits, timeout=60) as client, \
+            httpx.AsyncClient(base_url=args.base_url, timeout=60) as probe_client:
+        await ensure_user(client, email)
+
+        login_latencies, probe_latencies, errors = [], [], []
+        deadline = time.perf_counter() + args.duration
+        started = time.perf_counter()
+        await asyncio.gather(
+            probe_worker(probe_client, args.probe_path, deadline, probe_latencies, args.probe_interval),
+            *(login_worker(client, email, deadline, login_latencies, errors) for _ in range(args.concurrency)),
+        )
+        elapsed = time.perf_counter() - started
+
+    print(f"logins:        {len(login_latencies)} ok, {len(errors)} failed in {elapsed:.1f}s")
+    print(f"logins/sec:    {len(login_latencies) / elapsed:.1f}")
+    if login_latencies:
+        print(f"login p50/p99: {statistics.median(login_latencies) * 1000:.1f} / "
+              f"{percentile(login_latencies, 99) * 1000:.1f} ms")
+    print(f"probe {args.probe_path} p50/p99: {statistics.median(probe_latencies) * 1000:.1f} / "
+          f"{percentile(probe_latencies, 99) * 1000:.1f} ms over {len(probe_latencies)} requests")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", help="existing user to log in as (a throwaway user is created otherwise)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--probe-path", default="/")
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
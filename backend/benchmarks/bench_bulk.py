@@ -0,0 +1,86 @@
+"""
+Bulk import/export benchmark.
+
+Streams N synthetic clips (default 10k) as NDJSON, optionally gzip-compressed,
+to POST /clipped-codes/bulk and then reads them back through the export
+endpoint, reporting rows/sec for both directions.
+
+    python -m benchmarks.bench_bulk --base-url http://localhost:8000 --clips 10000 --gzip
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+import zlib
+
+import httpx
+
+from benchmarks.data import synthetic_clip
+
+
+async def create_user(client: httpx.AsyncClient) -> str:
+    response = await client.post("/users/", json={
+        "email": f"bulk-bench-{uuid.uuid4().hex[:8]}@example.com",
+        "name": "Bulk Bench",
+        "password": "Bench-Passw0rd!",
+    })
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+async def ndjson_body(user_id: str, clips: int, compress: bool, chunk_rows: int = 200):
+    rng = random.Random(7)
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+    lines = []
+    for index in range(clips):
+        lines.append(json.dumps(synthetic_clip(user_id, index, rng)))
+        if len(lines) == chunk_rows or index == clips - 1:
+            chunk = ("\n".join(lines) + "\n").encode()
+            lines = []
+            yield compressor.compress(chunk) if compressor else chunk
+    if compressor:
+        yield compressor.flush()
+
+
+async def run(args) -> None:
+    async with httpx.AsyncClient(base_url=args.base_url + "/api/v1", timeout=300) as client:
+        user_id = args.user_id or await create_user(client)
+
+        headers = {"Content-Type": "application/x-ndjson"}
+        if args.gzip:
+            headers["Content-Encoding"] = "gzip"
+        started = time.perf_counter()
+        response = await client.post(
+            "/clipped-codes/bulk",
+            content=ndjson_body(user_id, args.clips, args.gzip),
+            headers=headers,
+        )
+        response.raise_for_status()
+        elapsed = time.perf_counter() - started
+        result = response.json()
+        print(f"import: {result['inserted']} inserted, {result['failed']} failed in {elapsed:.2f}s "
+              f"({result['inserted'] / elapsed:.0f} rows/s)")
+
+        started = time.perf_counter()
+        exported = 0
+        async with client.stream("GET", f"/clipped-codes/user/{user_id}/export") as stream:
+            async for line in stream.aiter_lines():
+                if line:
+                    exported += 1
+        elapsed = time.perf_counter() - started
+        print(f"export: {exported} rows in {elapsed:.2f}s ({exported / elapsed:.0f} rows/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--user-id", help="import into an existing user (a throwaway user is created otherwise)")
+    parser.add_argument("--clips", type=int, default=10000)
+    parser.add_argument("--gzip", action="store_true")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
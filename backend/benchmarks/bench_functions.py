@@ -0,0 +1,146 @@
+"""
+Micro-benchmarks for pure functions on the request path.
+
+Times extract_code_blocks, the incremental streaming parser,
+validate_password, chat context fitting, the rate limiter checks, clip
+embeddings and a top-k similarity search over 100k clips, prints ops/sec
+and the best per-call time, and can store or diff against a named baseline
+in benchmarks/baselines/.
+
+    python -m benchmarks.bench_functions --save main
+    python -m benchmarks.bench_functions --compare main
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import timeit
+from functools import lru_cache
+
+import numpy as np
+
+# The endpoint modules read Settings at import time; none of these are used here
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/unused")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.api.v1.endpoints.users import validate_password  # noqa: E402
+from app.core.code_blocks import IncrementalCodeBlockParser, extract_code_blocks  # noqa: E402
+from app.core.context_window import TokenCounter, fit_to_budget  # noqa: E402
+from app.core.embeddings import EMBEDDING_DIM, UserEmbeddingIndex, embed_text  # noqa: E402
+from app.core.rate_limit import Limit, MemoryRateLimitBackend, RateLimiter  # noqa: E402
+from benchmarks.common import compare_to_baseline, load_baseline, save_baseline  # noqa: E402
+from benchmarks.data import ai_response, synthetic_clip  # noqa: E402
+
+SMALL_RESPONSE = ai_response()
+LARGE_RESPONSE = ai_response(blocks=40, notes_lines=20, code_lines=40)
+
+# 80 turns re-pasting the same code, well over the default context budget
+SYSTEM_MESSAGE = {"role": "system", "content": "You are a programming assistant."}
+PASTED_CODE = "\n".join(f"def step_{i}(items):\n    return sorted(items)[{i} % len(items)]" for i in range(30))
+LONG_CHAT = [
+    message
+    for turn in range(40)
+    for message in (
+        {"role": "user", "content": f"Can you speed this up? ({turn})\n```python\n{PASTED_CODE}\n```"},
+        {"role": "assistant", "content": SMALL_RESPONSE},
+    )
+]
+
+
+WARM_COUNTER = TokenCounter("gpt-4o-mini", max_entries=10000)
+
+
+def fit_long_chat(counter: TokenCounter):
+    return fit_to_budget(SYSTEM_MESSAGE, LONG_CHAT, counter, budget=6000, summary_budget=300)
+
+
+# Generous limits so every call is admitted; 10k distinct users keep the LRU busy
+BENCH_LIMIT = Limit(per_minute=1e9, burst=1_000_000)
+BENCH_LIMITER = RateLimiter(MemoryRateLimitBackend(max_keys=100_000), daily_token_quota=200_000)
+BENCH_LOOP = asyncio.new_event_loop()
+BENCH_USERS = iter(range(10**12))
+
+
+async def ai_request_checks(user: int):
+    # What every /ai request pays: user and IP buckets, then the quota lookup
+    await BENCH_LIMITER.hit("ai", [(f"user:{user % 10000}", BENCH_LIMIT), ("ip:10.0.0.1", BENCH_LIMIT)])
+    await BENCH_LIMITER.check_quota(f"{user % 10000}")
+
+
+EMBED_CLIP = synthetic_clip("user-bench", 0, random.Random(3))
+
+
+@lru_cache()
+def similar_index(clips: int = 100_000) -> UserEmbeddingIndex:
+    # Search cost doesn't depend on the contents, so random unit vectors stand in for real clips
+    vectors = np.random.default_rng(0).standard_normal((clips, EMBEDDING_DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return UserEmbeddingIndex([f"clip{i}" for i in range(clips)], vectors)
+
+
+def search_similar():
+    index = similar_index()
+    return index.search(index.matrix[7], 10, exclude="clip7")
+
+
+def parse_streaming(text: str, chunk_size: int = 16):
+    parser = IncrementalCodeBlockParser()
+    for start in range(0, len(text), chunk_size):
+        parser.feed(text[start:start + chunk_size])
+    parser.close()
+    return parser.result()
+
+
+CASES = {
+    "extract_code_blocks/small": lambda: extract_code_blocks(SMALL_RESPONSE),
+    "extract_code_blocks/100kb": lambda: extract_code_blocks(LARGE_RESPONSE),
+    "stream_parser/small": lambda: parse_streaming(SMALL_RESPONSE),
+    "stream_parser/100kb": lambda: parse_streaming(LARGE_RESPONSE),
+    # cold: every message tokenized; warm: counts of the unchanged history come from the cache
+    "fit_context/80_turns_cold": lambda: fit_long_chat(TokenCounter("gpt-4o-mini", max_entries=0)),
+    "fit_context/80_turns_warm": lambda: fit_long_chat(WARM_COUNTER),
+    "rate_limit/bucket_take": lambda: BENCH_LIMITER.backend.take_now([(f"user:{next(BENCH_USERS) % 10000}", BENCH_LIMIT)]),
+    # Includes running the coroutine on an event loop
+    "rate_limit/ai_request": lambda: BENCH_LOOP.run_until_complete(ai_request_checks(next(BENCH_USERS))),
+    "embed_text/clip": lambda: embed_text(EMBED_CLIP["title"], EMBED_CLIP["notes"], EMBED_CLIP["codeContent"]),
+    "similar/100k_clips_top10": search_similar,
+    "validate_password/valid": lambda: validate_password("Str0ng!Passw0rd"),
+    "validate_password/weak": lambda: validate_password("weakpassword"),
+}
+
+
+def run_case(func, repeat: int) -> dict:
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    return {"ops_per_sec": round(1 / best, 1), "best_us": round(best * 1e6, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="only run cases containing this substring")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", metavar="NAME", help="store results as benchmarks/baselines/functions-NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="diff against a stored baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="regression threshold for --compare")
+    args = parser.parse_args()
+
+    results = {}
+    for name, func in CASES.items():
+        if args.filter not in name:
+            continue
+        results[name] = run_case(func, args.repeat)
+        print(f"{name:32} {results[name]['ops_per_sec']:>14,.1f} ops/s {results[name]['best_us']:>12.3f} us")
+
+    if args.save:
+        print(f"saved {save_baseline(f'functions-{args.save}', results)}")
+    if args.compare:
+        print()
+        if not compare_to_baseline(results, load_baseline(f"functions-{args.compare}"), args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
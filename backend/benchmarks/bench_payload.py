@@ -0,0 +1,121 @@
+"""
+Response payload benchmark: serialization CPU and bytes on the wire.
+
+Offline it renders lists of N synthetic ClippedCodeResponse rows (the shape
+get_user_clipped_codes returns) with the stdlib json encoder (FastAPI's
+JSONResponse) and orjson (ORJSONResponse, now the default), then
+compresses the result the way CompressionMiddleware does.
+
+With --base-url and --user-id it also fetches that user's clip list from a
+running server with each Accept-Encoding and reports the bytes actually
+downloaded.
+
+    python -m benchmarks.bench_payload --rows 50,500,5000
+    python -m benchmarks.bench_payload --base-url http://localhost:8000 --user-id <id>
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+import timeit
+from datetime import datetime, timedelta, timezone
+
+import orjson
+
+from app.core.compression import _Compressor, brotli
+from benchmarks.data import synthetic_clip
+
+
+def response_rows(count: int) -> list:
+    """Rows as jsonable_encoder leaves them, i.e. what the response class serializes."""
+    rng = random.Random(7)
+    created = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for index in range(count):
+        clip = synthetic_clip("user-bench", index, rng)
+        timestamp = (created + timedelta(minutes=index)).isoformat()
+        rows.append({
+            **clip,
+            "id": f"clip{index:08d}",
+            "timeComplexity": "O(n)",
+            "spaceComplexity": "O(1)",
+            "createdAt": timestamp,
+            "updatedAt": timestamp,
+        })
+    return rows
+
+
+def stdlib_render(rows) -> bytes:
+    # Same arguments as starlette's JSONResponse.render
+    return json.dumps(rows, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def orjson_render(rows) -> bytes:
+    return orjson.dumps(rows, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def best_ms(func, repeat: int = 5) -> float:
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1000
+
+
+def compress(encoding: str, body: bytes, level: int) -> bytes:
+    compressor = _Compressor(encoding, gzip_level=level, brotli_quality=level)
+    return compressor.compress(body) + compressor.finish()
+
+
+def offline(row_counts):
+    encodings = [("gzip", 1), ("gzip", 6)] + ([("br", 4), ("br", 11)] if brotli else [])
+    for count in row_counts:
+        rows = response_rows(count)
+        body = orjson_render(rows)
+        print(f"--- {count} rows, {len(body) / 1024:.1f} KiB of JSON")
+        print(f"  render  json    {best_ms(lambda: stdlib_render(rows)):9.3f} ms")
+        print(f"  render  orjson  {best_ms(lambda: orjson_render(rows)):9.3f} ms")
+        for encoding, level in encodings:
+            compressed = compress(encoding, body, level)
+            elapsed = best_ms(lambda: compress(encoding, body, level))
+            print(f"  {encoding:5} level {level:<2} {len(compressed) / 1024:9.1f} KiB "
+                  f"({len(compressed) / len(body):5.1%})  {elapsed:9.3f} ms")
+    if not brotli:
+        print("(brotli not installed; only gzip measured)")
+
+
+def online(base_url: str, user_id: str, runs: int):
+    import httpx
+
+    url = f"{base_url}/api/v1/clipped-codes/user/{user_id}"
+    encodings = ["identity", "gzip"] + (["br"] if brotli else [])
+    with httpx.Client(timeout=60) as client:
+        for encoding in encodings:
+            wire, latencies = 0, []
+            for _ in range(runs):
+                started = time.perf_counter()
+                response = client.get(url, headers={"Accept-Encoding": encoding})
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - started) * 1000)
+                wire = response.num_bytes_downloaded
+            print(f"GET clip list  {encoding:8} {wire / 1024:9.1f} KiB on the wire  "
+                  f"p50 {statistics.median(latencies):7.2f} ms  "
+                  f"(Content-Encoding: {response.headers.get('content-encoding', '-')})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="50,500,5000", help="comma separated row counts for the offline run")
+    parser.add_argument("--base-url", help="also measure a running server")
+    parser.add_argument("--user-id", help="user whose clip list is fetched with --base-url")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    offline([int(count) for count in args.rows.split(",")])
+    if args.base_url:
+        if not args.user_id:
+            parser.error("--base-url needs --user-id")
+        online(args.base_url.rstrip("/"), args.user_id, args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Overhead of the request profiler.
+
+Drives a synthetic ASGI endpoint through ProfilingMiddleware in-process: it
+awaits a thread (like Argon2 on the hash pool) and renders a large JSON list
+(like a ClippedCodeResponse page). Compares requests/s with profiling off,
+with PROFILE_SAMPLE_PERCENT requests sampled and with every request
+profiled, and prints the hot frames of the slowest profile. No server needed.
+
+    python -m benchmarks.bench_profiling --requests 2000 --concurrency 16
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/unused")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.core.profiling import ProfileStore, ProfilingMiddleware  # noqa: E402
+
+ROWS = [{"id": f"clip{i}", "title": f"Snippet {i}", "language": "python", "size": i} for i in range(2000)]
+
+
+def hash_work():
+    for _ in range(200):
+        hashlib.sha256(b"x" * 1024).digest()
+
+
+async def endpoint(scope, receive, send):
+    await asyncio.to_thread(hash_work)
+    body = json.dumps(ROWS).encode()
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def request(app):
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        pass
+
+    await app({"type": "http", "method": "GET", "path": "/bench", "headers": []}, receive, send)
+
+
+async def drive(app, requests: int, concurrency: int) -> float:
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            await request(app)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - started)
+
+
+async def run(args):
+    baseline = None
+    for label, percent in (("off", 0.0), (f"{args.percent:g}%", args.percent), ("100%", 100.0)):
+        store = ProfileStore(keep=10)
+        app = ProfilingMiddleware(endpoint, sample_percent=percent, interval_ms=args.interval_ms, store=store)
+        rps = await drive(app, args.requests, args.concurrency)
+        baseline = baseline or rps
+        print(f"{label:>6} {rps:>9.1f} req/s  overhead {100 * (baseline - rps) / baseline:>5.1f}%  "
+              f"profiles {store.recorded}")
+    slowest = store.slowest()[0]
+    print(f"\nslowest profile: {slowest.duration * 1000:.1f} ms, {slowest.samples} samples")
+    for frame in slowest.hot_frames():
+        print(f"  {frame['share']:>6.1%}  {frame['frame']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--percent", type=float, default=1.0, help="sampled share for the middle run")
+    parser.add_argument("--interval-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Seeded search benchmark.
+
+Creates a throwaway user with N synthetic clips (default 50k), then times
+search_clipped_codes for word, identifier-fragment and filtered queries.
+Needs DATABASE_URL pointing at a Postgres with the migrations applied.
+
+    python -m benchmarks.bench_search --clips 50000 --runs 30
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+
+from app.db import prisma
+from app.core.code_store import UPSERT_BLOBS_SQL, blob_rows
+from app.api.v1.endpoints.clipped_codes import search_clipped_codes
+from benchmarks.data import synthetic_clip
+
+QUERIES = [
+    {"q": "binary search"},
+    {"q": "mergeGraph"},
+    {"q": "validate_token"},
+    {"q": "cache", "language": "python"},
+    {"q": "stream buffer", "is_ai_generated": True},
+]
+
+
+async def seed(clips: int, batch_size: int) -> str:
+    rng = random.Random(42)
+    user = await prisma.user.create(data={
+        "email": f"search-bench-{uuid.uuid4().hex[:8]}@example.com",
+        "name": "Search Bench",
+        "password": "not-a-real-hash",
+    })
+    for start in range(0, clips, batch_size):
+        rows, blobs = blob_rows(synthetic_clip(user.id, i, rng) for i in range(start, min(clips, start + batch_size)))
+        await prisma.execute_raw(UPSERT_BLOBS_SQL, blobs)
+        await prisma.clippedcode.create_many(data=rows)
+    return user.id
+
+
+async def cleanup(user_id: str) -> None:
+    await prisma.clippedcode.delete_many(where={"userId": user_id})
+    await prisma.user.delete(where={"id": user_id})
+
+
+async def run(args) -> None:
+    await prisma.connect()
+    try:
+        started = time.perf_counter()
+        user_id = await seed(args.clips, args.batch_size)
+        print(f"seeded {args.clips} clips in {time.perf_counter() - started:.1f}s")
+        await prisma.execute_raw('ANALYZE "ClippedCode"')
+        await prisma.execute_raw('ANALYZE "CodeBlob"')
+
+        try:
+            for query in QUERIES:
+                timings, hits = [], 0
+                for _ in range(args.runs):
+                    t0 = time.perf_counter()
+                    results = await search_clipped_codes(
+                        user_id=user_id,
+                        q=query["q"],
+                        language=query.get("language"),
+                        is_ai_generated=query.get("is_ai_generated"),
+                        limit=20,
+                    )
+                    timings.append((time.perf_counter() - t0) * 1000)
+                    hits = len(results)
+                timings.sort()
+                print(f"{str(query):55} hits={hits:3d} p50={statistics.median(timings):6.1f}ms "
+                      f"p95={timings[int(0.95 * (len(timings) - 1))]:6.1f}ms")
+        finally:
+            if not args.keep:
+                await cleanup(user_id)
+    finally:
+        await prisma.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clips", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded user and clips")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Cold start: time from launching a worker to its first answered request.
+
+Starts `python -m app.serve --workers 1` --runs times and measures, from the
+moment the process is spawned:
+
+- first request: the first 200 from GET / (imports, Prisma connect, lifespan);
+- ready: the first 200 from /readyz (background warmup finished).
+
+Prints the median and worst of each plus the `import app.main` time, and
+exits non-zero when the median first request is over --target-ms. Needs
+Postgres (and, for the OpenAI warmup step, the stand-in) as described in
+benchmarks/README.md.
+
+    python -m benchmarks.bench_startup --runs 5 --target-ms 1500
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.import_budget import measure
+
+
+def wait_for(client: httpx.Client, url: str, server: subprocess.Popen, started: float, timeout: float) -> float:
+    """Seconds since `started` until `url` answers 200."""
+    while time.perf_counter() - started < timeout:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with {server.returncode}")
+        try:
+            if client.get(url, timeout=1).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f"{url} not answering after {timeout}s")
+
+
+def cold_start(port: int, timeout: float) -> dict:
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--workers", "1", "--host", "127.0.0.1", "--port", str(port)],
+        env=os.environ.copy(),
+    )
+    try:
+        with httpx.Client() as client:
+            first = wait_for(client, f"{base_url}/", server, started, timeout)
+            ready = wait_for(client, f"{base_url}/readyz", server, started, timeout)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+    return {"first_request_ms": first * 1000, "ready_ms": ready * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--target-ms", type=float, default=1500.0, help="median time to first request")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    import_ms, _ = measure()
+    runs = []
+    for run in range(args.runs):
+        result = cold_start(args.port, args.timeout)
+        runs.append(result)
+        print(f"run {run + 1}: first request {result['first_request_ms']:>7.0f} ms  ready {result['ready_ms']:>7.0f} ms")
+
+    print(f"\nimport app.main {import_ms:>7.0f} ms")
+    for key, label in (("first_request_ms", "first request"), ("ready_ms", "ready")):
+        values = [run[key] for run in runs]
+        print(f"{label:15} median {statistics.median(values):>7.0f} ms  worst {max(values):>7.0f} ms")
+
+    median_first = statistics.median(run["first_request_ms"] for run in runs)
+    if median_first > args.target_ms:
+        print(f"\nFAIL: median first request {median_first:.0f} ms is over the {args.target_ms:.0f} ms target")
+        sys.exit(1)
+    print(f"\nOK: under the {args.target_ms:.0f} ms target")
+
+
+if __name__ == "__main__":
+    main()
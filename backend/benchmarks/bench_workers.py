@@ -0,0 +1,93 @@
+"""
+Single-process vs multi-worker throughput.
+
+For each worker count, starts `python -m app.serve --workers N`, waits for
+/readyz, runs the load scenarios against it, then sends SIGTERM and times
+the graceful shutdown. Start Postgres and the OpenAI stand-in first (see
+benchmarks/README.md); use the redis backends to measure the shared setup.
+
+    python -m benchmarks.bench_workers --workers 1,4 --scenario get_clip,list_page,ai_chat
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks import load
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)],
+        env={**os.environ, "RATE_LIMIT_ENABLED": os.environ.get("RATE_LIMIT_ENABLED", "false")},
+    )
+
+
+def wait_ready(base_url: str, server: subprocess.Popen, timeout: float) -> float:
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with {server.returncode} before becoming ready")
+        try:
+            if httpx.get(f"{base_url}/readyz", timeout=1).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server not ready after {timeout}s")
+
+
+def stop_server(server: subprocess.Popen) -> float:
+    started = time.perf_counter()
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+    return time.perf_counter() - started
+
+
+def bench(workers: int, args) -> dict:
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = start_server(workers, args.port)
+    try:
+        ready_s = wait_ready(base_url, server, args.startup_timeout)
+        print(f"\n--- {workers} worker(s), ready in {ready_s:.1f}s")
+        results = asyncio.run(load.run(argparse.Namespace(
+            base_url=base_url, scenario=args.scenario, concurrency=args.concurrency,
+            duration=args.duration, server_pid=None,
+        )))
+    finally:
+        shutdown_s = stop_server(server)
+    print(f"shutdown in {shutdown_s:.1f}s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="comma separated worker counts")
+    parser.add_argument("--scenario", default="get_clip,list_page,search,create_clip,ai_chat")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    counts = [int(n) for n in args.workers.split(",")]
+    runs = {workers: bench(workers, args) for workers in counts}
+
+    print(f"\n{'scenario':12}" + "".join(f"{f'{n} worker(s)':>16}" for n in counts) + f"{'speedup':>10}")
+    for name in runs[counts[0]]:
+        rps = [runs[n][name]["rps"] for n in counts]
+        speedup = rps[-1] / rps[0] if rps[0] else 0.0
+        print(f"{name:12}" + "".join(f"{r:>12.1f} r/s" for r in rps) + f"{speedup:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Database round trips per clipped-code write.
+
+Drives each write path of a running server one request at a time and reads
+the server's db stage counters (clipcodeai_stage_duration_seconds_count with
+stage="db", one per query engine call) from /metrics before and after, so
+the report shows how many round trips each request costs and which
+operations they were. Interactive transactions (prisma.tx()) also make a
+begin and a commit call that this counter does not see.
+
+Run it against a single worker with no other traffic:
+
+    python -m benchmarks.bench_writes --base-url http://localhost:8000 --requests 50
+"""
+import argparse
+import asyncio
+import random
+import re
+import statistics
+import time
+import uuid
+from collections import Counter
+
+import httpx
+
+from benchmarks.data import synthetic_clip
+
+DB_COUNT_LINE = re.compile(
+    r'^clipcodeai_stage_duration_seconds_count\{stage="db",operation="([^"]*)"\} ([0-9.e+]+)$'
+)
+
+
+async def db_calls(client: httpx.AsyncClient) -> Counter:
+    response = await client.get("/metrics")
+    response.raise_for_status()
+    counts = Counter()
+    for line in response.text.splitlines():
+        match = DB_COUNT_LINE.match(line)
+        if match:
+            counts[match.group(1)] = float(match.group(2))
+    return counts
+
+
+async def create_user(client: httpx.AsyncClient) -> str:
+    response = await client.post("/api/v1/users/", json={
+        "email": f"writes-bench-{uuid.uuid4().hex[:8]}@example.com",
+        "name": "Writes Bench",
+        "password": "Bench-Passw0rd!",
+    })
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+def scenarios(user_id: str, clip_ids: list, rng: random.Random):
+    """(name, request factory) pairs; factories take the request number."""
+    batch = 20
+    return [
+        ("create", lambda n: ("POST", "/api/v1/clipped-codes/", {
+            "json": synthetic_clip(user_id, 10_000 + n, rng)})),
+        ("create duplicate", lambda n: ("POST", "/api/v1/clipped-codes/", {
+            "json": synthetic_clip(user_id, 0, random.Random(1))})),
+        ("create unknown user", lambda n: ("POST", "/api/v1/clipped-codes/", {
+            "json": synthetic_clip("missing-user", n, rng)})),
+        ("patch fields", lambda n: ("PATCH", f"/api/v1/clipped-codes/{clip_ids[n]}", {
+            "json": {"title": f"renamed {n}"}})),
+        ("patch content", lambda n: ("PATCH", f"/api/v1/clipped-codes/{clip_ids[n]}", {
+            "json": {"codeContent": f"print({n})\n"}})),
+        ("patch missing", lambda n: ("PATCH", "/api/v1/clipped-codes/missing-clip", {
+            "json": {"title": "x"}})),
+        (f"batch patch ({batch} ids)", lambda n: ("PATCH", "/api/v1/clipped-codes/batch", {
+            "json": {"ids": clip_ids[:batch], "changes": {"language": "python"}}})),
+        ("delete", lambda n: ("DELETE", f"/api/v1/clipped-codes/{clip_ids[n]}", {})),
+        ("delete missing", lambda n: ("DELETE", "/api/v1/clipped-codes/missing-clip", {})),
+        (f"batch delete ({batch} ids)", lambda n: ("DELETE", "/api/v1/clipped-codes/batch", {
+            "json": {"ids": clip_ids[len(clip_ids) - batch * (n + 1):len(clip_ids) - batch * n]}})),
+    ]
+
+
+async def run(args) -> None:
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        user_id = await create_user(client)
+        seed_rng = random.Random(1)
+        clip_ids = []
+        # Enough clips for one delete each plus one batch delete per request
+        for index in range(args.requests * 22):
+            response = await client.post(
+                "/api/v1/clipped-codes/", json=synthetic_clip(user_id, index, seed_rng)
+            )
+            response.raise_for_status()
+            clip_ids.append(response.json()["id"])
+
+        print(f"{'scenario':26} {'trips/req':>9} {'p50 ms':>8}  status  operations")
+        for name, factory in scenarios(user_id, clip_ids, random.Random(2)):
+            before = await db_calls(client)
+            latencies, statuses = [], Counter()
+            for n in range(args.requests):
+                method, path, kwargs = factory(n)
+                started = time.perf_counter()
+                response = await client.request(method, path, **kwargs)
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses[response.status_code] += 1
+            after = await db_calls(client)
+
+            calls = {op: after[op] - before.get(op, 0) for op in after if after[op] != before.get(op, 0)}
+            per_request = sum(calls.values()) / args.requests
+            operations = ", ".join(f"{op} x{count / args.requests:g}" for op, count in sorted(calls.items()))
+            status = "/".join(str(code) for code in sorted(statuses))
+            print(f"{name:26} {per_request:9.2f} {statistics.median(latencies):8.2f}  {status:6}  {operations}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=20, help="requests per scenario")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Shared helpers for the benchmark scripts: percentiles, RSS sampling and baselines."""
+import json
+import resource
+import statistics
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+
+# Metrics where a larger value is better; everything else is treated as a cost
+HIGHER_IS_BETTER = {"rps", "ops_per_sec"}
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize_latencies(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 and mean in milliseconds for samples given in seconds."""
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 3) if samples else 0.0,
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3) if samples else 0.0,
+    }
+
+
+def rss_mb(pid: Optional[int] = None) -> float:
+    """Current resident set size of `pid` (default: this process) in MiB."""
+    try:
+        status = Path(f"/proc/{pid or 'self'}/status").read_text()
+    except OSError:
+        # No procfs (e.g. macOS): fall back to our own peak RSS
+        if pid is None:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+        return 0.0
+    for line in status.splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def save_baseline(name: str, results: Dict[str, Dict[str, float]]) -> Path:
+    BASELINE_DIR.mkdir(exist_ok=True)
+    path = BASELINE_DIR / f"{name}.json"
+    path.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+    return path
+
+
+def load_baseline(name: str) -> Dict[str, Dict[str, float]]:
+    return json.loads((BASELINE_DIR / f"{name}.json").read_text())
+
+
+def compare_to_baseline(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                        threshold: float = 0.10) -> bool:
+    """Print a per-metric diff; returns False when any metric regressed by more than `threshold`."""
+    ok = True
+    for case, metrics in sorted(results.items()):
+        previous = baseline.get(case)
+        if previous is None:
+            print(f"{case:40} (no baseline)")
+            continue
+        for metric, value in sorted(metrics.items()):
+            before = previous.get(metric)
+            if not before:
+                continue
+            change = (value - before) / before
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            flag = ""
+            if worse > threshold:
+                flag = "  REGRESSION"
+                ok = False
+            print(f"{case:40} {metric:12} {before:12.3f} -> {value:12.3f} ({change:+.1%}){flag}")
+    return ok
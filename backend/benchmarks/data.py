@@ -0,0 +1,44 @@
+"""Deterministic synthetic clips shared by the benchmarks."""
+import random
+
+LANGUAGES = ["python", "javascript", "go", "rust", "java", "sql"]
+VERBS = ["parse", "merge", "search", "render", "fetch", "validate", "sort", "cache", "encode", "stream"]
+NOUNS = ["tree", "buffer", "request", "matrix", "graph", "token", "session", "invoice", "index", "queue"]
+
+
+def synthetic_clip(user_id: str, index: int, rng: random.Random) -> dict:
+    verb, noun = rng.choice(VERBS), rng.choice(NOUNS)
+    name = f"{verb}_{noun}_{index}"
+    body = "\n".join(
+        f"    {rng.choice(VERBS)}{rng.choice(NOUNS).title()}(value_{i}, {noun})" for i in range(rng.randint(5, 40))
+    )
+    return {
+        "userId": user_id,
+        "title": f"{verb.title()} {noun} helper {index}",
+        "codeContent": f"def {name}({noun}):\n{body}\n    return {noun}",
+        "language": rng.choice(LANGUAGES),
+        "isAiGenerated": rng.random() < 0.4,
+        "notes": f"Uses a {rng.choice(['binary search', 'hash map', 'two pointer', 'sliding window'])} "
+                 f"to {verb} the {noun}.",
+    }
+
+
+def ai_response(blocks: int = 1, notes_lines: int = 1, code_lines: int = 8) -> str:
+    """An AI answer in the SYSTEM_MESSAGES["DEFAULT"] format, scaled by block and line counts."""
+    parts = [
+        "Title: Generated Benchmark Answer",
+        "Language: Python",
+        "Time Complexity: O(n log n)",
+        "Space Complexity: O(n)",
+        "Notes: " + " ".join(f"Step {i} explains part of the algorithm in some detail." for i in range(3)),
+    ]
+    parts.extend(f"The helper keeps invariant number {i} while merging runs." for i in range(notes_lines - 1))
+    for block in range(blocks):
+        parts.append("")
+        parts.append("```python")
+        parts.append(f"def solve_{block}(items):")
+        parts.extend(f"    value_{i} = sorted(items)[{i} % len(items)]  # keep step {i}" for i in range(code_lines))
+        parts.append("    return items")
+        parts.append("```")
+        parts.append(f"Block {block} can be reused on its own.")
+    return "\n".join(parts)
@@ -0,0 +1,121 @@
+"""
+Local stand-in for the OpenAI chat completions API.
+
+Run it next to the backend and point the app at it:
+
+    uvicorn benchmarks.fake_openai:app --port 9000
+    OPENAI_BASE_URL=http://localhost:9000/v1 uvicorn app.main:app
+
+FAKE_OPENAI_LATENCY (seconds, default 0.5) controls how long each
+completion takes, so concurrency and back-pressure can be exercised
+without spending real tokens. Requests with `"stream": true` get the same
+answer as `chat.completion.chunk` events spread over that latency.
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+LATENCY = float(os.getenv("FAKE_OPENAI_LATENCY", "0.5"))
+STREAM_CHUNK_CHARS = 8
+
+CANNED_ANSWER = """Title: Linear Search
+Language: Python
+Time Complexity: O(n)
+Space Complexity: O(1)
+Notes: Walks the list once and returns the index of the first element equal to the target, or -1 when it is absent.
+
+```python
+def linear_search(items, target):
+    for index, item in enumerate(items):
+        if item == target:
+            return index
+    return -1
+```"""
+
+CANNED_TITLE = "Title: Linear Search Helper"
+
+app = FastAPI(title="Fake OpenAI")
+
+
+def _answer_for(messages) -> str:
+    for message in messages:
+        if message.get("role") == "user" and message.get("content", "").startswith("CODE_INPUT:"):
+            return CANNED_TITLE
+    return CANNED_ANSWER
+
+
+def _usage(messages, content: str) -> dict:
+    prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+async def _stream_answer(completion_id: str, model: str, content: str, usage=None):
+    pieces = [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)]
+    delay = LATENCY / max(len(pieces), 1)
+    for index, piece in enumerate(pieces):
+        delta = {"content": piece}
+        if index == 0:
+            delta["role"] = "assistant"
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+        await asyncio.sleep(delay)
+    final = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+    }
+    yield f"data: {json.dumps(final)}\n\n"
+    if usage is not None:
+        usage_chunk = {**final, "choices": [], "usage": usage}
+        yield f"data: {json.dumps(usage_chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages", [])
+    stream_options = body.get("stream_options") or {}
+    content = _answer_for(messages)
+    if body.get("stream"):
+        return StreamingResponse(
+            _stream_answer(
+                f"chatcmpl-{uuid.uuid4().hex}",
+                body.get("model", "gpt-4o-mini"),
+                content,
+                usage=_usage(messages, content) if stream_options.get("include_usage") else None,
+            ),
+            media_type="text/event-stream",
+        )
+    await asyncio.sleep(LATENCY)
+
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o-mini"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": _usage(messages, content),
+    }
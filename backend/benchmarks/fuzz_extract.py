@@ -0,0 +1,197 @@
+"""
+Differential fuzzer for extract_code_blocks.
+
+Generates random answers in (and around) the SYSTEM_MESSAGES["DEFAULT"]
+format and checks the single-pass parser against a frozen copy of the
+original implementation. Known, intentional differences are normalized
+before comparing:
+
+- the original raised on a fence without an info string when no Language
+  header was given; such cases are skipped,
+- the original kept an info string that differed from the Language header
+  (e.g. "py" vs "Python") as the first line of the code,
+- without an info string or Language header, the original took the first
+  line of code as the language; that guess is no longer made,
+- CRLF line endings are normalized inside code,
+- prose is compared with whitespace collapsed, since the original glued the
+  text around the first block together without a separator,
+- unterminated fences now yield a (partial) code block instead of none,
+- only the first block is compared; the original dropped the rest.
+
+Also reports the speedup on a 100 KB+ answer.
+
+    python -m benchmarks.fuzz_extract --cases 20000 --seed 1
+"""
+import argparse
+import random
+import sys
+import timeit
+
+from app.core.code_blocks import extract_code_blocks
+from benchmarks.data import ai_response
+
+
+def legacy_extract_code_blocks(content: str):
+    """The pre-rewrite implementation, kept verbatim as the fuzzing oracle."""
+    lines = content.split('\n')
+    title = None
+    language = None
+    notes = None
+    time_complexity = "N/A"
+    space_complexity = "N/A"
+    content_lines = []
+
+    collecting_notes = False
+    notes_lines = []
+
+    for line in lines:
+        line = line.strip()
+        if line.startswith('Title:'):
+            title = line.replace('Title:', '').strip()
+        elif line.startswith('Language:'):
+            language = line.replace('Language:', '').strip()
+        elif line.startswith('Time Complexity:'):
+            time_complexity = line.replace('Time Complexity:', '').strip() or "N/A"
+        elif line.startswith('Space Complexity:'):
+            space_complexity = line.replace('Space Complexity:', '').strip() or "N/A"
+        elif line.startswith('Notes:'):
+            collecting_notes = True
+            notes = line.replace('Notes:', '').strip()
+            if notes:
+                notes_lines.append(notes)
+        elif collecting_notes and line and not line.startswith('```'):
+            notes_lines.append(line)
+        elif line.startswith('```'):
+            collecting_notes = False
+        else:
+            content_lines.append(line)
+
+    notes = ' '.join(notes_lines).strip() if notes_lines else "No explanation provided."
+
+    parts = content.split("```")
+    if len(parts) < 3:
+        return ' '.join(content_lines), None, title, language, notes, time_complexity, space_complexity
+
+    full_code_block = parts[1].strip()
+
+    if not language and '\n' in full_code_block:
+        potential_lang = full_code_block.split('\n')[0].strip()
+        if potential_lang and ':' not in potential_lang:
+            language = potential_lang
+            full_code_block = '\n'.join(full_code_block.split('\n')[1:])
+    else:
+        lines = full_code_block.split('\n')
+        if lines[0].strip().lower() == language.lower():
+            full_code_block = '\n'.join(lines[1:])
+
+    content = parts[0] + parts[2]
+
+    return (content.strip(), full_code_block.strip(), title, language,
+            notes, time_complexity, space_complexity)
+
+
+WORDS = ["sort", "the", "list", "in", "place", "using", "a", "heap", "returns", "index", "O(n)", "map", "x", "y"]
+LANGUAGES = ["python", "Python", "javascript", "go", "rust", "py", ""]
+
+
+def sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 10)))
+
+
+def random_answer(rng: random.Random) -> str:
+    lines = []
+    if rng.random() < 0.3:
+        lines.append(sentence(rng))
+    headers = [
+        f"Title: {sentence(rng)}",
+        f"Language: {rng.choice(LANGUAGES)}",
+        f"Time Complexity: {rng.choice(['O(n)', 'O(1)', '', 'N/A'])}",
+        f"Space Complexity: {rng.choice(['O(n)', 'O(log n)', ''])}",
+    ]
+    rng.shuffle(headers)
+    lines.extend(h for h in headers if rng.random() < 0.85)
+    if rng.random() < 0.85:
+        lines.append(f"Notes: {sentence(rng) if rng.random() < 0.9 else ''}")
+        lines.extend(sentence(rng) for _ in range(rng.randint(0, 3)))
+    for _ in range(rng.choice([0, 1, 1, 1, 2, 3])):
+        lines.append(rng.choice(["", sentence(rng)]))
+        lines.append(" " * rng.randint(0, 3) + "```" + rng.choice(LANGUAGES))
+        lines.extend("    " * rng.randint(0, 2) + f"call_{sentence(rng).replace(' ', '_')}()"
+                     for _ in range(rng.randint(1, 6)))
+        if rng.random() < 0.97:
+            lines.append("```")
+        lines.append(rng.choice(["", sentence(rng)]))
+    separator = rng.choice(["\n", "\n", "\r\n"])
+    return separator.join(lines)
+
+
+def collapse(text) -> str:
+    return " ".join((text or "").split())
+
+
+def compare(answer: str):
+    """Return a description of an unexpected mismatch, or None."""
+    try:
+        old = legacy_extract_code_blocks(answer)
+    except (AttributeError, IndexError):
+        return None
+    old_content, old_code, old_title, old_language, old_notes, old_time, old_space = old
+    new = extract_code_blocks(answer)
+
+    checks = [
+        ("title", old_title, new.title),
+        ("timeComplexity", old_time, new.time_complexity),
+        ("spaceComplexity", old_space, new.space_complexity),
+        ("notes", collapse(old_notes), collapse(new.notes)),
+    ]
+    closed_blocks = answer.count("```") >= 2
+    if closed_blocks and new.blocks and old_code is not None:
+        old_code = old_code.replace("\r\n", "\n")
+        new_code = new.code
+        info = new.blocks[0].info
+        if info and old_code.startswith(info) and old_code[len(info):].strip() == new_code:
+            new_code = old_code
+        guessed_language = not info and old_language and new_code.split("\n", 1)[0].strip() == old_language
+        if not guessed_language:
+            checks.append(("code", old_code, new_code))
+            if new.language and old_language:
+                checks.append(("language", old_language, new.language))
+    if answer.count("```") == 0:
+        checks.append(("content", collapse(old_content), collapse(new.content)))
+
+    for field, expected, actual in checks:
+        if expected != actual:
+            return f"{field}: legacy={expected!r} new={actual!r}"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--show", type=int, default=5, help="print this many failing inputs")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failures = 0
+    for _ in range(args.cases):
+        answer = random_answer(rng)
+        mismatch = compare(answer)
+        if mismatch:
+            failures += 1
+            if failures <= args.show:
+                print(f"--- mismatch ({mismatch})\n{answer}\n")
+    print(f"{args.cases} cases, {failures} unexpected mismatches")
+
+    large = ai_response(blocks=40, notes_lines=20, code_lines=40)
+    for name, func in (("legacy", legacy_extract_code_blocks), ("single-pass", extract_code_blocks)):
+        timer = timeit.Timer(lambda: func(large))
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=5, number=number)) / number
+        print(f"{name:12} {len(large) // 1024} KB answer: {best * 1000:.3f} ms")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Import-time budget for `import app.main`.
+
+Runs `python -X importtime -c "import app.main"` in fresh interpreters,
+keeps the fastest run and prints its total import time and the packages
+with the most self time. Exits non-zero when the total is over --budget-ms
+or when a package that must load lazily (OpenAI SDK, Prisma client,
+passlib/argon2, python-jose, httpx) was imported, so it can gate CI.
+
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --budget-ms 500 --runs 5
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import Counter
+from typing import Dict, Tuple
+
+# Built on first use (get_openai_client, get_prisma, get_pwd_context, ...)
+LAZY_PACKAGES = ("openai", "prisma", "passlib", "argon2", "jose", "httpx")
+
+# Settings needs these to import; nothing connects anywhere
+SETTINGS_ENV = {
+    "DATABASE_URL": "postgresql://localhost/unused",
+    "JWT_SECRET_KEY": "import-budget",
+    "OPENAI_API_KEY": "import-budget",
+}
+
+
+def measure(module: str = "app.main") -> Tuple[float, Dict[str, float]]:
+    """(total ms, self ms per top-level package) for importing `module` in a new interpreter."""
+    env = {**SETTINGS_ENV, **os.environ}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    packages = Counter()
+    for line in result.stderr.splitlines():
+        # import time:  self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us) / 1000
+    return sum(packages.values()), dict(packages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=750.0)
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters; the fastest counts")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    total, packages = min((measure(args.module) for _ in range(args.runs)), key=lambda run: run[0])
+    print(f"import {args.module}: {total:.1f} ms (budget {args.budget_ms:.0f} ms)\n")
+    for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {ms:>8.1f} ms  {name}")
+
+    failures = []
+    if total > args.budget_ms:
+        failures.append(f"import time {total:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+    eager = sorted(set(packages) & set(LAZY_PACKAGES))
+    if eager:
+        failures.append(f"imported eagerly: {', '.join(eager)}")
+    if failures:
+        print("\nFAIL: " + "; ".join(failures))
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
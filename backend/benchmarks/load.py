@@ -0,0 +1,157 @@
+"""
+HTTP load driver for the FastAPI app.
+
+Seeds a throwaway user with a few clips, then drives each scenario for
+--duration seconds with --concurrency workers and reports req/s,
+p50/p95/p99 latency, errors and the server's RSS (when --server-pid is
+given). Results can be stored and diffed like the function benchmarks.
+
+Start the stand-ins and the app first, see benchmarks/README.md:
+
+    python -m benchmarks.load --server-pid $(pgrep -f "uvicorn app.main") --save main
+    python -m benchmarks.load --scenario get_clip,list_page --compare main
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import sys
+import time
+import uuid
+
+import httpx
+
+from benchmarks.common import compare_to_baseline, load_baseline, rss_mb, save_baseline, summarize_latencies
+from benchmarks.data import synthetic_clip
+
+PASSWORD = "Bench-Passw0rd!"
+SEED_CLIPS = 200
+
+SCENARIOS = {
+    "root": lambda ctx, n: ("GET", "/", {}),
+    "get_user": lambda ctx, n: ("GET", f"/api/v1/users/{ctx['user_id']}", {}),
+    "me": lambda ctx, n: ("GET", "/api/v1/users/me", {"headers": ctx["auth"]}),
+    "list_page": lambda ctx, n: ("GET", f"/api/v1/clipped-codes/user/{ctx['user_id']}/page", {"params": {"limit": 20}}),
+    "get_clip": lambda ctx, n: ("GET", f"/api/v1/clipped-codes/{ctx['clip_ids'][n % len(ctx['clip_ids'])]}", {}),
+    "search": lambda ctx, n: ("GET", "/api/v1/clipped-codes/search", {"params": {"user_id": ctx["user_id"], "q": "cache"}}),
+    "create_clip": lambda ctx, n: ("POST", "/api/v1/clipped-codes/", {
+        "json": synthetic_clip(ctx["user_id"], n, random.Random(n)),
+    }),
+    "ai_chat": lambda ctx, n: ("POST", "/api/v1/ai/chat", {"json": {"messages": [{
+        "role": "user",
+        # Unique prompts so the completion cache doesn't hide upstream cost
+        "content": f"Write a linear search in Python ({ctx['run_id']}-{n})",
+        "user_id": ctx["user_id"],
+    }]}}),
+    # Same, also saving the answer through the write-behind queue
+    "ai_chat_save": lambda ctx, n: ("POST", "/api/v1/ai/chat", {"json": {"save": True, "messages": [{
+        "role": "user",
+        "content": f"Write a binary search in Python ({ctx['run_id']}-{n})",
+        "user_id": ctx["user_id"],
+    }]}}),
+    # Constant-size request body however long the conversation gets
+    "ai_conversation": lambda ctx, n: ("POST", f"/api/v1/ai/conversations/{ctx['conversation_id']}/messages", {
+        "json": {"content": f"Now make it faster ({ctx['run_id']}-{n})"},
+    }),
+}
+
+
+async def seed(client: httpx.AsyncClient) -> dict:
+    email = f"load-{uuid.uuid4().hex[:8]}@example.com"
+    response = await client.post("/api/v1/users/", json={"email": email, "name": "Load Test", "password": PASSWORD})
+    response.raise_for_status()
+    user_id = response.json()["id"]
+
+    response = await client.post("/api/v1/users/login", json={"email": email, "password": PASSWORD})
+    response.raise_for_status()
+    auth = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    rng = random.Random(1)
+    clip_ids = []
+    for index in range(SEED_CLIPS):
+        response = await client.post("/api/v1/clipped-codes/", json=synthetic_clip(user_id, index, rng))
+        response.raise_for_status()
+        clip_ids.append(response.json()["id"])
+
+    response = await client.post("/api/v1/ai/conversations", json={"userId": user_id})
+    response.raise_for_status()
+    conversation_id = response.json()["id"]
+
+    return {
+        "user_id": user_id,
+        "auth": auth,
+        "clip_ids": clip_ids,
+        "conversation_id": conversation_id,
+        "run_id": uuid.uuid4().hex[:6],
+    }
+
+
+async def run_scenario(client, name, ctx, concurrency, duration, server_pid):
+    build = SCENARIOS[name]
+    counter = itertools.count()
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            method, url, kwargs = build(ctx, next(counter))
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    result = {"rps": round(len(latencies) / elapsed, 1), "errors": errors, **summarize_latencies(latencies)}
+    if server_pid:
+        result["rss_mb"] = round(rss_mb(server_pid), 1)
+    return result
+
+
+async def run(args) -> dict:
+    names = list(SCENARIOS) if args.scenario == "all" else args.scenario.split(",")
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=120) as client:
+        ctx = await seed(client)
+        results = {}
+        for name in names:
+            results[name] = await run_scenario(client, name, ctx, args.concurrency, args.duration, args.server_pid)
+            r = results[name]
+            print(f"{name:12} {r['rps']:>9.1f} req/s  p50 {r['p50_ms']:>8.2f}  p95 {r['p95_ms']:>8.2f}  "
+                  f"p99 {r['p99_ms']:>8.2f} ms  errors {r['errors']:>5}"
+                  + (f"  rss {r['rss_mb']:.0f} MiB" if "rss_mb" in r else ""))
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--scenario", default="all", help=f"comma separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--server-pid", type=int, help="sample this process's RSS after each scenario")
+    parser.add_argument("--save", metavar="NAME", help="store results as benchmarks/baselines/load-NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="diff against a stored baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="regression threshold for --compare")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.save:
+        print(f"saved {save_baseline(f'load-{args.save}', results)}")
+    if args.compare:
+        print()
+        if not compare_to_baseline(results, load_baseline(f"load-{args.compare}"), args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
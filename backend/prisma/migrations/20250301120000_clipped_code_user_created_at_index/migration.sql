@@ -0,0 +1,2 @@
+-- CreateIndex
+CREATE INDEX "ClippedCode_userId_createdAt_id_idx" ON "ClippedCode"("userId", "createdAt", "id");
@@ -0,0 +1,19 @@
+-- CreateExtension
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- AlterTable: weighted full-text vector (title > notes > code), maintained by Postgres.
+-- Code is capped so very large bodies stay under the tsvector size limit.
+ALTER TABLE "ClippedCode" ADD COLUMN "searchVector" tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', coalesce("title", '')), 'A') ||
+    setweight(to_tsvector('english', coalesce("notes", '')), 'B') ||
+    setweight(to_tsvector('simple', left(coalesce("codeContent", ''), 100000)), 'C')
+) STORED;
+
+-- CreateIndex
+CREATE INDEX "ClippedCode_searchVector_idx" ON "ClippedCode" USING GIN ("searchVector");
+
+-- CreateIndex
+CREATE INDEX "ClippedCode_title_idx" ON "ClippedCode" USING GIN ("title" gin_trgm_ops);
+
+-- CreateIndex
+CREATE INDEX "ClippedCode_codeContent_idx" ON "ClippedCode" USING GIN ("codeContent" gin_trgm_ops);
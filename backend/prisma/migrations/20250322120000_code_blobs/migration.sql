@@ -0,0 +1,86 @@
+-- Canonical clip body, identical to app.core.code_store.normalize_code:
+-- LF line endings, no trailing spaces/tabs, no leading or trailing blank lines
+CREATE FUNCTION pg_temp.normalize_code(body text) RETURNS text AS $$
+    SELECT btrim(
+        regexp_replace(replace(replace(body, E'\r\n', E'\n'), E'\r', E'\n'), E'[ \t]+$', '', 'gn'),
+        E'\n'
+    )
+$$ LANGUAGE sql IMMUTABLE;
+
+-- CreateTable
+CREATE TABLE "CodeBlob" (
+    "hash" TEXT NOT NULL,
+    "content" TEXT NOT NULL,
+    "size" INTEGER NOT NULL,
+    "refCount" INTEGER NOT NULL DEFAULT 0,
+    "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "searchVector" tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', left("content", 100000)), 'C')
+    ) STORED,
+
+    CONSTRAINT "CodeBlob_pkey" PRIMARY KEY ("hash")
+);
+
+-- Backfill: hash every existing body and store each distinct one once
+ALTER TABLE "ClippedCode" ADD COLUMN "contentHash" TEXT;
+
+UPDATE "ClippedCode"
+SET "codeContent" = pg_temp.normalize_code("codeContent");
+
+UPDATE "ClippedCode"
+SET "contentHash" = encode(sha256(convert_to("codeContent", 'UTF8')), 'hex');
+
+INSERT INTO "CodeBlob" ("hash", "content", "size", "refCount")
+SELECT "contentHash", min("codeContent"), octet_length(min("codeContent")), count(*)
+FROM "ClippedCode"
+GROUP BY "contentHash";
+
+ALTER TABLE "ClippedCode" ALTER COLUMN "contentHash" SET NOT NULL;
+
+-- The code part of the search vector moves to CodeBlob
+DROP INDEX "ClippedCode_codeContent_idx";
+ALTER TABLE "ClippedCode" DROP COLUMN "searchVector";
+ALTER TABLE "ClippedCode" DROP COLUMN "codeContent";
+ALTER TABLE "ClippedCode" ADD COLUMN "searchVector" tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', coalesce("title", '')), 'A') ||
+    setweight(to_tsvector('english', coalesce("notes", '')), 'B')
+) STORED;
+
+-- CreateIndex
+CREATE INDEX "ClippedCode_searchVector_idx" ON "ClippedCode" USING GIN ("searchVector");
+
+-- CreateIndex
+CREATE INDEX "ClippedCode_userId_contentHash_idx" ON "ClippedCode"("userId", "contentHash");
+
+-- CreateIndex
+CREATE INDEX "CodeBlob_searchVector_idx" ON "CodeBlob" USING GIN ("searchVector");
+
+-- CreateIndex
+CREATE INDEX "CodeBlob_content_idx" ON "CodeBlob" USING GIN ("content" gin_trgm_ops);
+
+-- AddForeignKey
+ALTER TABLE "ClippedCode" ADD CONSTRAINT "ClippedCode_contentHash_fkey" FOREIGN KEY ("contentHash") REFERENCES "CodeBlob"("hash") ON DELETE RESTRICT ON UPDATE CASCADE;
+
+-- Reference counting: every insert, delete and content change of a clip
+-- adjusts its blob's refCount, and a blob is dropped with its last reference
+CREATE FUNCTION code_blob_refcount() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE "CodeBlob" SET "refCount" = "refCount" + 1 WHERE "hash" = NEW."contentHash";
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE "CodeBlob" SET "refCount" = "refCount" - 1 WHERE "hash" = OLD."contentHash";
+        DELETE FROM "CodeBlob" WHERE "hash" = OLD."contentHash" AND "refCount" <= 0;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "ClippedCode_blob_refcount"
+AFTER INSERT OR DELETE ON "ClippedCode"
+FOR EACH ROW EXECUTE FUNCTION code_blob_refcount();
+
+CREATE TRIGGER "ClippedCode_blob_refcount_update"
+AFTER UPDATE OF "contentHash" ON "ClippedCode"
+FOR EACH ROW WHEN (OLD."contentHash" IS DISTINCT FROM NEW."contentHash")
+EXECUTE FUNCTION code_blob_refcount();
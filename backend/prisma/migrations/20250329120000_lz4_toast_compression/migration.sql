@@ -0,0 +1,10 @@
+-- Compress clip bodies and notes in TOAST storage with lz4 (PostgreSQL 14+)
+-- instead of pglz: faster to compress and decompress, at a similar ratio.
+-- Values are compressed once a row passes toast_tuple_target, lowered from
+-- ~2 KB so mid-sized bodies are compressed too. Rows written earlier keep
+-- their old format until they are rewritten (e.g. VACUUM FULL).
+ALTER TABLE "CodeBlob" ALTER COLUMN "content" SET COMPRESSION lz4;
+ALTER TABLE "CodeBlob" SET (toast_tuple_target = 512);
+
+ALTER TABLE "ClippedCode" ALTER COLUMN "notes" SET COMPRESSION lz4;
+ALTER TABLE "ClippedCode" SET (toast_tuple_target = 512);
@@ -0,0 +1,28 @@
+-- CreateTable
+CREATE TABLE "ClippedCodeTombstone" (
+    "id" TEXT NOT NULL,
+    "userId" TEXT NOT NULL,
+    "deletedAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "ClippedCodeTombstone_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE INDEX "ClippedCodeTombstone_userId_deletedAt_id_idx" ON "ClippedCodeTombstone"("userId", "deletedAt", "id");
+
+-- CreateIndex
+CREATE INDEX "ClippedCode_userId_updatedAt_id_idx" ON "ClippedCode"("userId", "updatedAt", "id");
+
+-- Record every deleted clip for the incremental sync feed
+CREATE FUNCTION clipped_code_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO "ClippedCodeTombstone" ("id", "userId")
+    VALUES (OLD."id", OLD."userId")
+    ON CONFLICT ("id") DO UPDATE SET "deletedAt" = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "ClippedCode_tombstone"
+AFTER DELETE ON "ClippedCode"
+FOR EACH ROW EXECUTE FUNCTION clipped_code_tombstone();
@@ -0,0 +1,18 @@
+-- CreateTable
+CREATE TABLE "ClipEmbedding" (
+    "clipId" TEXT NOT NULL,
+    "userId" TEXT NOT NULL,
+    "vector" BYTEA NOT NULL,
+    "version" INTEGER NOT NULL,
+    "updatedAt" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "ClipEmbedding_pkey" PRIMARY KEY ("clipId")
+);
+
+-- CreateIndex
+CREATE INDEX "ClipEmbedding_userId_idx" ON "ClipEmbedding"("userId");
+
+-- AddForeignKey
+ALTER TABLE "ClipEmbedding" ADD CONSTRAINT "ClipEmbedding_clipId_fkey" FOREIGN KEY ("clipId") REFERENCES "ClippedCode"("id") ON DELETE CASCADE ON UPDATE CASCADE;
+
+-- Existing clips get their vectors computed the first time their user's index is loaded
@@ -0,0 +1,8 @@
+-- CreateTable
+CREATE TABLE "JobLease" (
+    "name" TEXT NOT NULL,
+    "owner" TEXT NOT NULL,
+    "expiresAt" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "JobLease_pkey" PRIMARY KEY ("name")
+);